@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import itertools
 import json
+import time
 from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
 
 import tkinter as tk
@@ -10,24 +13,83 @@ from tkinter import filedialog, messagebox, scrolledtext
 
 from .constants import (
     DEFAULT_HEADER_LINES,
+    DEFAULT_KEYBOARD_PROFILES,
     EXPORT_PATH_FILENAME,
+    FIRST_PAINT_BUDGET_MS,
+    HOTSTRING_LIST_LIMIT,
+    HISTORY_DIALOG_LIMIT,
+    HISTORY_DIRNAME,
     KEY_BIND_COLOR,
     KEY_DEFAULT_BUTTON_BG,
+    KEY_INHERITED_COLOR,
+    KEY_LINT_ERROR_COLOR,
     KEY_NAME_OVERRIDES,
     KEY_SECTIONS,
     KEYBOARD_PROFILES_FILENAME,
     MODIFIER_ENABLED_TEXT,
     MODIFIER_OPTIONS,
     MODIFIER_PREFIX,
+    MODIFIER_OPTIMIZE_TEXT,
+    MODIFIER_REMAP_TEXT,
+    PREVIEW_CHUNK_LINES,
+    PREVIEW_OPTIMIZED_BG,
+    PROBE_LOG_FILENAME,
+    PROFILE_LOAD_BATCH,
+    PROFILE_PICKER_LIMIT,
     SCRIPT_HEADER_FILENAME,
+    SESSION_FILENAME,
     SETTINGS_FILENAME,
+    TEMPLATES_FILENAME,
+    WATCH_INTERVAL_MS,
+    WORKER_POLL_MS,
+)
+from .compile_worker import (
+    BackgroundWorker,
+    WorkerProgress,
+    compile_preview,
+    copy_profile_actions,
+    export_snapshot,
+    make_snapshot,
+)
+from .linter import SEVERITY_ERROR, LintCache, lint_actions
+from .binding_batch import BindingBatch, copy_profile, merge_actions, remap_key, set_modifier_enabled
+from .script_importer import import_script
+from .script_ir import FragmentCache
+from .templates import (
+    TemplateExpander,
+    format_template_call,
+    load_templates,
+    parse_template_call,
+    template_dependents,
+)
+from .settings_io import (
+    LoadedSession,
+    LoadedSettings,
+    load_keyboard_profiles,
+    load_script_header,
+    save_session,
+)
+from .file_watch import FileWatcher
+from .startup import StartupTimer, load_startup_files
+from .history import HistoryStore
+from .hotstrings import HOTSTRING_MODIFIER, HotstringIndex, hotstring_id, parse_hotstring_id
+from .inheritance import ResolvedProfiles
+from .profile_index import BindingCounts, ProfileIndex
+from .store_sync import (
+    apply_delta,
+    commit_settings,
+    copy_actions,
+    diff_bindings,
+    flatten_actions,
+    pull_settings,
 )
-from .script_builder import build_script_text
-from .settings_io import load_script_header, load_settings, save_settings
 
 
 class AHKBuilder(tk.Tk):
-    def __init__(self):
+    def __init__(self, root=None):
+        # root holds the config files; by default the folder above the package.
+        root = Path(__file__).resolve().parent.parent if root is None else Path(root)
+        self.startup_timer = StartupTimer(time.perf_counter)
         super().__init__()
         self.title("AHK Macro Builder")
         self.configure(background="#f5f5f5")
@@ -39,115 +101,203 @@ class AHKBuilder(tk.Tk):
         self.keyboard_profiles = []
         self.profile_label_by_id = {}
         self.profile_id_by_label = {}
-        self.profile_combo = None
+        self.profile_button = None
+        self._profile_index = ProfileIndex(())
+        # Built when the picker first needs it, then kept current per edit.
+        self._binding_counts = None
         self.modifier_combo = None
         self.current_profile_id = ""
         self.actions_by_profile = {}
+        self._settings_base = LoadedSettings()
+        self._pending_profiles = None
+        self._active_batch = None
+        # Built on first use, then kept up to date edit by edit.
+        self._hotstring_index = None
+        # Bindings merged along each profile's parent chain; also lazy.
+        self._resolved_profiles = None
         self.key_buttons = defaultdict(list)
-        self.settings_path = Path(__file__).resolve().parent.parent / SETTINGS_FILENAME
-        self.keyboards_path = Path(__file__).resolve().parent.parent / KEYBOARD_PROFILES_FILENAME
-        self.header_path = Path(__file__).resolve().parent.parent / SCRIPT_HEADER_FILENAME
-        self.export_path_path = Path(__file__).resolve().parent.parent / EXPORT_PATH_FILENAME
-        self.export_path = str(Path(__file__).resolve().parent.parent / "export.ahk")
+        self._bound_keys_by_profile = {}
+        self._frozen_actions_by_profile = {}
+        self._fragment_cache = FragmentCache()
+        self.template_expander = TemplateExpander()
+        self.worker = BackgroundWorker()
+        self._worker_poll_id = None
+        self._preview_generation = 0
+        self._preview_insert_id = None
+        self.status_var = tk.StringVar(value="")
+        self.lint_var = tk.StringVar(value="")
+        self.inherited_var = tk.StringVar(value="")
+        self.optimized_var = tk.StringVar(value="")
+        self._painted_key_colors = {}
+        self.lint_cache = LintCache()
+        self._lint_diagnostics = {}
+        self._lint_error_keys = {}
+        self.settings_path = root / SETTINGS_FILENAME
+        self.session_path = root / SESSION_FILENAME
+        self.templates_path = root / TEMPLATES_FILENAME
+        self.history = HistoryStore(root / HISTORY_DIRNAME)
+        self.keyboards_path = root / KEYBOARD_PROFILES_FILENAME
+        self.header_path = root / SCRIPT_HEADER_FILENAME
+        self.export_path_path = root / EXPORT_PATH_FILENAME
+        self.export_path = str(root / "export.ahk")
+        self.split_export_var = tk.BooleanVar(value=False)
+        self.compact_export_var = tk.BooleanVar(value=False)
+        self.probes_export_var = tk.BooleanVar(value=False)
         self.restored_last_key = ""
         self.restored_last_text = ""
         self.restored_last_modifier = "None"
-        self._suppress_profile_event = False
         self._modifier_event_suppress = False
         self.enabled_check = None
         self.enabled_var = tk.BooleanVar(value=True)
+        self.optimize_check = None
+        self.optimize_var = tk.BooleanVar(value=True)
+        self.remap_check = None
+        self.remap_var = tk.BooleanVar(value=False)
         self.tooltip_window = None
-        self._load_keyboard_profiles()
-        self.header_lines = load_script_header(self.header_path, DEFAULT_HEADER_LINES)
-        self._load_settings()
+        self.first_paint_ms = None
+        files = load_startup_files(
+            keyboards_path=self.keyboards_path,
+            header_path=self.header_path,
+            settings_path=self.settings_path,
+            session_path=self.session_path,
+            templates_path=self.templates_path,
+            fallback_profiles=DEFAULT_KEYBOARD_PROFILES,
+            default_header_lines=DEFAULT_HEADER_LINES,
+            modifier_options=MODIFIER_OPTIONS,
+        )
+        self.startup_timer.mark("config loaded")
+        self._apply_keyboard_profiles(files.keyboard_profiles, files.default_profile, files.keyboard_error)
+        self.header_lines = files.header_lines
+        self._apply_settings(files)
+        if files.templates_error:
+            messagebox.showwarning("Templates load failed", files.templates_error)
+        self.template_expander.set_templates(files.templates)
         self._load_export_path()
         self.active_button = None
         self.key_labels = {}
         self._build_layout()
+        self.startup_timer.mark("layout built")
+        self.file_watcher = FileWatcher(
+            [self.settings_path, self.keyboards_path, self.header_path, self.templates_path]
+        )
+        self.after(WATCH_INTERVAL_MS, self._poll_watched_files)
         self.protocol("WM_DELETE_WINDOW", self._on_close)
+        # The keyboard is on screen once the window is mapped and Tk has run
+        # the redraws that queued up; everything not needed for that waits.
+        self.bind("<Map>", self._on_first_map, add="+")
 
-    def _load_keyboard_profiles(self):
-        fallback = [
-            {
-                "id": "default",
-                "label": "Default keyboard",
-                "condition": "",
-                "device_id": "",
-                "description": "Global profile",
-            },
-            {
-                "id": "id1",
-                "label": "id1 keyboard",
-                "condition": "cm1.IsActive",
-                "device_id": "0x046D,0xC31C,1",
-                "description": "Logitech profile",
-            },
-            {
-                "id": "id2",
-                "label": "id2 keyboard",
-                "condition": "cm2.IsActive",
-                "device_id": "0x258A,0x002A,1",
-                "description": "Secondary profile",
-            },
-        ]
-        data = {}
-        try:
-            with open(self.keyboards_path, "r", encoding="utf-8") as handle:
-                data = json.load(handle)
-        except FileNotFoundError:
-            data = {}
-        except (OSError, json.JSONDecodeError) as exc:
-            messagebox.showwarning(
-                "Keyboard profiles",
-                f"Unable to read {self.keyboards_path.name}:\n{exc}",
+    def _on_first_map(self, event):
+        # Children's <Map> events reach the window's bindings too.
+        if event.widget is not self or self.first_paint_ms is not None:
+            return
+        self.update_idletasks()
+        self.first_paint_ms = self.startup_timer.mark("first paint")
+        if self.first_paint_ms > FIRST_PAINT_BUDGET_MS:
+            self.status_var.set(
+                f"Slow startup: {self.first_paint_ms:.0f} ms to first paint (budget {FIRST_PAINT_BUDGET_MS} ms)"
             )
-            data = {}
-        raw_profiles = data.get("profiles")
-        profiles = []
-        if isinstance(raw_profiles, list):
-            for entry in raw_profiles:
-                if not isinstance(entry, dict):
-                    continue
-                profile_id = str(entry.get("id", "")).strip()
-                label = str(entry.get("label", "")).strip()
-                if not profile_id or not label:
-                    continue
-                condition = str(entry.get("condition", "")).strip()
-                profiles.append(
-                    {
-                        "id": profile_id,
-                        "label": label,
-                        "condition": condition,
-                        "device_id": str(entry.get("device_id", "")).strip(),
-                        "description": str(entry.get("description", "")).strip(),
-                    }
-                )
-        if not profiles:
-            profiles = fallback
+        self.after_idle(self._finish_startup)
+
+    def _finish_startup(self):
+        self._restore_selection()
+        if self._pending_profiles is None:
+            self._refresh_script_preview()
+        else:
+            self._load_pending_profiles()
+
+    def _apply_keyboard_profiles(self, profiles, default_profile, error):
+        if error:
+            messagebox.showwarning("Keyboard profiles", error)
+        self._set_keyboard_profiles(profiles)
+        self.current_profile_id = default_profile
+        self.profile_var.set(self.profile_label_by_id.get(self.current_profile_id, profiles[0]["label"]))
+
+    def _set_keyboard_profiles(self, profiles):
         self.keyboard_profiles = profiles
         self.profile_label_by_id = {p["id"]: p["label"] for p in profiles}
         self.profile_id_by_label = {p["label"]: p["id"] for p in profiles}
-        default_profile = str(data.get("default_profile", "")).strip()
-        if default_profile not in self.profile_label_by_id:
-            default_profile = profiles[0]["id"]
-        self.current_profile_id = default_profile
-        self.profile_var.set(self.profile_label_by_id.get(self.current_profile_id, profiles[0]["label"]))
+        self._profile_index = ProfileIndex(profiles)
 
-    def _load_settings(self):
-        settings, error = load_settings(self.settings_path, modifier_options=MODIFIER_OPTIONS)
-        if error:
-            messagebox.showwarning("Settings load failed", error)
+    def _apply_settings(self, files):
+        settings = files.settings
+        if files.settings_error:
+            messagebox.showwarning("Settings load failed", files.settings_error)
             return
 
-        self.restored_last_key = settings.last_key
-        self.restored_last_text = settings.last_text
-        self.restored_last_modifier = settings.last_modifier
-        if settings.last_profile in self.profile_label_by_id:
-            self.current_profile_id = settings.last_profile
+        session = files.session
+        if files.session_error:
+            messagebox.showwarning("Session load failed", files.session_error)
+        if session is None:
+            # Older combined files kept the session fields next to the actions;
+            # they move to the session file on the next session save.
+            session = settings.legacy_session or LoadedSession()
+
+        self.restored_last_key = session.last_key
+        self.restored_last_text = session.last_text
+        self.restored_last_modifier = session.last_modifier
+        if session.last_profile in self.profile_label_by_id:
+            self.current_profile_id = session.last_profile
         if not self.current_profile_id and self.keyboard_profiles:
             self.current_profile_id = self.keyboard_profiles[0]["id"]
 
-        self.actions_by_profile = settings.actions_by_profile
+        # Only the shown profile is sanitized now; the rest load in the
+        # background once the window is up, or on first use.
+        self.actions_by_profile = {}
+        self._resolved_profiles = None
+        self._settings_base = LoadedSettings(version=settings.version)
+        self._pending_profiles = files.pending_profiles
+        self._ensure_profile_loaded(self.current_profile_id)
+
+    def _ensure_profile_loaded(self, profile_id):
+        # A profile is shown merged with its ancestors, so they load too.
+        if self._pending_profiles is not None:
+            self._pending_profiles.load_into(self.actions_by_profile, self._resolved().chain(profile_id))
+
+    def _resolved(self):
+        if self._resolved_profiles is None:
+            self._resolved_profiles = ResolvedProfiles(self.actions_by_profile, self.keyboard_profiles)
+        return self._resolved_profiles
+
+    def _ensure_all_profiles_loaded(self):
+        pending = self._pending_profiles
+        if pending is None:
+            return
+        pending.load_into(self.actions_by_profile)
+        self._pending_profiles = None
+        # Nothing can have been edited yet: every edit loads all profiles first.
+        self._settings_base = LoadedSettings(
+            actions_by_profile=copy_actions(self.actions_by_profile),
+            version=self._settings_base.version,
+        )
+
+    def _load_pending_profiles(self):
+        pending = self._pending_profiles
+        if pending is None:
+            return
+        batch = pending.pending()[:PROFILE_LOAD_BATCH]
+        pending.load_into(self.actions_by_profile, batch)
+        if len(batch) == PROFILE_LOAD_BATCH:
+            self.after(1, self._load_pending_profiles)
+            return
+        self._ensure_all_profiles_loaded()
+        self._refresh_script_preview()
+
+    def _load_templates(self):
+        templates, error = load_templates(self.templates_path)
+        if error:
+            messagebox.showwarning("Templates load failed", error)
+        return self.template_expander.set_templates(templates)
+
+    def _reload_templates(self):
+        changed = self._load_templates()
+        if not changed:
+            return
+        self._ensure_all_profiles_loaded()
+        for profile_id in template_dependents(self.actions_by_profile, changed):
+            self._invalidate_profile(profile_id)
+            for child_id in self._resolved().descendants(profile_id):
+                self._invalidate_profile(child_id)
+        self._refresh_script_preview()
 
     def _load_export_path(self):
         try:
@@ -156,6 +306,9 @@ class AHKBuilder(tk.Tk):
                 saved_path = data.get("export_path", "").strip()
                 if saved_path:
                     self.export_path = saved_path
+                self.split_export_var.set(bool(data.get("split_profiles", False)))
+                self.compact_export_var.set(bool(data.get("compact", False)))
+                self.probes_export_var.set(bool(data.get("probes", False)))
         except FileNotFoundError:
             pass
         except (OSError, json.JSONDecodeError) as exc:
@@ -167,13 +320,26 @@ class AHKBuilder(tk.Tk):
     def _save_export_path(self):
         try:
             with open(self.export_path_path, "w", encoding="utf-8") as handle:
-                json.dump({"export_path": self.export_path}, handle, indent=2)
+                json.dump(
+                    {
+                        "export_path": self.export_path,
+                        "split_profiles": self.split_export_var.get(),
+                        "compact": self.compact_export_var.get(),
+                        "probes": self.probes_export_var.get(),
+                    },
+                    handle,
+                    indent=2,
+                )
         except OSError as exc:
             messagebox.showerror(
                 "Save export path failed",
                 f"Couldn't write {self.export_path_path.name}:\n{exc}",
             )
 
+    def _on_compact_changed(self):
+        self._save_export_path()
+        self._refresh_script_preview()
+
     def _on_export_path_changed(self, event=None):
         new_path = self.export_path_var.get().strip()
         if new_path and new_path != self.export_path:
@@ -232,9 +398,7 @@ class AHKBuilder(tk.Tk):
                     row_frame.grid_columnconfigure(col, weight=1)
         self._create_control_panel()
         self._apply_restored_profile()
-        self._restore_selection()
         self._refresh_button_colors()
-        self._refresh_script_preview()
 
     def _create_control_panel(self):
         control_frame = tk.Frame(self, bg="#f5f5f5")
@@ -242,7 +406,8 @@ class AHKBuilder(tk.Tk):
 
         detail_frame = tk.LabelFrame(control_frame, text="Key Detail", bg="#ffffff")
         detail_frame.pack(side="left", fill="y", padx=6, pady=4)
-        tk.Label(detail_frame, textvariable=self.selected_key_label, bg="#ffffff").pack(pady=8, padx=8)
+        tk.Label(detail_frame, textvariable=self.selected_key_label, bg="#ffffff").pack(pady=(8, 0), padx=8)
+        tk.Label(detail_frame, textvariable=self.inherited_var, bg="#ffffff", fg="#555555").pack(padx=8, pady=(0, 6))
         modifier_frame = tk.Frame(detail_frame, bg="#ffffff")
         modifier_frame.pack(fill="x", padx=8, pady=(0, 6))
         tk.Label(modifier_frame, text="Modifier:", bg="#ffffff").pack(side="left")
@@ -268,24 +433,58 @@ class AHKBuilder(tk.Tk):
             command=self._on_enabled_change,
         )
         self.enabled_check.pack(side="left")
+        self.optimize_check = tk.Checkbutton(
+            status_frame,
+            text=MODIFIER_OPTIMIZE_TEXT,
+            bg="#ffffff",
+            variable=self.optimize_var,
+            command=self._on_enabled_change,
+        )
+        self.optimize_check.pack(side="left", padx=(6, 0))
+        self.remap_check = tk.Checkbutton(
+            status_frame,
+            text=MODIFIER_REMAP_TEXT,
+            bg="#ffffff",
+            variable=self.remap_var,
+            command=self._on_enabled_change,
+        )
+        self.remap_check.pack(side="left", padx=(6, 0))
         tk.Button(detail_frame, text="Clear assignment", command=self._clear_assignment).pack(
             pady=4, padx=8, fill="x"
         )
+        tk.Button(detail_frame, text="Bulk edit...", command=self._open_bulk_edit).pack(pady=4, padx=8, fill="x")
+        tk.Button(detail_frame, text="History...", command=self._open_history).pack(pady=4, padx=8, fill="x")
+        tk.Button(detail_frame, text="Hotstrings...", command=self._open_hotstrings).pack(pady=4, padx=8, fill="x")
 
         action_frame = tk.LabelFrame(control_frame, text="Action script", bg="#ffffff")
         action_frame.pack(side="left", fill="both", expand=True, padx=6, pady=4)
         self.action_entry = scrolledtext.ScrolledText(action_frame, height=8, width=36, wrap="word")
         self.action_entry.pack(fill="both", expand=True, padx=6, pady=4)
-        tk.Button(action_frame, text="Save action", command=self._save_action).pack(pady=2, padx=6, anchor="e")
+        tk.Label(
+            action_frame,
+            textvariable=self.lint_var,
+            bg="#ffffff",
+            fg="#b00020",
+            justify="left",
+            anchor="w",
+        ).pack(fill="x", padx=6)
+        action_buttons = tk.Frame(action_frame, bg="#ffffff")
+        action_buttons.pack(fill="x", padx=6, pady=2)
+        tk.Button(action_buttons, text="Save action", command=self._save_action).pack(side="right")
+        tk.Button(action_buttons, text="Reload templates", command=self._reload_templates).pack(side="left")
 
         preview_frame = tk.LabelFrame(control_frame, text="Script preview", bg="#ffffff")
         preview_frame.pack(side="left", fill="both", expand=True, padx=6, pady=4)
         self.preview_box = scrolledtext.ScrolledText(preview_frame, height=12, wrap="word", state="disabled")
         self.preview_box.pack(fill="both", expand=True, padx=6, pady=(6, 2))
+        self.preview_box.tag_configure("optimized", background=PREVIEW_OPTIMIZED_BG)
+        tk.Label(preview_frame, textvariable=self.optimized_var, bg="#ffffff", fg="#2e7d32").pack(anchor="w", padx=6)
         button_frame = tk.Frame(preview_frame, bg="#ffffff")
         button_frame.pack(fill="x", padx=6, pady=(0, 6))
         tk.Button(button_frame, text="Export .ahk script", command=self._export_script).pack(side="left")
+        tk.Button(button_frame, text="Import .ahk...", command=self._import_script).pack(side="left", padx=(6, 0))
         tk.Button(button_frame, text="Refresh preview", command=self._refresh_script_preview).pack(side="right")
+        tk.Label(button_frame, textvariable=self.status_var, bg="#ffffff", fg="#555555").pack(side="right", padx=6)
         save_to_frame = tk.Frame(preview_frame, bg="#ffffff")
         save_to_frame.pack(fill="x", padx=6, pady=(0, 6))
         tk.Label(save_to_frame, text="Save to:", bg="#ffffff").pack(side="left")
@@ -294,41 +493,57 @@ class AHKBuilder(tk.Tk):
         export_path_entry.pack(side="left", padx=(6, 0), fill="x", expand=True)
         export_path_entry.bind("<FocusOut>", self._on_export_path_changed)
         tk.Button(save_to_frame, text="Browse...", command=self._browse_export_path).pack(side="left", padx=(6, 0))
+        tk.Checkbutton(
+            preview_frame,
+            text="One file per profile (#include)",
+            bg="#ffffff",
+            variable=self.split_export_var,
+            command=self._save_export_path,
+        ).pack(anchor="w", padx=6, pady=(0, 6))
+        tk.Checkbutton(
+            preview_frame,
+            text="Compact output (one-line hotkeys, no comments)",
+            bg="#ffffff",
+            variable=self.compact_export_var,
+            command=self._on_compact_changed,
+        ).pack(anchor="w", padx=6, pady=(0, 6))
+        tk.Checkbutton(
+            preview_frame,
+            text=f"Latency probes (log hotkey run times to {PROBE_LOG_FILENAME})",
+            bg="#ffffff",
+            variable=self.probes_export_var,
+            command=self._save_export_path,
+        ).pack(anchor="w", padx=6, pady=(0, 6))
 
     def _add_function_dropdown(self, parent):
         drop_frame = tk.Frame(parent, bg="#ffffff")
         drop_frame.pack(fill="x", padx=6, pady=(4, 6))
         tk.Label(drop_frame, text="Profile", bg="#ffffff").pack(side="left", padx=(4, 6))
-        labels = [profile["label"] for profile in self.keyboard_profiles]
-        combo = ttk.Combobox(drop_frame, textvariable=self.profile_var, values=labels, state="readonly")
-        initial_label = self.profile_label_by_id.get(self.current_profile_id, labels[0] if labels else "")
-        self.profile_var.set(initial_label)
-        self.profile_combo = combo
-        self._suppress_profile_event = True
-        combo.set(initial_label)
-        self._suppress_profile_event = False
-        combo.pack(side="left", fill="x", expand=True, padx=(0, 4))
-        combo.bind("<<ComboboxSelected>>", self._on_profile_selected)
-
-    def _on_profile_selected(self, event=None):
-        if self._suppress_profile_event:
-            return
-        label = self.profile_var.get()
-        profile_id = self.profile_id_by_label.get(label)
-        if not profile_id:
+        # A button rather than a combobox: the picker it opens filters as you
+        # type, which a dropdown of every device profile can't.
+        self.profile_var.set(self.profile_label_by_id.get(self.current_profile_id, ""))
+        self.profile_button = tk.Button(
+            drop_frame, textvariable=self.profile_var, anchor="w", command=self._open_profile_picker
+        )
+        self.profile_button.pack(side="left", fill="x", expand=True, padx=(0, 4))
+
+    def _select_profile(self, profile_id):
+        if profile_id not in self.profile_label_by_id:
             profile_id = self.keyboard_profiles[0]["id"]
-            label = self.profile_label_by_id.get(profile_id, "")
-            self.profile_var.set(label)
-            if self.profile_combo:
-                self.profile_combo.set(label)
+        self.profile_var.set(self.profile_label_by_id[profile_id])
+        if profile_id == self.current_profile_id:
+            return
+        # Switching profiles only changes what is shown: the bindings, the
+        # preview and the settings file are all unaffected. The session
+        # remembers it so the next start opens on this profile.
         self.current_profile_id = profile_id
+        self._ensure_profile_loaded(profile_id)
         if self.selected_key_id:
             display = self.key_labels.get(self.selected_key_id, self.selected_key_id)
             self._update_selected_key_label(display, self.selected_key_id)
         self._refresh_action_entry()
-        self._refresh_button_colors()
-        self._refresh_script_preview()
-        self._save_settings()
+        self._repaint_changed_buttons()
+        self._save_session()
 
     def _restore_selection(self):
         if not self.restored_last_key:
@@ -347,18 +562,13 @@ class AHKBuilder(tk.Tk):
         self.restored_last_text = ""
 
     def _apply_restored_profile(self):
-        if not self.profile_combo:
-            return
         label = self.profile_label_by_id.get(self.current_profile_id)
         if not label and self.keyboard_profiles:
             self.current_profile_id = self.keyboard_profiles[0]["id"]
+            self._ensure_profile_loaded(self.current_profile_id)
             label = self.profile_label_by_id.get(self.current_profile_id, "")
-        if not label:
-            return
-        self.profile_var.set(label)
-        self._suppress_profile_event = True
-        self.profile_combo.set(label)
-        self._suppress_profile_event = False
+        if label:
+            self.profile_var.set(label)
 
     def _set_modifier_selection(self, modifier):
         if modifier not in MODIFIER_OPTIONS:
@@ -373,23 +583,62 @@ class AHKBuilder(tk.Tk):
             info = entry.get(modifier, {})
             enabled = info.get("enabled", True)
             self.enabled_var.set(enabled)
+            self.optimize_var.set(info.get("optimize", True) is not False)
+            self.remap_var.set(info.get("remap") is True)
 
-    def _set_modifier_state(self, modifier, action_text, enabled):
+    def _set_modifier_state(self, batch, modifier, action_text, enabled, optimize=True, remap=False):
         if not self.selected_key_id:
             return False
-        profile_actions = self.actions_by_profile.setdefault(self.current_profile_id, {})
-        entry = profile_actions.setdefault(self.selected_key_id, {})
-        if not isinstance(entry, dict):
-            entry = {}
-            profile_actions[self.selected_key_id] = entry
         text = action_text.strip()
-        if text or enabled:
-            entry[modifier] = {"action": text, "enabled": bool(enabled)}
+        template_call = parse_template_call(text)
+        if template_call is not None:
+            name, args = template_call
+            data = {"action": "", "enabled": bool(enabled), "template": name, "args": args}
+        elif text or enabled:
+            data = {"action": text, "enabled": bool(enabled)}
         else:
-            entry.pop(modifier, None)
-            if not entry:
-                profile_actions.pop(self.selected_key_id, None)
-        return True
+            data = None
+        if data is not None and not optimize:
+            # Opted out: the body is always emitted as written.
+            data["optimize"] = False
+        elif data is not None and remap:
+            # Opted in: a remap also fires with other modifiers held.
+            data["remap"] = True
+        return batch.set(self.current_profile_id, self.selected_key_id, modifier, data)
+
+    @contextmanager
+    def _edit_bindings(self, message=""):
+        # Every change to actions_by_profile goes through a batch. Nested
+        # calls join the outer batch, and the outermost one commits all of it
+        # with a single save, recompile and repaint, or rolls it back on error.
+        if self._active_batch is not None:
+            yield self._active_batch
+            return
+        self._ensure_all_profiles_loaded()
+        batch = BindingBatch(self.actions_by_profile)
+        self._active_batch = batch
+        try:
+            yield batch
+        except BaseException:
+            batch.rollback()
+            raise
+        finally:
+            self._active_batch = None
+        self._commit_batch(batch, message)
+
+    def _commit_batch(self, batch, message):
+        changes = batch.changes()
+        if not changes:
+            return
+        self._invalidate_bindings(changes)
+        if self._hotstring_index is not None:
+            self._hotstring_index.apply_changes(changes)
+        if self._binding_counts is not None:
+            self._binding_counts.apply_changes(changes)
+        self._save_settings(message)
+        self._refresh_action_entry()
+        self._refresh_script_preview()
+        self._repaint_changed_buttons()
 
     def _on_modifier_selected(self, event=None):
         if self._modifier_event_suppress:
@@ -402,10 +651,10 @@ class AHKBuilder(tk.Tk):
         modifier = self.modifier_var.get()
         action_text = self.action_entry.get("1.0", "end").strip()
         enabled = self.enabled_var.get()
-        self._set_modifier_state(modifier, action_text, enabled)
-        self._save_settings()
-        self._refresh_script_preview()
-        self._refresh_button_colors()
+        with self._edit_bindings() as batch:
+            self._set_modifier_state(
+                batch, modifier, action_text, enabled, self.optimize_var.get(), self.remap_var.get()
+            )
 
     def _format_key_display(self, raw_key):
         cleaned = raw_key.strip()
@@ -472,23 +721,52 @@ class AHKBuilder(tk.Tk):
         entry = self._get_profile_entry(self.selected_key_id)
         modifier_info = entry.get(modifier, {})
         enabled = True
-        action_text = ""
+        optimize = True
+        remap = False
+        action_text = self._modifier_text(modifier_info)
         if isinstance(modifier_info, dict):
-            action_text = modifier_info.get("action", "")
             enabled = modifier_info.get("enabled", True)
-        elif isinstance(modifier_info, str):
-            action_text = modifier_info
+            optimize = modifier_info.get("optimize", True) is not False
+            remap = modifier_info.get("remap") is True
         if self.enabled_check:
             self._modifier_event_suppress = True
             self.enabled_var.set(enabled)
             self.enabled_check.select() if enabled else self.enabled_check.deselect()
+            self.optimize_var.set(optimize)
+            self.remap_var.set(remap)
             self._modifier_event_suppress = False
         self.action_entry.delete("1.0", "end")
         if action_text:
             self.action_entry.insert("1.0", action_text)
+        source = self._inherited_from(self.selected_key_id, modifier)
+        self.inherited_var.set(f"Inherited from {source}; saving overrides it here" if source else "")
+        self._refresh_lint_label()
+
+    def _refresh_lint_label(self):
+        key = (self.current_profile_id, self.selected_key_id, self.modifier_var.get())
+        diagnostics = self._lint_diagnostics.get(key, ())
+        self.lint_var.set("\n".join(item.format() for item in diagnostics))
+
+    def _modifier_text(self, modifier_info):
+        if isinstance(modifier_info, str):
+            return modifier_info
+        if not isinstance(modifier_info, dict):
+            return ""
+        template = modifier_info.get("template")
+        if isinstance(template, str) and template:
+            return format_template_call(template, modifier_info.get("args") or {})
+        action_text = modifier_info.get("action", "")
+        return action_text if isinstance(action_text, str) else ""
 
     def _get_profile_entry(self, key_id):
-        return self.actions_by_profile.get(self.current_profile_id, {}).get(key_id, {})
+        return self._resolved().entry(self.current_profile_id, key_id)
+
+    def _inherited_from(self, key_id, modifier):
+        resolved = self._resolved()
+        if not resolved.inherited(self.current_profile_id, key_id, modifier):
+            return ""
+        source = resolved.source(self.current_profile_id, key_id, modifier)
+        return self.profile_label_by_id.get(source, source)
 
     def _save_action(self):
         if not self.selected_key_id:
@@ -499,70 +777,625 @@ class AHKBuilder(tk.Tk):
         if modifier not in MODIFIER_OPTIONS:
             modifier = "None"
         enabled = self.enabled_var.get()
-        self._set_modifier_state(modifier, action_text, enabled)
-        self._refresh_script_preview()
+        with self._edit_bindings() as batch:
+            self._set_modifier_state(
+                batch, modifier, action_text, enabled, self.optimize_var.get(), self.remap_var.get()
+            )
         self.restored_last_text = action_text
         self.restored_last_modifier = modifier
-        self._save_settings()
-        self._refresh_button_colors()
+        self._save_session()
 
     def _clear_assignment(self):
         if not self.selected_key_id:
             return
-        profile_actions = self.actions_by_profile.get(self.current_profile_id, {})
         modifier = self.modifier_var.get()
-        entry = profile_actions.get(self.selected_key_id, {})
-        if isinstance(entry, dict):
-            entry.pop(modifier, None)
-            if not entry:
-                profile_actions.pop(self.selected_key_id, None)
+        source = self._inherited_from(self.selected_key_id, modifier)
+        if source:
+            messagebox.showinfo(
+                "Inherited binding",
+                f"This binding comes from {source}. Uncheck '{MODIFIER_ENABLED_TEXT}' and save to turn it off here.",
+            )
+            return
+        with self._edit_bindings() as batch:
+            batch.set(self.current_profile_id, self.selected_key_id, modifier, None)
         self.action_entry.delete("1.0", "end")
         self.modifier_var.set("None")
         if self.enabled_check:
             self.enabled_var.set(True)
             self.enabled_check.select()
-        self._refresh_script_preview()
+            self.optimize_var.set(True)
+            self.remap_var.set(False)
         self.restored_last_text = ""
         self.restored_last_modifier = "None"
-        self._save_settings()
-        self._refresh_button_colors()
+        self._save_session()
+
+    def _save_settings(self, message=""):
+        self._ensure_all_profiles_loaded()
+        previous_base = self._settings_base
+        result, error = commit_settings(
+            self.settings_path,
+            base=self._settings_base,
+            actions_by_profile=self.actions_by_profile,
+            modifier_options=MODIFIER_OPTIONS,
+        )
+        if error:
+            messagebox.showerror("Save settings failed", f"Couldn't write {self.settings_path.name}:\n{error}")
+            return
+        self._settings_base = result.settings
+        if hasattr(self, "file_watcher"):
+            self.file_watcher.mark_current(self.settings_path)
+        self._record_history(previous_base, result.settings, message)
+        if result.incoming:
+            # Another writer changed other bindings meanwhile; take just those.
+            apply_delta(self.actions_by_profile, result.incoming)
+            self._hotstring_index = None
+            self._binding_counts = None
+            self._invalidate_bindings(result.incoming)
+            self._refresh_action_entry()
+            self._refresh_script_preview()
+            self._repaint_changed_buttons()
+        self._warn_conflicts(result.conflicts)
+
+    def _warn_conflicts(self, conflicts):
+        if not conflicts:
+            return
+        shown = "\n".join(conflict.describe() for conflict in conflicts[:15])
+        messagebox.showwarning(
+            "Conflicting edits",
+            f"{self.settings_path.name} was also changed elsewhere. "
+            f"These bindings were edited on both sides; your version was kept:\n{shown}",
+        )
 
-    def _save_settings(self):
+    def _save_session(self):
         last_text = ""
         if hasattr(self, "action_entry"):
             last_text = self.action_entry.get("1.0", "end").strip()
-        error = save_settings(
-            self.settings_path,
-            actions_by_profile=self.actions_by_profile,
+        error = save_session(
+            self.session_path,
             last_key=self.selected_key_id,
             last_profile=self.current_profile_id,
             last_text=last_text,
             last_modifier=self.restored_last_modifier,
+        )
+        if error:
+            messagebox.showerror("Save session failed", f"Couldn't write {self.session_path.name}:\n{error}")
+
+    def _record_history(self, previous_base, settings, message):
+        try:
+            if self.history.head() is None and previous_base.actions_by_profile:
+                self.history.commit(
+                    previous_base.actions_by_profile, message="initial", version=previous_base.version
+                )
+            self.history.commit(settings.actions_by_profile, message=message, version=settings.version)
+        except OSError as exc:
+            self.status_var.set(f"History not recorded: {exc}")
+
+    def _open_history(self):
+        try:
+            commits = list(itertools.islice(self.history.log(), HISTORY_DIALOG_LIMIT))
+        except (OSError, ValueError, KeyError) as exc:
+            messagebox.showerror("History", f"Couldn't read history:\n{exc}")
+            return
+        if not commits:
+            messagebox.showinfo("History", "No versions recorded yet.")
+            return
+        win = tk.Toplevel(self)
+        win.title("Assignment history")
+        win.geometry("640x420")
+        listbox = tk.Listbox(win, height=10, exportselection=False)
+        listbox.pack(fill="x", padx=8, pady=(8, 4))
+        for info in commits:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info.timestamp))
+            label = f"{info.commit_id[:10]}  {stamp}  v{info.version}"
+            if info.message:
+                label = f"{label}  {info.message}"
+            listbox.insert("end", label)
+        details = scrolledtext.ScrolledText(win, height=12, wrap="word", state="disabled")
+        details.pack(fill="both", expand=True, padx=8, pady=4)
+
+        def selected():
+            picked = listbox.curselection()
+            return commits[picked[0]] if picked else None
+
+        def show_changes(event=None):
+            info = selected()
+            if info is None:
+                return
+            changes = self.history.diff(info.parent, info.commit_id) if info.parent else []
+            lines = [f"{len(changes)} binding(s) changed"]
+            for change in changes:
+                before = (change.before or {}).get("action", "").splitlines()[:1]
+                after = (change.after or {}).get("action", "").splitlines()[:1]
+                lines.append(
+                    f"{change.profile_id} / {change.key_id} / {change.modifier}: "
+                    f"{before[0] if before else '-'}  ->  {after[0] if after else '-'}"
+                )
+            details.configure(state="normal")
+            details.delete("1.0", "end")
+            details.insert("1.0", "\n".join(lines))
+            details.configure(state="disabled")
+
+        def restore():
+            info = selected()
+            if info is None:
+                return
+            if not messagebox.askyesno("Restore", f"Restore assignments to {info.commit_id[:10]}?", parent=win):
+                return
+            self._restore_actions(self.history.read_actions(info.commit_id), f"restore {info.commit_id[:10]}")
+            win.destroy()
+
+        listbox.bind("<<ListboxSelect>>", show_changes)
+        button_frame = tk.Frame(win)
+        button_frame.pack(fill="x", padx=8, pady=(0, 8))
+        tk.Button(button_frame, text="Restore this version", command=restore).pack(side="right")
+
+    def _restore_actions(self, actions_by_profile, message):
+        delta = diff_bindings(flatten_actions(self.actions_by_profile), flatten_actions(actions_by_profile))
+        with self._edit_bindings(message) as batch:
+            for binding, data in delta.items():
+                batch.set(*binding, data)
+
+    def _open_bulk_edit(self):
+        labels = [profile["label"] for profile in self.keyboard_profiles]
+        current_label = self.profile_label_by_id.get(self.current_profile_id, labels[0] if labels else "")
+        win = tk.Toplevel(self)
+        win.title("Bulk edit")
+        win.resizable(False, False)
+        all_profiles_var = tk.BooleanVar(value=False)
+        overwrite_var = tk.BooleanVar(value=False)
+
+        def scope():
+            return None if all_profiles_var.get() else [self.current_profile_id]
+
+        def scope_text():
+            return "all profiles" if all_profiles_var.get() else current_label
+
+        copy_frame = tk.LabelFrame(win, text="Copy profile")
+        copy_frame.pack(fill="x", padx=8, pady=(8, 4))
+        source_var = tk.StringVar(value=current_label)
+        target_var = tk.StringVar(value="")
+        ttk.Combobox(copy_frame, textvariable=source_var, values=labels, state="readonly", width=18).pack(
+            side="left", padx=4, pady=4
+        )
+        tk.Label(copy_frame, text="onto").pack(side="left")
+        ttk.Combobox(copy_frame, textvariable=target_var, values=labels, state="readonly", width=18).pack(
+            side="left", padx=4, pady=4
+        )
+
+        def copy():
+            source_id = self.profile_id_by_label.get(source_var.get())
+            target_id = self.profile_id_by_label.get(target_var.get())
+            if not source_id or not target_id or source_id == target_id:
+                messagebox.showinfo("Bulk edit", "Pick two different profiles.", parent=win)
+                return
+            message = f"copy {source_id} onto {target_id}"
+            with self._edit_bindings(message) as batch:
+                count = copy_profile(batch, source_id, target_id, overwrite=overwrite_var.get())
+            self.status_var.set(f"Copied {count} binding(s) onto {target_var.get()}.")
+
+        tk.Button(copy_frame, text="Copy", command=copy).pack(side="right", padx=4)
+
+        modifier_frame = tk.LabelFrame(win, text="Enable or disable a modifier")
+        modifier_frame.pack(fill="x", padx=8, pady=4)
+        modifier_var = tk.StringVar(value=self.modifier_var.get())
+        ttk.Combobox(
+            modifier_frame, textvariable=modifier_var, values=MODIFIER_OPTIONS, state="readonly", width=8
+        ).pack(side="left", padx=4, pady=4)
+
+        def toggle(enabled):
+            modifier = modifier_var.get()
+            verb = "enable" if enabled else "disable"
+            with self._edit_bindings(f"{verb} {modifier} in {scope_text()}") as batch:
+                count = set_modifier_enabled(batch, modifier, enabled, profile_ids=scope())
+            self.status_var.set(f"{verb.capitalize()}d {count} {modifier} binding(s) in {scope_text()}.")
+
+        tk.Button(modifier_frame, text="Disable", command=lambda: toggle(False)).pack(side="right", padx=4)
+        tk.Button(modifier_frame, text="Enable", command=lambda: toggle(True)).pack(side="right", padx=4)
+
+        remap_frame = tk.LabelFrame(win, text="Move a key's bindings")
+        remap_frame.pack(fill="x", padx=8, pady=4)
+        source_key_var = tk.StringVar(value=self.selected_key_id)
+        target_key_var = tk.StringVar(value="")
+        tk.Entry(remap_frame, textvariable=source_key_var, width=12).pack(side="left", padx=4, pady=4)
+        tk.Label(remap_frame, text="to").pack(side="left")
+        tk.Entry(remap_frame, textvariable=target_key_var, width=12).pack(side="left", padx=4, pady=4)
+
+        def remap():
+            source_key = source_key_var.get().strip().lower()
+            target_key = target_key_var.get().strip().lower()
+            if target_key not in self.key_labels:
+                messagebox.showerror("Bulk edit", f"Unknown key: {target_key or '(empty)'}", parent=win)
+                return
+            with self._edit_bindings(f"move {source_key} to {target_key} in {scope_text()}") as batch:
+                moved, skipped = remap_key(
+                    batch, source_key, target_key, profile_ids=scope(), overwrite=overwrite_var.get()
+                )
+            self.status_var.set(f"Moved {moved} binding(s) from {source_key} to {target_key}.")
+            if skipped:
+                shown = "\n".join(" / ".join(binding) for binding in skipped[:15])
+                messagebox.showwarning(
+                    "Bulk edit",
+                    f"{len(skipped)} binding(s) were left in place because {target_key} "
+                    f"already has them (tick 'Overwrite' to replace):\n{shown}",
+                    parent=win,
+                )
+
+        tk.Button(remap_frame, text="Move", command=remap).pack(side="right", padx=4)
+
+        options_frame = tk.Frame(win)
+        options_frame.pack(fill="x", padx=8, pady=(4, 8))
+        tk.Checkbutton(
+            options_frame, text="Apply to all profiles (not just the current one)", variable=all_profiles_var
+        ).pack(anchor="w")
+        tk.Checkbutton(options_frame, text="Overwrite existing bindings", variable=overwrite_var).pack(anchor="w")
+
+    def _binding_count(self, profile_id):
+        if self._binding_counts is None:
+            self._ensure_all_profiles_loaded()
+            self._binding_counts = BindingCounts.build(self.actions_by_profile)
+        return self._binding_counts.get(profile_id)
+
+    def _open_profile_picker(self):
+        win = tk.Toplevel(self)
+        win.title("Choose profile")
+        win.transient(self)
+        filter_var = tk.StringVar(value="")
+        count_var = tk.StringVar(value="")
+        shown = []
+
+        filter_frame = tk.Frame(win)
+        filter_frame.pack(fill="x", padx=8, pady=(8, 4))
+        tk.Label(filter_frame, text="Find:").pack(side="left")
+        filter_entry = tk.Entry(filter_frame, textvariable=filter_var, width=32)
+        filter_entry.pack(side="left", padx=(6, 0), fill="x", expand=True)
+        listbox = tk.Listbox(win, height=16, width=64, exportselection=False)
+        listbox.pack(fill="both", expand=True, padx=8, pady=4)
+        tk.Label(win, textvariable=count_var, fg="#555555").pack(anchor="w", padx=8, pady=(0, 8))
+
+        def refresh_list(*_args):
+            # Label, id, device id and description are all searchable.
+            matches = self._profile_index.search(filter_var.get(), PROFILE_PICKER_LIMIT)
+            shown[:] = [match.profile_id for match in matches]
+            listbox.delete(0, "end")
+            for match in matches:
+                text = f"{match.label}  [{match.profile_id}]  {self._binding_count(match.profile_id)} binding(s)"
+                if match.parent:
+                    text = f"{text}, inherits {self.profile_label_by_id.get(match.parent, match.parent)}"
+                listbox.insert("end", text)
+            if shown:
+                current = shown.index(self.current_profile_id) if self.current_profile_id in shown else 0
+                listbox.selection_set(current)
+                listbox.see(current)
+            count_var.set(f"{len(shown)} of {len(self._profile_index)} profile(s)")
+
+        def move(step):
+            selection = listbox.curselection()
+            if not shown:
+                return "break"
+            index = min(max((selection[0] if selection else -1) + step, 0), len(shown) - 1)
+            listbox.selection_clear(0, "end")
+            listbox.selection_set(index)
+            listbox.see(index)
+            return "break"
+
+        def choose(_event=None):
+            selection = listbox.curselection()
+            if shown:
+                self._select_profile(shown[selection[0] if selection else 0])
+            win.destroy()
+
+        filter_entry.bind("<Down>", lambda event: move(1))
+        filter_entry.bind("<Up>", lambda event: move(-1))
+        filter_entry.bind("<Return>", choose)
+        listbox.bind("<Double-Button-1>", choose)
+        listbox.bind("<Return>", choose)
+        win.bind("<Escape>", lambda event: win.destroy())
+        filter_var.trace_add("write", refresh_list)
+        refresh_list()
+        filter_entry.focus_set()
+
+    def _hotstrings(self):
+        if self._hotstring_index is None:
+            self._ensure_all_profiles_loaded()
+            self._hotstring_index = HotstringIndex.build(self.actions_by_profile, self.keyboard_profiles)
+        return self._hotstring_index
+
+    def _open_hotstrings(self):
+        profile_id = self.current_profile_id
+        win = tk.Toplevel(self)
+        win.title(f"Hotstrings · {self.profile_label_by_id.get(profile_id, profile_id)}")
+        filter_var = tk.StringVar(value="")
+        options_var = tk.StringVar(value="")
+        abbrev_var = tk.StringVar(value="")
+        issues_var = tk.StringVar(value="")
+        shown = []
+
+        filter_frame = tk.Frame(win)
+        filter_frame.pack(fill="x", padx=8, pady=(8, 4))
+        tk.Label(filter_frame, text="Starts with:").pack(side="left")
+        filter_entry = tk.Entry(filter_frame, textvariable=filter_var, width=24)
+        filter_entry.pack(side="left", padx=(6, 0), fill="x", expand=True)
+        listbox = tk.Listbox(win, height=12, width=48, exportselection=False)
+        listbox.pack(fill="both", expand=True, padx=8, pady=4)
+
+        edit_frame = tk.Frame(win)
+        edit_frame.pack(fill="x", padx=8, pady=4)
+        tk.Label(edit_frame, text="Options").grid(row=0, column=0, sticky="w")
+        tk.Entry(edit_frame, textvariable=options_var, width=8).grid(row=1, column=0, sticky="w")
+        tk.Label(edit_frame, text="Abbreviation").grid(row=0, column=1, sticky="w", padx=(6, 0))
+        tk.Entry(edit_frame, textvariable=abbrev_var, width=24).grid(row=1, column=1, sticky="we", padx=(6, 0))
+        edit_frame.columnconfigure(1, weight=1)
+        text_box = tk.Text(win, height=4, width=48, wrap="word")
+        text_box.pack(fill="x", padx=8, pady=4)
+        tk.Label(
+            win, text="One line is typed as the replacement; use option X or several lines to run code.", fg="#555555"
+        ).pack(anchor="w", padx=8)
+        tk.Label(win, textvariable=issues_var, fg="#b00020", justify="left").pack(anchor="w", padx=8, pady=(4, 0))
+
+        def refresh_list(*_args):
+            # Prefix search in the condition's trie, so this stays fast with
+            # thousands of abbreviations.
+            entries = self._hotstrings().search(profile_id, filter_var.get(), HOTSTRING_LIST_LIMIT)
+            shown[:] = [entry.key_id for entry in entries]
+            listbox.delete(0, "end")
+            for key_id in shown:
+                listbox.insert("end", key_id)
+
+        def show_issues(key_id):
+            index = self._hotstrings()
+            lines = [issue.format() for issue in index.issues_for(profile_id, key_id)]
+            longer = index.longer_count(profile_id, key_id)
+            if longer:
+                lines.append(f"{longer} longer abbreviation(s) start with this one")
+            issues_var.set("\n".join(lines))
+
+        def on_select(_event=None):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            key_id = shown[selection[0]]
+            options, abbrev = parse_hotstring_id(key_id)
+            options_var.set(options)
+            abbrev_var.set(abbrev)
+            info = self.actions_by_profile.get(profile_id, {}).get(key_id, {}).get(HOTSTRING_MODIFIER, {})
+            text_box.delete("1.0", "end")
+            text_box.insert("1.0", self._modifier_text(info))
+            show_issues(key_id)
+
+        def selected_key():
+            selection = listbox.curselection()
+            return shown[selection[0]] if selection else None
+
+        def save():
+            abbrev = abbrev_var.get().strip()
+            options = options_var.get().strip()
+            text = text_box.get("1.0", "end").strip()
+            key_id = hotstring_id(options, abbrev)
+            if not abbrev or not text or parse_hotstring_id(key_id) != (options, abbrev):
+                messagebox.showerror(
+                    "Hotstrings", "Enter an abbreviation, options without ':' or spaces, and a replacement.", parent=win
+                )
+                return
+            previous = selected_key()
+            with self._edit_bindings(f"hotstring {key_id}") as batch:
+                if previous is not None and previous != key_id:
+                    batch.set(profile_id, previous, HOTSTRING_MODIFIER, None)
+                batch.set(profile_id, key_id, HOTSTRING_MODIFIER, {"action": text, "enabled": True})
+            refresh_list()
+            if key_id in shown:
+                listbox.selection_set(shown.index(key_id))
+            show_issues(key_id)
+
+        def delete():
+            key_id = selected_key()
+            if key_id is None:
+                return
+            with self._edit_bindings(f"remove hotstring {key_id}") as batch:
+                batch.set(profile_id, key_id, HOTSTRING_MODIFIER, None)
+            refresh_list()
+            issues_var.set("")
+
+        button_frame = tk.Frame(win)
+        button_frame.pack(fill="x", padx=8, pady=(4, 8))
+        tk.Button(button_frame, text="Save", command=save).pack(side="right")
+        tk.Button(button_frame, text="Delete", command=delete).pack(side="right", padx=(0, 6))
+        listbox.bind("<<ListboxSelect>>", on_select)
+        filter_var.trace_add("write", refresh_list)
+        refresh_list()
+        filter_entry.focus_set()
+
+    def _poll_watched_files(self):
+        for path in self.file_watcher.changed():
+            if path == self.settings_path:
+                self._reload_settings_from_disk()
+            elif path == self.keyboards_path:
+                self._reload_keyboard_profiles()
+            elif path == self.header_path:
+                header_lines = load_script_header(self.header_path, DEFAULT_HEADER_LINES)
+                if header_lines != self.header_lines:
+                    self.header_lines = header_lines
+                    self._refresh_script_preview()
+            elif path == self.templates_path:
+                self._reload_templates()
+        self.after(WATCH_INTERVAL_MS, self._poll_watched_files)
+
+    def _reload_settings_from_disk(self):
+        self._ensure_all_profiles_loaded()
+        result, error = pull_settings(
+            self.settings_path,
+            base=self._settings_base,
+            actions_by_profile=self.actions_by_profile,
             modifier_options=MODIFIER_OPTIONS,
         )
         if error:
-            messagebox.showerror("Save settings failed", f"Couldn't write {self.settings_path.name}:\n{error}")
+            # Usually a half-written file from another tool; the next poll retries.
+            return
+        self._settings_base = result.settings
+        self._warn_conflicts(result.conflicts)
+        if not result.incoming:
+            return
+        apply_delta(self.actions_by_profile, result.incoming)
+        self._hotstring_index = None
+        self._binding_counts = None
+        touched = self._invalidate_bindings(result.incoming)
+        # The shown binding may come from an ancestor of the current profile.
+        shown = {
+            (profile_id, self.selected_key_id, self.modifier_var.get())
+            for profile_id in self._resolved().chain(self.current_profile_id)
+        }
+        if not shown.isdisjoint(result.incoming):
+            self._refresh_action_entry()
+        self._refresh_script_preview()
+        if self.current_profile_id in touched:
+            self._repaint_changed_buttons()
+
+    def _reload_keyboard_profiles(self):
+        profiles, _default_profile, error = load_keyboard_profiles(
+            self.keyboards_path, DEFAULT_KEYBOARD_PROFILES
+        )
+        if error or profiles == self.keyboard_profiles:
+            return
+        self._set_keyboard_profiles(profiles)
+        self._hotstring_index = None
+        # Parents may have changed, so every merged view is suspect.
+        self._resolved_profiles = None
+        self._bound_keys_by_profile.clear()
+        self._frozen_actions_by_profile.clear()
+        if self.current_profile_id in self.profile_label_by_id:
+            self._apply_restored_profile()
+            if self.selected_key_id:
+                display = self.key_labels.get(self.selected_key_id, self.selected_key_id)
+                self._update_selected_key_label(display, self.selected_key_id)
+        else:
+            self._select_profile(profiles[0]["id"])
+        self._ensure_profile_loaded(self.current_profile_id)
+        self._refresh_action_entry()
+        self._repaint_changed_buttons()
+        self._refresh_script_preview()
 
     def _on_close(self):
-        self._save_settings()
+        self._save_session()
+        self.worker.close()
         self.destroy()
 
-    def _build_script_text(self):
-        return build_script_text(
+    def _invalidate_profile(self, profile_id):
+        self._bound_keys_by_profile.pop(profile_id, None)
+        self._frozen_actions_by_profile.pop(profile_id, None)
+
+    def _invalidate_bindings(self, bindings):
+        # An edit also reaches every profile that inherits the edited key.
+        touched = {profile_id for profile_id, _key_id, _modifier in bindings}
+        if self._resolved_profiles is not None:
+            touched |= self._resolved_profiles.invalidate(bindings)
+        for profile_id in touched:
+            self._invalidate_profile(profile_id)
+        return touched
+
+    def _compile_snapshot(self):
+        # Copies are kept per profile until the profile is edited, so a
+        # snapshot only pays for the profiles that changed since the last one.
+        # Profiles are compiled from what their own block has to define, so
+        # an inherited binding is only emitted where no parent's block covers it.
+        self._ensure_all_profiles_loaded()
+        resolved = self._resolved()
+        frozen = {}
+        for profile_id in dict.fromkeys([*(p["id"] for p in self.keyboard_profiles), *self.actions_by_profile]):
+            cached = self._frozen_actions_by_profile.get(profile_id)
+            if cached is None:
+                cached = copy_profile_actions(resolved.effective(profile_id))
+                self._frozen_actions_by_profile[profile_id] = cached
+            if cached:
+                frozen[profile_id] = cached
+        return make_snapshot(
             header_lines=self.header_lines,
             keyboard_profiles=self.keyboard_profiles,
-            actions_by_profile=self.actions_by_profile,
+            frozen_actions=frozen,
             key_name_overrides=KEY_NAME_OVERRIDES,
             modifier_prefix=MODIFIER_PREFIX,
             modifier_options=MODIFIER_OPTIONS,
+            expander=self.template_expander,
         )
 
     def _refresh_script_preview(self):
-        script = self._build_script_text()
+        snapshot = self._compile_snapshot()
+        compact = self.compact_export_var.get()
+        self._preview_generation = self.worker.submit(
+            "preview",
+            lambda progress: compile_preview(snapshot, progress, self._fragment_cache, compact=compact),
+        )
+        self.worker.submit(
+            "lint",
+            lambda progress: lint_actions(
+                snapshot.actions_by_profile,
+                modifier_options=snapshot.modifier_options,
+                cache=self.lint_cache,
+                expand_template=snapshot.expand_template,
+                progress=progress,
+            ),
+        )
+        self._schedule_worker_poll()
+
+    def _schedule_worker_poll(self):
+        if self._worker_poll_id is None:
+            self._worker_poll_id = self.after(WORKER_POLL_MS, self._poll_worker)
+
+    def _poll_worker(self):
+        self._worker_poll_id = None
+        for item in self.worker.poll():
+            if isinstance(item, WorkerProgress):
+                if item.kind == "export" and item.total:
+                    self.status_var.set(f"Exporting... {item.done}/{item.total} profiles")
+                continue
+            if item.kind == "preview":
+                if item.generation != self._preview_generation:
+                    continue
+                if item.error:
+                    self.status_var.set(f"Preview failed: {item.error}")
+                else:
+                    self._show_preview(item.value)
+            elif item.kind == "export":
+                self.status_var.set("")
+                self._finish_export(item)
+            elif item.kind == "lint" and not item.error:
+                self._apply_lint_results(item.value)
+        if self.worker.busy():
+            self._schedule_worker_poll()
+
+    def _apply_lint_results(self, diagnostics):
+        self._lint_diagnostics = diagnostics
+        error_keys = {}
+        for (profile_id, key_id, _modifier), items in diagnostics.items():
+            if any(item.severity == SEVERITY_ERROR for item in items):
+                error_keys.setdefault(profile_id, set()).add(key_id)
+        self._lint_error_keys = error_keys
+        self._repaint_changed_buttons()
+        self._refresh_lint_label()
+
+    def _show_preview(self, preview):
+        if self._preview_insert_id is not None:
+            self.after_cancel(self._preview_insert_id)
+            self._preview_insert_id = None
         self.preview_box.configure(state="normal")
         self.preview_box.delete("1.0", "end")
-        self.preview_box.insert("1.0", script)
         self.preview_box.configure(state="disabled")
+        self.optimized_var.set(
+            f"{preview.optimized_count} binding(s) as native remap/SendInput" if preview.optimized_count else ""
+        )
+        self._insert_preview_chunk(preview.text.splitlines(keepends=True), 0, preview.optimized_lines)
+
+    def _insert_preview_chunk(self, lines, start, optimized_lines=()):
+        # Large scripts are inserted a slice per event-loop turn so the window
+        # keeps repainting while a long preview fills in.
+        self._preview_insert_id = None
+        end = start + PREVIEW_CHUNK_LINES
+        self.preview_box.configure(state="normal")
+        self.preview_box.insert("end", "".join(lines[start:end]))
+        for number in optimized_lines:
+            if start <= number < end:
+                self.preview_box.tag_add("optimized", f"{number + 1}.0", f"{number + 1}.end")
+        self.preview_box.configure(state="disabled")
+        if end < len(lines):
+            self._preview_insert_id = self.after(1, self._insert_preview_chunk, lines, end, optimized_lines)
 
     def _tooltip_text_for_key(self, key_id):
         entry = self._get_profile_entry(key_id)
@@ -571,21 +1404,17 @@ class AHKBuilder(tk.Tk):
         lines = []
         for modifier in MODIFIER_OPTIONS:
             info = entry.get(modifier, {})
-            action = ""
-            if isinstance(info, dict):
-                enabled = info.get("enabled", True)
-                if not enabled:
-                    continue
-                action = info.get("action", "")
-            elif isinstance(info, str):
-                action = info
-            if not isinstance(action, str):
+            if isinstance(info, dict) and not info.get("enabled", True):
                 continue
-            text = action.strip()
+            text = self._modifier_text(info).strip()
             if not text:
                 continue
             header = modifier if modifier != "None" else "Base"
-            lines.append(f"{header}: {text.splitlines()[0]}")
+            source = self._inherited_from(key_id, modifier)
+            suffix = f"  (from {source})" if source else ""
+            lines.append(f"{header}: {text.splitlines()[0]}{suffix}")
+            for item in self._lint_diagnostics.get((self.current_profile_id, key_id, modifier), ()):
+                lines.append(f"    {item.format()}")
         return "\n".join(lines)
 
     def _on_key_hover(self, event, key_id):
@@ -628,39 +1457,124 @@ class AHKBuilder(tk.Tk):
             self.tooltip_window = None
 
     def _key_has_binding(self, key_id):
-        entry = self.actions_by_profile.get(self.current_profile_id, {}).get(key_id, {})
-        if not isinstance(entry, dict):
-            return False
-        for modifier_data in entry.values():
-            if isinstance(modifier_data, dict):
-                enabled = modifier_data.get("enabled", True)
-                action_text = modifier_data.get("action", "")
-                if enabled and isinstance(action_text, str) and action_text.strip():
-                    return True
-        return False
+        return key_id in self._bound_keys(self.current_profile_id)
+
+    def _bound_keys(self, profile_id):
+        # key id -> True if the profile binds it itself, False if every
+        # active binding on it is inherited.
+        bound = self._bound_keys_by_profile.get(profile_id)
+        if bound is not None:
+            return bound
+        resolved = self._resolved()
+        bound = {}
+        for key_id, entry in resolved.view(profile_id).items():
+            for modifier, modifier_data in entry.items():
+                if modifier_data.get("enabled", True) and self._modifier_text(modifier_data).strip():
+                    own = not resolved.inherited(profile_id, key_id, modifier)
+                    bound[key_id] = bound.get(key_id, False) or own
+        self._bound_keys_by_profile[profile_id] = bound
+        return bound
+
+    def _marked_key_colors(self):
+        colors = {
+            key_id: KEY_BIND_COLOR if own else KEY_INHERITED_COLOR
+            for key_id, own in self._bound_keys(self.current_profile_id).items()
+        }
+        for key_id in self._lint_error_keys.get(self.current_profile_id, ()):
+            colors[key_id] = KEY_LINT_ERROR_COLOR
+        return colors
+
+    def _paint_key(self, key_id, color):
+        for btn in self.key_buttons.get(key_id, ()):
+            if btn is self.active_button:
+                continue
+            btn.configure(bg=color)
 
     def _refresh_button_colors(self):
-        for key_id, buttons in self.key_buttons.items():
-            state = KEY_BIND_COLOR if self._key_has_binding(key_id) else KEY_DEFAULT_BUTTON_BG
-            for btn in buttons:
-                btn.configure(bg=state)
+        colors = self._marked_key_colors()
+        for key_id in self.key_buttons:
+            self._paint_key(key_id, colors.get(key_id, KEY_DEFAULT_BUTTON_BG))
+        self._painted_key_colors = colors
         if self.active_button:
             self.active_button.configure(bg="#d4e0ff")
 
+    def _repaint_changed_buttons(self):
+        colors = self._marked_key_colors()
+        for key_id in self._painted_key_colors.keys() | colors.keys():
+            color = colors.get(key_id, KEY_DEFAULT_BUTTON_BG)
+            if self._painted_key_colors.get(key_id, KEY_DEFAULT_BUTTON_BG) != color:
+                self._paint_key(key_id, color)
+        self._painted_key_colors = colors
+
     def _export_script(self):
-        script = self._build_script_text()
-        if not script.strip():
-            messagebox.showinfo("Empty script", "Add at least one assignment before exporting.")
-            return
         path = self.export_path_var.get().strip()
         if not path:
             messagebox.showerror("Export failed", "Please specify a save path in the 'Save to' field.")
             return
-        try:
-            with open(path, "w", encoding="utf-8") as handle:
-                handle.write(script)
-        except OSError as exc:
-            messagebox.showerror("Save failed", f"Couldn't write file:\n{exc}")
+        snapshot = self._compile_snapshot()
+        split_profiles = self.split_export_var.get()
+        compact = self.compact_export_var.get()
+        probe_log = PROBE_LOG_FILENAME if self.probes_export_var.get() else ""
+        self.status_var.set("Exporting...")
+        self.worker.submit(
+            "export",
+            lambda progress: export_snapshot(
+                snapshot,
+                Path(path),
+                split_profiles=split_profiles,
+                compact=compact,
+                probe_log=probe_log,
+                progress=progress,
+                fragment_cache=self._fragment_cache,
+            ),
+        )
+        self._schedule_worker_poll()
+
+    def _finish_export(self, result):
+        if result.error:
+            messagebox.showerror("Save failed", f"Couldn't write file:\n{result.error}")
+            return
+        outcome = result.value
+        if outcome.empty:
+            messagebox.showinfo("Empty script", "Add at least one assignment before exporting.")
+        elif outcome.error:
+            messagebox.showerror("Save failed", f"Couldn't write file:\n{outcome.error}")
+        elif not outcome.shard_count:
+            messagebox.showinfo("Saved", f"Script written to {outcome.path}")
+        elif not outcome.written:
+            messagebox.showinfo(
+                "Saved", f"{outcome.path} and its {outcome.shard_count} profile file(s) are already up to date."
+            )
         else:
-            messagebox.showinfo("Saved", f"Script written to {path}")
+            names = "\n".join(str(item) for item in outcome.written)
+            messagebox.showinfo("Saved", f"Updated {len(outcome.written)} file(s):\n{names}")
 
+    def _import_script(self):
+        path = filedialog.askopenfilename(
+            filetypes=[("AutoHotkey script", "*.ahk"), ("All files", "*.*")],
+            initialdir=str(Path(self.export_path).parent),
+        )
+        if not path:
+            return
+        result, error = import_script(
+            Path(path),
+            keyboard_profiles=self.keyboard_profiles,
+            key_name_overrides=KEY_NAME_OVERRIDES,
+            modifier_prefix=MODIFIER_PREFIX,
+            modifier_options=MODIFIER_OPTIONS,
+        )
+        if error:
+            messagebox.showerror("Import failed", error)
+            return
+        with self._edit_bindings(f"import {Path(path).name}") as batch:
+            merge_actions(batch, result.actions_by_profile)
+        message = f"Imported {result.imported_count} binding(s) from {Path(path).name}."
+        if result.unmapped_count:
+            shown = result.unmapped[:15]
+            details = "\n".join(f"{item.line_number}: {item.text.strip()} ({item.reason})" for item in shown)
+            message = f"{message}\n\n{result.unmapped_count} line(s) could not be mapped:\n{details}"
+            if result.unmapped_count > len(shown):
+                message = f"{message}\n..."
+            messagebox.showwarning("Import finished", message)
+        else:
+            messagebox.showinfo("Import finished", message)
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from .settings_io import ActionsByProfile
+from .store_sync import BindingDelta, BindingKey
+
+
+class BindingBatch:
+    # Applies edits to actions_by_profile immediately so later edits in the
+    # same batch see earlier ones, but leaves invalidation, saving and
+    # repainting to whoever commits the batch.
+    def __init__(self, actions_by_profile: ActionsByProfile) -> None:
+        self.actions_by_profile = actions_by_profile
+        self._original: BindingDelta = {}
+
+    def get(self, profile_id: str, key_id: str, modifier: str) -> dict[str, Any] | None:
+        entry = self.actions_by_profile.get(profile_id, {}).get(key_id, {})
+        data = entry.get(modifier) if isinstance(entry, dict) else None
+        return data if isinstance(data, dict) else None
+
+    def set(self, profile_id: str, key_id: str, modifier: str, data: dict[str, Any] | None) -> bool:
+        previous = self.get(profile_id, key_id, modifier)
+        if previous == data:
+            return False
+        binding = (profile_id, key_id, modifier)
+        if binding not in self._original:
+            self._original[binding] = dict(previous) if previous is not None else None
+        if data is not None:
+            profile_actions = self.actions_by_profile.setdefault(profile_id, {})
+            entry = profile_actions.get(key_id)
+            if not isinstance(entry, dict):
+                entry = profile_actions[key_id] = {}
+            entry[modifier] = dict(data)
+            return True
+        profile_actions = self.actions_by_profile.get(profile_id, {})
+        entry = profile_actions.get(key_id, {})
+        entry.pop(modifier, None)
+        if not entry:
+            profile_actions.pop(key_id, None)
+        if not profile_actions:
+            self.actions_by_profile.pop(profile_id, None)
+        return True
+
+    def bindings(self, profile_ids: Iterable[str] | None = None) -> list[tuple[BindingKey, dict[str, Any]]]:
+        selected = self.actions_by_profile.keys() if profile_ids is None else profile_ids
+        found = []
+        for profile_id in list(selected):
+            for key_id, entry in self.actions_by_profile.get(profile_id, {}).items():
+                if not isinstance(entry, dict):
+                    continue
+                for modifier, data in entry.items():
+                    if isinstance(data, dict):
+                        found.append(((profile_id, key_id, modifier), data))
+        return found
+
+    def changes(self) -> dict[BindingKey, tuple[dict[str, Any] | None, dict[str, Any] | None]]:
+        # Edits that were later undone inside the batch drop out here.
+        changed = {}
+        for binding, before in self._original.items():
+            after = self.get(*binding)
+            if before != after:
+                changed[binding] = (before, after)
+        return changed
+
+    def touched_profiles(self) -> set[str]:
+        return {profile_id for profile_id, _key_id, _modifier in self.changes()}
+
+    def rollback(self) -> None:
+        original, self._original = self._original, {}
+        for binding, before in original.items():
+            self.set(*binding, before)
+        self._original = {}
+
+
+def merge_actions(batch: BindingBatch, imported: ActionsByProfile) -> int:
+    merged = 0
+    for (profile_id, key_id, modifier), data in BindingBatch(imported).bindings():
+        merged += batch.set(profile_id, key_id, modifier, data)
+    return merged
+
+
+def copy_profile(batch: BindingBatch, source_id: str, target_id: str, *, overwrite: bool = False) -> int:
+    copied = 0
+    for (_profile_id, key_id, modifier), data in batch.bindings([source_id]):
+        if not overwrite and batch.get(target_id, key_id, modifier) is not None:
+            continue
+        copied += batch.set(target_id, key_id, modifier, data)
+    return copied
+
+
+def set_modifier_enabled(
+    batch: BindingBatch, modifier: str, enabled: bool, *, profile_ids: Iterable[str] | None = None
+) -> int:
+    changed = 0
+    for (profile_id, key_id, bound_modifier), data in batch.bindings(profile_ids):
+        if bound_modifier != modifier or bool(data.get("enabled", True)) == enabled:
+            continue
+        changed += batch.set(profile_id, key_id, modifier, {**data, "enabled": enabled})
+    return changed
+
+
+def remap_key(
+    batch: BindingBatch,
+    source_key: str,
+    target_key: str,
+    *,
+    profile_ids: Iterable[str] | None = None,
+    overwrite: bool = False,
+) -> tuple[int, list[BindingKey]]:
+    moved = 0
+    skipped: list[BindingKey] = []
+    if source_key == target_key:
+        return moved, skipped
+    for (profile_id, key_id, modifier), data in batch.bindings(profile_ids):
+        if key_id != source_key:
+            continue
+        if not overwrite and batch.get(profile_id, target_key, modifier) is not None:
+            skipped.append((profile_id, target_key, modifier))
+            continue
+        batch.set(profile_id, target_key, modifier, data)
+        batch.set(profile_id, source_key, modifier, None)
+        moved += 1
+    return moved, skipped
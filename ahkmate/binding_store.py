@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+from .settings_io import ActionsByKey, ActionsByProfile, sanitize_modifier_entry
+from .store_sync import BindingKey
+
+
+FLAG_ENABLED = 1
+FLAG_NO_OPTIMIZE = 2
+FLAG_REMAP = 4
+# Slots of the open-addressing index; a slot is free or held a deleted row.
+_EMPTY = -1
+_DELETED = -2
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_BITS = 64
+_MIN_CAPACITY_BITS = 3
+_KEY_BITS = 24
+_MODIFIER_BITS = 8
+
+
+class StringTable:
+    # Interned strings with reference counts; a string whose last user goes
+    # away frees its slot for the next new string.
+    def __init__(self) -> None:
+        self._strings: list[str | None] = [""]
+        self._ids: dict[str, int] = {"": 0}
+        self._counts = array("I", [0])
+        self._free: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index: int) -> str:
+        return self._strings[index] or ""
+
+    def acquire(self, text: str) -> int:
+        index = self._ids.get(text)
+        if index is None:
+            if self._free:
+                index = self._free.pop()
+                self._strings[index] = text
+                self._counts[index] = 0
+            else:
+                index = len(self._strings)
+                self._strings.append(text)
+                self._counts.append(0)
+            self._ids[text] = index
+        self._counts[index] += 1
+        return index
+
+    def release(self, index: int) -> None:
+        if not index:
+            return
+        self._counts[index] -= 1
+        if not self._counts[index]:
+            del self._ids[self._strings[index]]
+            self._strings[index] = None
+            self._free.append(index)
+
+
+class _Names:
+    # Profile and key ids are few and rarely go away, so they are interned
+    # for good.
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        index = self.ids.get(name)
+        if index is None:
+            index = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+
+class CompactBindings:
+    # The bindings of all profiles as parallel array columns, one row per
+    # (profile, key, modifier): profile and key ids are interned, the
+    # modifier is its index in modifier_options, enabled, optimize and remap are
+    # bits, and action and template texts live in a shared string table.
+    # Rows are found through an open-addressing hash table over the packed
+    # (profile, key, modifier) int, itself two arrays. Deleting a row moves
+    # the last row into its place, so the columns stay dense.
+    #
+    # get/set/bindings match BindingBatch, so the batch helpers work on it
+    # unchanged. Values are stored as save_settings would write them: set()
+    # sanitizes, and a binding that sanitizes to nothing is removed.
+    def __init__(self, *, modifier_options: Sequence[str]) -> None:
+        self._modifiers = list(modifier_options)
+        self._modifier_ids = {name: index for index, name in enumerate(self._modifiers)}
+        self._profiles = _Names()
+        self._keys = _Names()
+        self.strings = StringTable()
+        self._profile = array("I")
+        self._key = array("I")
+        self._modifier = array("B")
+        self._flags = array("B")
+        self._action = array("I")
+        # 0 for bindings without a template
+        self._template = array("I")
+        # row -> template args; rare, so not a column
+        self._args: dict[int, tuple[tuple[str, str], ...]] = {}
+        self._slot_keys = array("q", [_EMPTY]) * (1 << _MIN_CAPACITY_BITS)
+        self._slot_rows = array("i", [0]) * (1 << _MIN_CAPACITY_BITS)
+        self._capacity_bits = _MIN_CAPACITY_BITS
+        self._slot_limit = (1 << _MIN_CAPACITY_BITS) * 2 // 3
+        self._deleted_slots = 0
+
+    @classmethod
+    def from_actions(cls, actions_by_profile: Mapping[str, Any], *, modifier_options: Sequence[str]) -> CompactBindings:
+        store = cls(modifier_options=modifier_options)
+        for profile_id, actions in actions_by_profile.items():
+            if not isinstance(actions, dict):
+                continue
+            for key_id, entry in actions.items():
+                if not isinstance(entry, dict):
+                    continue
+                for modifier, data in entry.items():
+                    if modifier in store._modifier_ids:
+                        store.set(profile_id, key_id, modifier, data)
+        return store
+
+    def __len__(self) -> int:
+        return len(self._profile)
+
+    def nbytes(self) -> int:
+        # Columns and index only; the string table is shared text.
+        columns = (*self._columns(), self._slot_keys, self._slot_rows)
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+
+    def _columns(self) -> tuple[array, ...]:
+        return (self._profile, self._key, self._modifier, self._flags, self._action, self._template)
+
+    def _pack(self, profile_id: str, key_id: str, modifier: str, *, create: bool) -> int | None:
+        modifier_index = self._modifier_ids.get(modifier)
+        if modifier_index is None:
+            return None
+        if create:
+            profile_index = self._profiles.intern(profile_id)
+            key_index = self._keys.intern(key_id)
+        else:
+            profile_index = self._profiles.ids.get(profile_id)
+            key_index = self._keys.ids.get(key_id)
+            if profile_index is None or key_index is None:
+                return None
+        return (profile_index << (_KEY_BITS + _MODIFIER_BITS)) | (key_index << _MODIFIER_BITS) | modifier_index
+
+    def _slot(self, packed: int) -> tuple[int, int]:
+        # (slot holding packed or -1, first free slot on its probe path)
+        mask = (1 << self._capacity_bits) - 1
+        slot = ((packed * _HASH_MULTIPLIER) & ((1 << _HASH_BITS) - 1)) >> (_HASH_BITS - self._capacity_bits)
+        first_free = -1
+        while True:
+            held = self._slot_keys[slot]
+            if held == packed:
+                return slot, first_free
+            if held == _EMPTY:
+                return -1, slot if first_free < 0 else first_free
+            if held == _DELETED and first_free < 0:
+                first_free = slot
+            slot = (slot + 1) & mask
+
+    def _row(self, profile_id: str, key_id: str, modifier: str) -> int:
+        packed = self._pack(profile_id, key_id, modifier, create=False)
+        if packed is None:
+            return -1
+        slot, _free = self._slot(packed)
+        return self._slot_rows[slot] if slot >= 0 else -1
+
+    def _rehash(self) -> None:
+        # Sized for the live rows alone, which also drops deleted slots.
+        rows = len(self._profile)
+        bits = _MIN_CAPACITY_BITS
+        while (rows + 1) * 3 >= (1 << bits) * 2:
+            bits += 1
+        old_keys, old_rows = self._slot_keys, self._slot_rows
+        self._capacity_bits = bits
+        self._slot_keys = array("q", [_EMPTY]) * (1 << bits)
+        self._slot_rows = array("i", [0]) * (1 << bits)
+        self._slot_limit = (1 << bits) * 2 // 3
+        self._deleted_slots = 0
+        for packed, row in zip(old_keys, old_rows):
+            if packed >= 0:
+                _slot, free = self._slot(packed)
+                self._slot_keys[free] = packed
+                self._slot_rows[free] = row
+
+    def get(self, profile_id: str, key_id: str, modifier: str) -> dict[str, Any] | None:
+        row = self._row(profile_id, key_id, modifier)
+        return self._data(row) if row >= 0 else None
+
+    def _data(self, row: int) -> dict[str, Any]:
+        flags = self._flags[row]
+        data: dict[str, Any] = {"action": self.strings[self._action[row]], "enabled": bool(flags & FLAG_ENABLED)}
+        if self._template[row]:
+            data["template"] = self.strings[self._template[row]]
+            data["args"] = dict(self._args.get(row, ()))
+        if flags & FLAG_NO_OPTIMIZE:
+            data["optimize"] = False
+        elif flags & FLAG_REMAP:
+            data["remap"] = True
+        return data
+
+    def set(self, profile_id: str, key_id: str, modifier: str, data: dict[str, Any] | None) -> bool:
+        if modifier not in self._modifier_ids:
+            raise ValueError(f"Unknown modifier: {modifier}")
+        clean = sanitize_modifier_entry(data) if data is not None else None
+        packed = self._pack(profile_id, key_id, modifier, create=clean is not None)
+        if packed is None:
+            return False
+        slot, free = self._slot(packed)
+        row = self._slot_rows[slot] if slot >= 0 else -1
+        if (self._data(row) if row >= 0 else None) == clean:
+            return False
+        if clean is None:
+            self._delete(slot, row)
+            return True
+        if row >= 0:
+            self.strings.release(self._action[row])
+            self.strings.release(self._template[row])
+            self._args.pop(row, None)
+        else:
+            # Keep the table at most two thirds full, counting deleted slots.
+            if len(self._profile) + self._deleted_slots >= self._slot_limit:
+                self._rehash()
+                _slot, free = self._slot(packed)
+            if self._slot_keys[free] == _DELETED:
+                self._deleted_slots -= 1
+            row = len(self._profile)
+            self._slot_keys[free] = packed
+            self._slot_rows[free] = row
+            self._profile.append(packed >> (_KEY_BITS + _MODIFIER_BITS))
+            self._key.append((packed >> _MODIFIER_BITS) & ((1 << _KEY_BITS) - 1))
+            self._modifier.append(packed & ((1 << _MODIFIER_BITS) - 1))
+            for column in (self._flags, self._action, self._template):
+                column.append(0)
+        self._flags[row] = (
+            (FLAG_ENABLED if clean["enabled"] else 0)
+            | (FLAG_NO_OPTIMIZE if clean.get("optimize") is False else 0)
+            | (FLAG_REMAP if clean.get("remap") else 0)
+        )
+        self._action[row] = self.strings.acquire(clean["action"])
+        self._template[row] = self.strings.acquire(clean["template"]) if "template" in clean else 0
+        if clean.get("args"):
+            self._args[row] = tuple(clean["args"].items())
+        return True
+
+    def _delete(self, slot: int, row: int) -> None:
+        self._slot_keys[slot] = _DELETED
+        self._deleted_slots += 1
+        self.strings.release(self._action[row])
+        self.strings.release(self._template[row])
+        self._args.pop(row, None)
+        last = len(self._profile) - 1
+        if row != last:
+            for column in self._columns():
+                column[row] = column[last]
+            moved = (self._profile[row] << (_KEY_BITS + _MODIFIER_BITS)) | (self._key[row] << _MODIFIER_BITS)
+            moved_slot, _free = self._slot(moved | self._modifier[row])
+            self._slot_rows[moved_slot] = row
+            if last in self._args:
+                self._args[row] = self._args.pop(last)
+        for column in self._columns():
+            column.pop()
+
+    def bindings(self, profile_ids: Iterable[str] | None = None) -> list[tuple[BindingKey, dict[str, Any]]]:
+        wanted = None
+        if profile_ids is not None:
+            wanted = {self._profiles.ids[profile_id] for profile_id in profile_ids if profile_id in self._profiles.ids}
+        profiles, keys, modifiers = self._profiles.names, self._keys.names, self._modifiers
+        return [
+            ((profiles[self._profile[row]], keys[self._key[row]], modifiers[self._modifier[row]]), self._data(row))
+            for row in range(len(self._profile))
+            if wanted is None or self._profile[row] in wanted
+        ]
+
+    def profile(self, profile_id: str) -> ActionsByKey:
+        # One profile as the nested dicts the compiler and linter read.
+        actions: ActionsByKey = {}
+        for (_profile_id, key_id, modifier), data in self.bindings([profile_id]):
+            actions.setdefault(key_id, {})[modifier] = data
+        return actions
+
+    def to_actions(self) -> ActionsByProfile:
+        # Already sanitized, so it can go to the settings file as it is.
+        actions_by_profile: ActionsByProfile = {}
+        for (profile_id, key_id, modifier), data in self.bindings():
+            actions_by_profile.setdefault(profile_id, {}).setdefault(key_id, {})[modifier] = data
+        return actions_by_profile
@@ -0,0 +1,900 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Sequence
+from pathlib import Path
+
+from dataclasses import replace
+
+from .binding_batch import BindingBatch
+from .binding_store import CompactBindings
+from .compile_worker import compile_snapshot_ir, export_snapshot
+from .constants import (
+    FIRST_PAINT_BUDGET_MS,
+    HISTORY_DIRNAME,
+    KEY_SECTIONS,
+    KEYBOARD_PROFILES_FILENAME,
+    MODIFIER_OPTIONS,
+    PROBE_LOG_FILENAME,
+    SEQUENCE_TIMEOUT_MS,
+    SERVICE_CACHE_SIZE,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SETTINGS_FILENAME,
+    SWITCH_BENCH_SLACK_MS,
+)
+from .config import LoadedConfig, lint_config, load_config, saved_export_path
+from .condition_groups import condition_costs, group_by_condition
+from .emitters import DEFAULT_FORMAT, EMITTERS, get_emitter
+from .history import HistoryStore
+from .profile_index import BindingCounts, ProfileIndex
+from .hotstrings import ISSUE_PREFIX, HotstringIndex
+from .linter import SEVERITY_ERROR, BindingDiagnostics, has_errors
+from .probes import ProbeReport, probed_bindings
+from .remaps import classify_body, optimize_remaps
+from .script_ir import OPTIMIZED_REMAP, FragmentCache
+from .sequence_machine import lower_profile
+from .service import CompileService, RpcError, ServiceClient, ServiceServer, is_loopback
+from .settings_io import LoadedSettings, load_settings, sanitize_actions
+from .simulator import NO_MATCH, OUTCOME_HOTKEY, build_simulator
+from .script_importer import import_script_lines
+from .store_sync import commit_settings, flatten_actions
+
+
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def print_diagnostics(diagnostics: BindingDiagnostics) -> None:
+    for (profile_id, key_id, modifier), items in sorted(diagnostics.items()):
+        for item in items:
+            print(f"{profile_id}/{key_id}/{modifier}: {item.format()}", file=sys.stderr)
+
+
+def _command_lint(args: argparse.Namespace, config: LoadedConfig) -> int:
+    diagnostics = lint_config(config.snapshot)
+    print_diagnostics(diagnostics)
+    return 1 if has_errors(diagnostics) else 0
+
+
+def _command_build(args: argparse.Namespace, config: LoadedConfig) -> int:
+    diagnostics = lint_config(config.snapshot)
+    print_diagnostics(diagnostics)
+    if args.fail_on_lint and has_errors(diagnostics):
+        errors = sum(item.severity == SEVERITY_ERROR for items in diagnostics.values() for item in items)
+        print(f"Build failed: {errors} lint error(s).", file=sys.stderr)
+        return 1
+
+    formats = list(dict.fromkeys(args.formats or [DEFAULT_FORMAT]))
+    # Every format is rendered from the same compiled IR; only the header
+    # can differ per format.
+    fragment_cache = FragmentCache()
+    ir = compile_snapshot_ir(
+        config.snapshot,
+        fragment_cache=fragment_cache,
+        group_conditions=not args.no_group,
+        native_remaps=not args.no_remap,
+        probe_log=args.probes,
+    )
+
+    def format_ir(output_format):
+        header = config.format_headers.get(output_format)
+        return ir if header is None else replace(ir, header_lines=tuple(header))
+
+    if args.output == "-":
+        if len(formats) > 1:
+            print("Only one --format can be written to stdout.", file=sys.stderr)
+            return 2
+        emitter = get_emitter(formats[0], compact=args.compact)
+        sys.stdout.write(emitter.render(format_ir(formats[0]), fragment_cache) + "\n")
+        return 0
+    output = Path(args.output) if args.output else saved_export_path(args.root)
+    if output is None:
+        print("No output path given and none saved in export_path.json.", file=sys.stderr)
+        return 2
+    status = 0
+    for output_format in formats:
+        path = output
+        if len(formats) > 1:
+            path = output.with_name(output.stem + EMITTERS[output_format].suffix)
+        outcome = export_snapshot(
+            config.snapshot,
+            path,
+            split_profiles=args.split,
+            output_format=output_format,
+            compact=args.compact,
+            fragment_cache=fragment_cache,
+            ir=format_ir(output_format),
+        )
+        if outcome.empty:
+            print("Nothing to export: no enabled assignments.", file=sys.stderr)
+            return 1
+        if outcome.error:
+            print(f"Couldn't write {path}: {outcome.error}", file=sys.stderr)
+            status = 1
+        for written in outcome.written:
+            print(written)
+    return status
+
+
+def _command_history_log(args: argparse.Namespace, config: LoadedConfig) -> int:
+    history = HistoryStore(args.root / HISTORY_DIRNAME)
+    for index, info in enumerate(history.log()):
+        if args.limit and index >= args.limit:
+            break
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info.timestamp))
+        print(f"{info.commit_id[:10]}  {stamp}  v{info.version}  {info.message}".rstrip())
+    return 0
+
+
+def _command_history_diff(args: argparse.Namespace, config: LoadedConfig) -> int:
+    history = HistoryStore(args.root / HISTORY_DIRNAME)
+    try:
+        old_commit = history.resolve(args.old)
+        new_commit = history.resolve(args.new)
+    except KeyError as exc:
+        print(f"Unknown or ambiguous version: {exc.args[0]}", file=sys.stderr)
+        return 2
+    for change in history.diff(old_commit, new_commit):
+        marker = "+" if change.before is None else "-" if change.after is None else "~"
+        print(f"{marker} {change.profile_id}/{change.key_id}/{change.modifier}")
+        for line in (change.before or {}).get("action", "").splitlines() if change.after is not None else []:
+            print(f"    - {line}")
+        for line in (change.after or {}).get("action", "").splitlines():
+            print(f"    + {line}")
+    return 0
+
+
+def _command_history_restore(args: argparse.Namespace, config: LoadedConfig) -> int:
+    history = HistoryStore(args.root / HISTORY_DIRNAME)
+    try:
+        commit_id = history.resolve(args.version)
+    except KeyError as exc:
+        print(f"Unknown or ambiguous version: {exc.args[0]}", file=sys.stderr)
+        return 2
+    settings_path = args.root / SETTINGS_FILENAME
+    current, error = load_settings(settings_path, modifier_options=MODIFIER_OPTIONS)
+    if error:
+        print(error, file=sys.stderr)
+        return 1
+    result, error = commit_settings(
+        settings_path,
+        base=LoadedSettings(actions_by_profile=current.actions_by_profile, version=current.version),
+        actions_by_profile=history.read_actions(commit_id),
+        modifier_options=MODIFIER_OPTIONS,
+    )
+    if error:
+        print(f"Couldn't write {settings_path.name}: {error}", file=sys.stderr)
+        return 1
+    history.commit(
+        result.settings.actions_by_profile, message=f"restore {commit_id[:10]}", version=result.settings.version
+    )
+    print(f"Restored {commit_id[:10]} into {settings_path}")
+    return 0
+
+
+def _command_conditions(args: argparse.Namespace, config: LoadedConfig) -> int:
+    # Static view of the #if variants AutoHotkey checks for each hotkey: on
+    # a key press it evaluates them in order until one is true, so the
+    # worst case is one evaluation per variant.
+    ungrouped = compile_snapshot_ir(config.snapshot, group_conditions=False)
+    grouped, report = group_by_condition(ungrouped)
+    before = {cost.hotkey: cost for cost in condition_costs(ungrouped)}
+    after = condition_costs(grouped)
+    print(f"{'hotkey':<16} {'evals':>5} {'was':>4}  fallback  conditions")
+    for cost in after:
+        if not cost.worst_case and not args.all:
+            continue
+        fallback = "yes" if cost.has_global else "no"
+        was = before[cost.hotkey].worst_case
+        print(f"{cost.hotkey:<16} {cost.worst_case:>5} {was:>4}  {fallback:<8}  {', '.join(cost.conditions)}")
+    blocks_before = sum(bool(profile.condition) for profile in ungrouped.profiles)
+    blocks_after = sum(bool(profile.condition) for profile in grouped.profiles)
+    print(
+        f"#if blocks: {blocks_before} -> {blocks_after}; "
+        f"condition evaluations (worst case, all hotkeys): "
+        f"{sum(cost.worst_case for cost in before.values())} -> {sum(cost.worst_case for cost in after)}"
+    )
+    for members in report.merged:
+        print(f"merged: {' + '.join(members)}")
+    for condition, hotkey in report.redundant:
+        print(f"dropped #if {condition} variant of {hotkey}: same as the unconditional one")
+    for condition, hotkey, profile_id in report.duplicates:
+        print(f"dropped repeat of {hotkey} under '{condition or '(none)'}' from {profile_id}")
+    for condition, hotkey, kept, dropped in report.conflicts:
+        print(
+            f"conflict: {hotkey} under '{condition or '(none)'}' is defined by {kept} and {dropped}; kept {kept}",
+            file=sys.stderr,
+        )
+    return 1 if report.conflicts else 0
+
+
+def _command_compact_check(args: argparse.Namespace, config: LoadedConfig) -> int:
+    # Reads the normal and the compact script back with the importer; both
+    # must yield exactly the bindings that were compiled.
+    snapshot = config.snapshot
+    ir = compile_snapshot_ir(snapshot)
+    status = 0
+    for compact in (False, True):
+        emitter = get_emitter(DEFAULT_FORMAT, compact=compact)
+        # Optimized bindings read back as their remap target or SendInput line.
+        expected = {
+            (profile.profile_id, binding.key_id, binding.modifier): (
+                binding.keys if binding.optimized == OPTIMIZED_REMAP else "\n".join(emitter.body_lines(binding)).strip()
+            )
+            for profile in ir.profiles
+            for binding in profile.bindings
+            # Keys that only act while a sequence is pending have no profile
+            # to be read back into; pass-through variants stand for disabled
+            # bindings, which the importer leaves out.
+            if (not binding.dispatch or profile.machine is not None) and not binding.pass_through
+        }
+        text = emitter.render(ir)
+        imported = import_script_lines(
+            text.splitlines(),
+            keyboard_profiles=snapshot.keyboard_profiles,
+            key_name_overrides=snapshot.key_name_overrides,
+            modifier_prefix=snapshot.modifier_prefix,
+            modifier_options=snapshot.modifier_options,
+        )
+        found = {
+            (profile_id, key_id, modifier): data["action"]
+            for (profile_id, key_id, modifier), data in flatten_actions(imported.actions_by_profile).items()
+        }
+        mode = "compact" if compact else "normal"
+        mismatched = sorted(
+            binding for binding in expected.keys() | found.keys() if expected.get(binding) != found.get(binding)
+        )
+        for binding in mismatched:
+            print(f"{mode}: {'/'.join(binding)} differs after reading the script back", file=sys.stderr)
+        print(f"{mode}: {len(text.encode('utf-8'))} bytes, {len(text.splitlines())} lines, {len(found)} bindings")
+        status = status or int(bool(mismatched))
+    return status
+
+
+def _command_remaps(args: argparse.Namespace, config: LoadedConfig) -> int:
+    grouped = compile_snapshot_ir(config.snapshot, native_remaps=False)
+    _ir, optimized = optimize_remaps(grouped)
+    for profile_id, binding in optimized:
+        if binding.optimized == OPTIMIZED_REMAP:
+            print(f"{profile_id}/{binding.key_id}/{binding.modifier}: {binding.hotkey}::{binding.keys}")
+        else:
+            print(f"{profile_id}/{binding.key_id}/{binding.modifier}: {binding.hotkey} -> SendInput {binding.keys}")
+    candidates = [
+        binding for profile in grouped.profiles for binding in profile.bindings if classify_body(binding.body)
+    ]
+    skipped = sum(not binding.optimize for binding in candidates)
+    print(f"{len(optimized)} binding(s) optimized, {skipped} opted out")
+    return 0
+
+
+def _command_hotstrings(args: argparse.Namespace, config: LoadedConfig) -> int:
+    snapshot = config.snapshot
+    index = HotstringIndex.build(snapshot.actions_by_profile, snapshot.keyboard_profiles)
+    if args.prefix is not None:
+        profile_ids = [args.profile] if args.profile else [str(profile["id"]) for profile in snapshot.keyboard_profiles]
+        for profile_id in profile_ids:
+            for entry in index.search(profile_id, args.prefix, args.limit):
+                print(f"{profile_id}: {entry.key_id}")
+        return 0
+    status = 0
+    for issue in index.issues():
+        if issue.kind == ISSUE_PREFIX and not args.all:
+            continue
+        where = issue.condition or "(none)"
+        print(f"{issue.kind}: {issue.entry.profile_id} under '{where}': {issue.format()}")
+        status = status or int(issue.kind != ISSUE_PREFIX)
+    return status
+
+
+def _command_sequences(args: argparse.Namespace, config: LoadedConfig) -> int:
+    grouped = compile_snapshot_ir(config.snapshot, native_remaps=False, lower_key_sequences=False)
+    status = 0
+    for profile in grouped.profiles:
+        if not profile.sequences:
+            continue
+        _lowered, issues, stats = lower_profile(profile, timeout_ms=SEQUENCE_TIMEOUT_MS)
+        print(
+            f"{profile.label}: {len(profile.sequences)} sequence(s), "
+            f"{stats.trie_states} trie states -> {stats.states} states, {stats.transitions} transitions"
+        )
+        for issue in issues:
+            print(f"{profile.profile_id}: {issue.format()}; not compiled", file=sys.stderr)
+        status = status or int(bool(issues))
+    return status
+
+
+def _command_profiles(args: argparse.Namespace, config: LoadedConfig) -> int:
+    resolved = config.resolved
+    if args.search is not None:
+        index = ProfileIndex(config.snapshot.keyboard_profiles)
+        counts = BindingCounts.build(config.settings_actions)
+        started = time.perf_counter()
+        matches = index.search(args.search, args.limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for match in matches:
+            print(f"{match.profile_id}: {match.label} ({counts.get(match.profile_id)} binding(s))")
+        print(f"{len(matches)} of {len(index)} profile(s) in {elapsed_ms:.2f} ms", file=sys.stderr)
+        return 0
+    for profile in config.snapshot.keyboard_profiles:
+        profile_id = str(profile["id"])
+        own = inherited = 0
+        for key_id, entry in resolved.view(profile_id).items():
+            for modifier in entry:
+                if resolved.inherited(profile_id, key_id, modifier):
+                    inherited += 1
+                else:
+                    own += 1
+        emitted = sum(len(entry) for entry in resolved.effective(profile_id).values())
+        chain = " <- ".join(resolved.chain(profile_id))
+        print(f"{chain}: {own} own, {inherited} inherited, {emitted} emitted in its own block")
+    return 0
+
+
+def _command_serve(args: argparse.Namespace, config: LoadedConfig) -> int:
+    if not args.allow_remote and not is_loopback(args.host):
+        print(
+            f"{args.host} is not a loopback address; the service has no authentication, "
+            "pass --allow-remote to serve it anyway.",
+            file=sys.stderr,
+        )
+        return 2
+    service = CompileService(default_root=args.root, cache_size=args.cache_size, extra_roots=args.allow_root)
+    try:
+        server = ServiceServer((args.host, args.port), service)
+    except OSError as exc:
+        print(f"Can't listen on {args.host}:{args.port}: {exc}", file=sys.stderr)
+        return 1
+    print(f"Serving {', '.join(service.methods)} on {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def _command_rpc(args: argparse.Namespace, config: LoadedConfig) -> int:
+    try:
+        params = json.loads(args.params)
+    except json.JSONDecodeError as exc:
+        print(f"--params is not valid JSON: {exc}", file=sys.stderr)
+        return 2
+    client = ServiceClient(args.url)
+    try:
+        result = client.call(args.method, **params)
+    except RpcError as exc:
+        print(f"error {exc.code}: {exc.message}", file=sys.stderr)
+        return 1
+    except OSError as exc:
+        print(f"Can't reach {args.url}: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+def _command_loadtest(args: argparse.Namespace, config: LoadedConfig) -> int:
+    # Without --url an in-process service is started on a free port, so
+    # the numbers include HTTP and JSON but not a second interpreter.
+    server = None
+    url = args.url
+    if url is None:
+        server = ServiceServer((SERVICE_HOST, 0), CompileService(default_root=args.root, cache_size=SERVICE_CACHE_SIZE))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = server.url
+    started = time.perf_counter()
+    cold = load_config(args.root)
+    get_emitter(DEFAULT_FORMAT).render(compile_snapshot_ir(cold.snapshot))
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    params = {"root": str(args.root.resolve())}
+    latencies: list[float] = []
+    failures: list[str] = []
+    lock = threading.Lock()
+
+    def run(count: int) -> None:
+        client = ServiceClient(url)
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    client.call(args.method, **params)
+                except (RpcError, OSError) as exc:
+                    with lock:
+                        failures.append(str(exc))
+                    continue
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            client.close()
+
+    concurrency = max(1, args.concurrency)
+    shares = [args.requests // concurrency + (index < args.requests % concurrency) for index in range(concurrency)]
+    threads = [threading.Thread(target=run, args=(share,)) for share in shares if share]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    if server is not None:
+        print(f"service: {server.service.stats()}")
+        server.shutdown()
+        server.server_close()
+    if latencies:
+        ordered = sorted(latencies)
+        print(
+            f"{len(latencies)} {args.method} call(s), {concurrency} client(s): {len(latencies) / wall:.0f}/s, "
+            f"p50 {statistics.median(ordered):.2f} ms, p95 {ordered[int(len(ordered) * 0.95) - 1]:.2f} ms, "
+            f"max {ordered[-1]:.2f} ms"
+        )
+    print(f"cold load + compile in this process: {cold_ms:.2f} ms (a CLI run adds interpreter startup)")
+    for failure in failures[:5]:
+        print(f"failed: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def _command_simulate(args: argparse.Namespace, config: LoadedConfig) -> int:
+    known = {str(profile["id"]) for profile in config.snapshot.keyboard_profiles}
+    unknown = [profile_id for profile_id in args.active if profile_id not in known]
+    if unknown:
+        print(f"Unknown profile(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    started = time.perf_counter()
+    simulator = build_simulator(config.snapshot, group_conditions=not args.no_group, native_remaps=not args.no_remap)
+    build_ms = (time.perf_counter() - started) * 1000
+    active = simulator.active_bits(args.active)
+
+    if args.press:
+        codes, times, bad = simulator.encode_stream(args.press)
+        if bad:
+            print(f"Can't read keystroke(s): {', '.join(bad)}", file=sys.stderr)
+            return 2
+        for token, value in zip(args.press, simulator.replay(codes, active, times)):
+            result = "no hotkey, the key goes through" if value == NO_MATCH else simulator.outcomes[value].format()
+            print(f"{token} -> {result}")
+        return 0
+
+    times = None
+    if args.replay is not None:
+        try:
+            tokens = args.replay.read_text(encoding="utf-8").split()
+        except OSError as exc:
+            print(f"Couldn't read {args.replay}: {exc}", file=sys.stderr)
+            return 2
+        codes, times, bad = simulator.encode_stream(tokens)
+        if bad:
+            print(f"Skipped {len(bad)} unreadable keystroke(s), e.g. {bad[0]}", file=sys.stderr)
+    else:
+        codes = simulator.sample(args.generate, seed=args.seed)
+    started = time.perf_counter()
+    results = simulator.replay(codes, active, times)
+    elapsed = time.perf_counter() - started
+    hits = Counter(results)
+    matched = len(results) - hits[NO_MATCH]
+    rate = len(results) / elapsed if elapsed else 0.0
+    print(
+        f"{len(results)} keystroke(s), {matched} handled by the script, in {elapsed * 1000:.1f} ms "
+        f"({rate:,.0f}/s); simulator built in {build_ms:.1f} ms"
+    )
+    ranked = [(value, count) for value, count in hits.most_common() if value != NO_MATCH]
+    for value, count in ranked[: max(args.top, 0)]:
+        print(f"{count:>10}  {simulator.outcomes[value].format()}")
+    never = sum(
+        outcome.kind == OUTCOME_HOTKEY and index not in hits for index, outcome in enumerate(simulator.outcomes)
+    )
+    print(f"{never} hotkey definition(s) never ran in this stream")
+    return 0
+
+
+def _command_latency(args: argparse.Namespace, config: LoadedConfig) -> int:
+    report = ProbeReport()
+    for path in args.logs:
+        try:
+            # FileAppend starts a new UTF-8 file with a BOM.
+            with open(path, "r", encoding="utf-8-sig", errors="replace") as handle:
+                report.read(handle)
+        except OSError as exc:
+            print(f"Couldn't read {path}: {exc}", file=sys.stderr)
+            return 2
+    expected = probed_bindings(
+        compile_snapshot_ir(
+            config.snapshot,
+            group_conditions=not args.no_group,
+            native_remaps=not args.no_remap,
+            probe_log=PROBE_LOG_FILENAME,
+        )
+    )
+    rank = {
+        "hits": lambda histogram: histogram.hits,
+        "mean": lambda histogram: histogram.mean_ms,
+        "p95": lambda histogram: histogram.percentile(0.95),
+        "p99": lambda histogram: histogram.percentile(0.99),
+        "max": lambda histogram: histogram.max_ms,
+    }[args.sort]
+    ranked = sorted(report.bindings.items(), key=lambda item: (-rank(item[1]), item[0]))
+    runs = sum(histogram.hits for histogram in report.bindings.values())
+    print(f"{runs} run(s) of {len(report.bindings)} binding(s); {report.skipped} unreadable line(s) skipped")
+    if ranked and args.top > 0:
+        print(f"{'hits':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  binding")
+    known = set(expected)
+    for (profile_id, hotkey), histogram in ranked[: max(args.top, 0)]:
+        stale = "" if (profile_id, hotkey) in known else "  (not in the current config)"
+        print(
+            f"{histogram.hits:>10} {histogram.percentile(0.5):>9.3f} {histogram.percentile(0.95):>9.3f} "
+            f"{histogram.percentile(0.99):>9.3f} {histogram.max_ms:>9.3f}  {profile_id}: {hotkey}{stale}"
+        )
+    never = [binding for binding in expected if binding not in report.bindings]
+    print(f"{len(never)} of {len(expected)} probed binding(s) never ran")
+    for profile_id, hotkey in never[: max(args.top, 0)]:
+        print(f"  {profile_id}: {hotkey}")
+    if len(never) > args.top > 0:
+        print(f"  ... and {len(never) - args.top} more")
+    return 0
+
+
+def _synthetic_settings(count: int, *, unique_ratio: float, seed: int) -> str:
+    # A settings file with count bindings over every key and modifier of the
+    # keyboard view, as many profiles as that takes. Bodies repeat from a
+    # small pool except for the unique share.
+    generator = random.Random(seed)
+    key_ids = list(dict.fromkeys(key.strip() for _name, rows in KEY_SECTIONS for row in rows for key in row))
+    pool = [f"Send ^+!{{F{number}}}" for number in range(1, 13)] + ["Run calc.exe", "^v", "Reload"]
+    actions: dict[str, dict[str, dict[str, dict[str, object]]]] = {}
+    made = 0
+    while made < count:
+        profile = actions.setdefault(f"p{len(actions)}", {})
+        for key_id in key_ids:
+            for modifier in MODIFIER_OPTIONS:
+                if made == count:
+                    break
+                body = generator.choice(pool)
+                if generator.random() < unique_ratio:
+                    body = f'Run, "C:\\Tools\\tool{made}.exe" --profile {len(actions)}'
+                profile.setdefault(key_id, {})[modifier] = {"action": body, "enabled": generator.random() < 0.9}
+                made += 1
+    return json.dumps({"actions": actions})
+
+
+def _traced_bytes(build):
+    # Bytes still held by what build() returns once its temporaries are gone.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        built = build()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return built, held
+
+
+def _command_store_bench(args: argparse.Namespace, config: LoadedConfig) -> int:
+    text = _synthetic_settings(args.bindings, unique_ratio=args.unique, seed=args.seed)
+    options = MODIFIER_OPTIONS
+
+    actions, dict_bytes = _traced_bytes(
+        lambda: sanitize_actions(json.loads(text)["actions"], modifier_options=options)
+    )
+    store, store_bytes = _traced_bytes(
+        lambda: CompactBindings.from_actions(json.loads(text)["actions"], modifier_options=options)
+    )
+    if store.to_actions() != actions:
+        print("The compact store doesn't hold the same bindings as the dict tree.", file=sys.stderr)
+        return 1
+    # save_settings sanitizes into a second full tree before writing.
+    _copy, save_bytes = _traced_bytes(lambda: sanitize_actions(actions, modifier_options=options))
+    del _copy
+
+    count = len(store)
+    print(f"{count} binding(s) in {len(actions)} profile(s), {len(store.strings) - 1} distinct body text(s)")
+    print(f"dict tree:        {dict_bytes / 2**20:8.2f} MiB, {dict_bytes / count:6.1f} bytes/binding")
+    print(
+        f"compact store:    {store_bytes / 2**20:8.2f} MiB, {store_bytes / count:6.1f} bytes/binding "
+        f"({store.nbytes() / count:.1f} in columns and index)"
+    )
+    print(f"save_settings copy: {save_bytes / 2**20:6.2f} MiB more while saving the dict tree")
+
+    probes = random.Random(args.seed).sample([binding for binding, _data in store.bindings()], min(count, 20000))
+    for name, target in (("dict tree", BindingBatch(actions)), ("compact store", store)):
+        started = time.perf_counter()
+        for binding in probes:
+            target.get(*binding)
+        get_us = (time.perf_counter() - started) / len(probes) * 1e6
+        started = time.perf_counter()
+        for binding in probes:
+            target.set(*binding, {"action": "Reload", "enabled": True})
+        set_us = (time.perf_counter() - started) / len(probes) * 1e6
+        print(f"{name + ':':18}get {get_us:.2f} us, set {set_us:.2f} us")
+    return 0
+
+
+def _write_synthetic_root(root: Path, count: int, *, seed: int) -> list[str]:
+    # A config root with count bindings spread over as many profiles as
+    # _synthetic_settings needs, one device condition each. Returns the
+    # profile ids.
+    text = _synthetic_settings(count, unique_ratio=0.3, seed=seed)
+    profile_ids = list(json.loads(text)["actions"])
+    profiles = [
+        {"id": profile_id, "label": f"Synthetic {profile_id}", "condition": f"cm{index}.IsActive"}
+        for index, profile_id in enumerate(profile_ids)
+    ]
+    (root / SETTINGS_FILENAME).write_text(text, encoding="utf-8")
+    (root / KEYBOARD_PROFILES_FILENAME).write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    return profile_ids
+
+
+def _command_switch_bench(args: argparse.Namespace, config: LoadedConfig) -> int:
+    # Times profile switches in the real window at growing binding counts.
+    # The two profiles switched between are full at every size, so only
+    # the other profiles grow; a switch that stays view-only costs the same.
+    import tkinter as tk
+
+    from .app import AHKBuilder
+
+    sizes = sorted(set(args.sizes))
+    medians: list[float] = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            profile_ids = _write_synthetic_root(Path(directory), size, seed=args.seed)
+            if len(profile_ids) < 3:
+                print(f"{size} bindings fill fewer than 3 profiles; use larger --sizes.", file=sys.stderr)
+                return 2
+            try:
+                app = AHKBuilder(root=directory)
+            except tk.TclError as exc:
+                print(f"Can't open a window: {exc}", file=sys.stderr)
+                return 2
+            try:
+                app._ensure_all_profiles_loaded()
+                while app.first_paint_ms is None:
+                    app.update()
+                timings = []
+                for index in range(args.switches + 2):
+                    started = time.perf_counter()
+                    app._select_profile(profile_ids[index % 2])
+                    app.update_idletasks()
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                app.worker.close()
+                app.destroy()
+        # The first switch to each profile builds its cached key colors.
+        medians.append(statistics.median(timings[2:]))
+        print(f"{size:>10} bindings, {len(profile_ids):>5} profiles: {medians[-1]:.3f} ms per switch")
+    limit = max(medians[0] * args.max_growth, medians[0] + SWITCH_BENCH_SLACK_MS)
+    if medians[-1] > limit:
+        print(
+            f"Switching got slower with more bindings: {medians[-1]:.3f} ms at {sizes[-1]} against "
+            f"{medians[0]:.3f} ms at {sizes[0]} (limit {limit:.3f} ms).",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def _command_startup_check(args: argparse.Namespace, config: LoadedConfig) -> int:
+    # Opens the real window against the configs in --root and fails when
+    # it takes longer than the budget to first paint.
+    import tkinter as tk
+
+    from .app import AHKBuilder
+
+    try:
+        app = AHKBuilder(root=args.root)
+    except tk.TclError as exc:
+        print(f"Can't open a window: {exc}", file=sys.stderr)
+        return 2
+    try:
+        while app.first_paint_ms is None:
+            app.update()
+        report = app.startup_timer.report()
+    finally:
+        app.worker.close()
+        app.destroy()
+    print(report)
+    if app.first_paint_ms > args.budget:
+        print(f"First paint took {app.first_paint_ms:.0f} ms, over the {args.budget} ms budget.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ahkmate", description="Headless tools for ahkmate configs.")
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=DEFAULT_ROOT,
+        help="directory holding assignments.json, keyboards.json and script_header.json",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="compile and export the .ahk script")
+    build.add_argument("-o", "--output", help="output path, or '-' for stdout (default: export_path.json)")
+    build.add_argument("--split", action="store_true", help="write one #include file per profile")
+    build.add_argument(
+        "--no-group",
+        action="store_true",
+        help="keep keyboards.json order instead of merging #if blocks that share a condition",
+    )
+    build.add_argument(
+        "--no-remap",
+        action="store_true",
+        help="emit every body as written instead of native remaps and SendInput for pure key sends",
+    )
+    build.add_argument(
+        "--compact", action="store_true", help="one-line hotkeys where safe, no comments or blank separators"
+    )
+    build.add_argument(
+        "-f",
+        "--format",
+        dest="formats",
+        action="append",
+        choices=sorted(EMITTERS),
+        help=f"output format (default: {DEFAULT_FORMAT}); repeat to write several, each with its own suffix",
+    )
+    build.add_argument(
+        "--probes",
+        nargs="?",
+        const=PROBE_LOG_FILENAME,
+        default="",
+        metavar="LOG",
+        help=f"time every hotkey and log the runs to LOG, relative to the script (default: {PROBE_LOG_FILENAME})",
+    )
+    build.add_argument("--fail-on-lint", action="store_true", help="exit non-zero if any action has lint errors")
+    build.set_defaults(handler=_command_build)
+
+    lint = subparsers.add_parser("lint", help="report lint diagnostics for every action body")
+    lint.set_defaults(handler=_command_lint)
+
+    history = subparsers.add_parser("history", help="inspect or restore recorded versions of the assignments")
+    history_commands = history.add_subparsers(dest="history_command", required=True)
+    log = history_commands.add_parser("log", help="list recorded versions, newest first")
+    log.add_argument("-n", "--limit", type=int, default=0)
+    log.set_defaults(handler=_command_history_log)
+    diff = history_commands.add_parser("diff", help="show binding changes between two versions")
+    diff.add_argument("old", help="version id prefix, HEAD or HEAD~N")
+    diff.add_argument("new", nargs="?", default="HEAD")
+    diff.set_defaults(handler=_command_history_diff)
+    restore = history_commands.add_parser("restore", help="write a recorded version back to assignments.json")
+    restore.add_argument("version")
+    restore.set_defaults(handler=_command_history_restore)
+
+    conditions = subparsers.add_parser(
+        "conditions", help="report the #if evaluations each hotkey costs after grouping"
+    )
+    conditions.add_argument("--all", action="store_true", help="also list hotkeys with no #if variants")
+    conditions.set_defaults(handler=_command_conditions)
+
+    compact_check = subparsers.add_parser(
+        "compact-check", help="verify that --compact output defines the same hotkeys as the normal output"
+    )
+    compact_check.set_defaults(handler=_command_compact_check)
+
+    hotstrings = subparsers.add_parser(
+        "hotstrings", help="report duplicate and shadowed hotstrings, or list them by prefix"
+    )
+    hotstrings.add_argument("--prefix", help="list hotstrings whose abbreviation starts with this")
+    hotstrings.add_argument("--profile", help="limit --prefix to one profile id")
+    hotstrings.add_argument("--limit", type=int, default=100)
+    hotstrings.add_argument(
+        "--all", action="store_true", help="also report abbreviations that merely start with another one"
+    )
+    hotstrings.set_defaults(handler=_command_hotstrings)
+
+    sequences = subparsers.add_parser(
+        "sequences", help="report key-sequence state machines and ambiguous or clashing sequences"
+    )
+    sequences.set_defaults(handler=_command_sequences)
+
+    profiles = subparsers.add_parser(
+        "profiles", help="show each profile's parent chain and how many bindings it owns, inherits and emits"
+    )
+    profiles.add_argument("--search", help="list profiles whose label, id, device id or description contain this")
+    profiles.add_argument("--limit", type=int, default=100)
+    profiles.set_defaults(handler=_command_profiles)
+
+    remaps = subparsers.add_parser(
+        "remaps", help="list bindings emitted as native remaps or SendInput instead of their body"
+    )
+    remaps.set_defaults(handler=_command_remaps)
+
+    serve = subparsers.add_parser("serve", help="run the JSON-RPC compile service on localhost")
+    serve.add_argument("--host", default=SERVICE_HOST)
+    serve.add_argument("--port", type=int, default=SERVICE_PORT)
+    serve.add_argument("--cache-size", type=int, default=SERVICE_CACHE_SIZE, help="config roots kept loaded")
+    serve.add_argument(
+        "--allow-root",
+        action="append",
+        type=Path,
+        default=[],
+        metavar="DIR",
+        help="another config root callers may name; repeat for several (default: only --root)",
+    )
+    serve.add_argument("--allow-remote", action="store_true", help="allow --host to be a non-loopback address")
+    serve.set_defaults(handler=_command_serve)
+
+    rpc = subparsers.add_parser("rpc", help="call a method of a running compile service")
+    rpc.add_argument("method", help="load, validate, compile, diff or stats")
+    rpc.add_argument("--params", default="{}", help='named params as a JSON object, e.g. \'{"compact": true}\'')
+    rpc.add_argument("--url", default=f"http://{SERVICE_HOST}:{SERVICE_PORT}/")
+    rpc.set_defaults(handler=_command_rpc)
+
+    loadtest = subparsers.add_parser("loadtest", help="measure compile service latency under concurrent clients")
+    loadtest.add_argument("--url", help="service to test (default: start one in this process)")
+    loadtest.add_argument("--method", choices=["load", "validate", "compile"], default="compile")
+    loadtest.add_argument("-n", "--requests", type=int, default=500)
+    loadtest.add_argument("-c", "--concurrency", type=int, default=4)
+    loadtest.set_defaults(handler=_command_loadtest)
+
+    simulate = subparsers.add_parser(
+        "simulate", help="resolve keystrokes against the compiled script without running AutoHotkey"
+    )
+    simulate.add_argument(
+        "--active", action="append", default=[], metavar="PROFILE", help="profile whose condition holds (repeatable)"
+    )
+    source = simulate.add_mutually_exclusive_group()
+    source.add_argument("--press", nargs="+", metavar="KEY", help='keystrokes in order, e.g. "Ctrl+\\" or "a@1500"')
+    source.add_argument("--replay", type=Path, help="file of whitespace-separated keystrokes to replay")
+    source.add_argument("--generate", type=int, default=1_000_000, help="replay this many random keystrokes")
+    simulate.add_argument("--seed", type=int, default=0)
+    simulate.add_argument("--top", type=int, default=10, help="most frequent outcomes to list")
+    simulate.add_argument("--no-group", action="store_true", help="simulate the script built with --no-group")
+    simulate.add_argument("--no-remap", action="store_true", help="simulate the script built with --no-remap")
+    simulate.set_defaults(handler=_command_simulate)
+
+    latency = subparsers.add_parser(
+        "latency", help="report per-binding latency from the logs of a script built with --probes"
+    )
+    latency.add_argument("logs", nargs="+", type=Path, metavar="LOG")
+    latency.add_argument("--top", type=int, default=20, help="bindings to list, slowest first")
+    latency.add_argument("--sort", choices=["p95", "p99", "max", "mean", "hits"], default="p95")
+    latency.add_argument("--no-group", action="store_true", help="the script was built with --no-group")
+    latency.add_argument("--no-remap", action="store_true", help="the script was built with --no-remap")
+    latency.set_defaults(handler=_command_latency)
+
+    store_bench = subparsers.add_parser(
+        "store-bench", help="compare memory per binding of the compact binding store and the dict tree"
+    )
+    store_bench.add_argument("--bindings", type=int, default=100_000)
+    store_bench.add_argument("--unique", type=float, default=0.3, help="share of bindings with a body of their own")
+    store_bench.add_argument("--seed", type=int, default=0)
+    store_bench.set_defaults(handler=_command_store_bench)
+
+    switch_bench = subparsers.add_parser(
+        "switch-bench", help="check that a profile switch in the GUI costs the same at any binding count"
+    )
+    switch_bench.add_argument("--sizes", type=int, nargs="+", default=[2_000, 20_000, 100_000], metavar="N")
+    switch_bench.add_argument("--switches", type=int, default=50)
+    switch_bench.add_argument(
+        "--max-growth",
+        type=float,
+        default=2.0,
+        help="allowed ratio of the largest size's switch time to the smallest's",
+    )
+    switch_bench.add_argument("--seed", type=int, default=0)
+    switch_bench.set_defaults(handler=_command_switch_bench)
+
+    startup = subparsers.add_parser("startup-check", help="time the GUI's first paint against a budget")
+    startup.add_argument("--budget", type=int, default=FIRST_PAINT_BUDGET_MS, help="milliseconds")
+    startup.set_defaults(handler=_command_startup_check)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    config = load_config(args.root)
+    for warning in config.warnings:
+        print(warning, file=sys.stderr)
+    return args.handler(args, config)
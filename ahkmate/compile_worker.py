@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import queue
+import threading
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .condition_groups import group_by_condition
+from .constants import SEQUENCE_TIMEOUT_MS
+from .emitters import DEFAULT_FORMAT, get_emitter
+from .probes import add_latency_probes
+from .remaps import optimize_remaps, optimized_line_numbers
+from .script_ir import FragmentCache, ScriptIR, compile_script_ir
+from .script_export import shard_dir_for, write_sharded_script, write_text_if_changed
+from .sequence_machine import lower_sequences
+from .settings_io import ActionsByKey, ActionsByProfile
+from .templates import ActionTemplate, TemplateExpander
+
+
+ProgressCallback = Callable[[int, int], None]
+Job = Callable[[ProgressCallback], Any]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class CompileSnapshot:
+    header_lines: tuple[str, ...]
+    keyboard_profiles: tuple[Mapping[str, Any], ...]
+    actions_by_profile: Mapping[str, ActionsByKey]
+    key_name_overrides: Mapping[str, str]
+    modifier_prefix: Mapping[str, str]
+    modifier_options: tuple[str, ...]
+    templates: Mapping[str, ActionTemplate]
+    expander: TemplateExpander
+
+    def expand_template(self, name: str, args: Mapping[str, str]) -> str | None:
+        return self.expander.expand(name, args, self.templates)
+
+
+@dataclass(slots=True)
+class ExportOutcome:
+    path: Path
+    empty: bool = False
+    written: list[Path] = field(default_factory=list)
+    shard_count: int = 0
+    error: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class WorkerProgress:
+    kind: str
+    generation: int
+    done: int
+    total: int
+
+
+@dataclass(frozen=True, slots=True)
+class WorkerResult:
+    kind: str
+    generation: int
+    value: Any = None
+    error: str | None = None
+
+
+def copy_profile_actions(actions: Any) -> ActionsByKey:
+    if not isinstance(actions, dict):
+        return {}
+    return {
+        key: {modifier: dict(data) for modifier, data in entry.items() if isinstance(data, dict)}
+        for key, entry in actions.items()
+        if isinstance(entry, dict)
+    }
+
+
+def make_snapshot(
+    *,
+    header_lines: Sequence[str],
+    keyboard_profiles: Sequence[Mapping[str, Any]],
+    frozen_actions: ActionsByProfile,
+    key_name_overrides: Mapping[str, str],
+    modifier_prefix: Mapping[str, str],
+    modifier_options: Sequence[str],
+    expander: TemplateExpander,
+) -> CompileSnapshot:
+    return CompileSnapshot(
+        header_lines=tuple(header_lines),
+        keyboard_profiles=tuple(dict(profile) for profile in keyboard_profiles),
+        actions_by_profile=dict(frozen_actions),
+        key_name_overrides=key_name_overrides,
+        modifier_prefix=modifier_prefix,
+        modifier_options=tuple(modifier_options),
+        templates=expander.templates,
+        expander=expander,
+    )
+
+
+def compile_snapshot_ir(
+    snapshot: CompileSnapshot,
+    progress: ProgressCallback | None = None,
+    fragment_cache: FragmentCache | None = None,
+    *,
+    group_conditions: bool = True,
+    native_remaps: bool = True,
+    lower_key_sequences: bool = True,
+    probe_log: str = "",
+) -> ScriptIR:
+    ir = compile_script_ir(
+        header_lines=snapshot.header_lines,
+        keyboard_profiles=snapshot.keyboard_profiles,
+        actions_by_profile=snapshot.actions_by_profile,
+        key_name_overrides=snapshot.key_name_overrides,
+        modifier_prefix=snapshot.modifier_prefix,
+        modifier_options=snapshot.modifier_options,
+        progress=progress,
+        expand_template=snapshot.expand_template,
+        fragment_cache=fragment_cache,
+    )
+    return run_passes(
+        ir,
+        fragment_cache,
+        group_conditions=group_conditions,
+        native_remaps=native_remaps,
+        lower_key_sequences=lower_key_sequences,
+        probe_log=probe_log,
+    )
+
+
+def run_passes(
+    ir: ScriptIR,
+    fragment_cache: FragmentCache | None = None,
+    *,
+    group_conditions: bool = True,
+    native_remaps: bool = True,
+    lower_key_sequences: bool = True,
+    probe_log: str = "",
+) -> ScriptIR:
+    # The one place the passes are chained, in the order they depend on.
+    if probe_log:
+        ir = add_latency_probes(ir, probe_log, fragment_cache)
+    if group_conditions:
+        ir, _report = group_by_condition(ir)
+    # Sequences are lowered after grouping so their pending-key blocks sit
+    # right before the block that owns them.
+    if lower_key_sequences:
+        ir, _sequence_issues = lower_sequences(ir, timeout_ms=SEQUENCE_TIMEOUT_MS, fragment_cache=fragment_cache)
+    if native_remaps:
+        ir, _optimized = optimize_remaps(ir, fragment_cache)
+    return ir
+
+
+def compile_snapshot(
+    snapshot: CompileSnapshot,
+    progress: ProgressCallback | None = None,
+    fragment_cache: FragmentCache | None = None,
+    *,
+    output_format: str = DEFAULT_FORMAT,
+    compact: bool = False,
+) -> str:
+    ir = compile_snapshot_ir(snapshot, progress, fragment_cache)
+    return get_emitter(output_format, compact=compact).render(ir, fragment_cache)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledPreview:
+    text: str
+    # 0-based line numbers of bindings emitted as a remap or SendInput
+    optimized_lines: tuple[int, ...]
+    optimized_count: int
+
+
+def compile_preview(
+    snapshot: CompileSnapshot,
+    progress: ProgressCallback | None = None,
+    fragment_cache: FragmentCache | None = None,
+    *,
+    compact: bool = False,
+) -> CompiledPreview:
+    ir = compile_snapshot_ir(snapshot, progress, fragment_cache)
+    emitter = get_emitter(DEFAULT_FORMAT, compact=compact)
+    text = emitter.render(ir, fragment_cache)
+    return CompiledPreview(
+        text=text,
+        optimized_lines=tuple(optimized_line_numbers(text.splitlines(), ir, emitter)),
+        optimized_count=sum(bool(binding.optimized) for profile in ir.profiles for binding in profile.bindings),
+    )
+
+
+def export_snapshot(
+    snapshot: CompileSnapshot,
+    path: Path,
+    *,
+    split_profiles: bool,
+    output_format: str = DEFAULT_FORMAT,
+    compact: bool = False,
+    probe_log: str = "",
+    progress: ProgressCallback | None = None,
+    fragment_cache: FragmentCache | None = None,
+    ir: ScriptIR | None = None,
+) -> ExportOutcome:
+    # Pass a precompiled ir to write several formats from one compile.
+    outcome = ExportOutcome(path=path)
+    if ir is None:
+        ir = compile_snapshot_ir(snapshot, progress, fragment_cache, probe_log=probe_log)
+    emitter = get_emitter(output_format, compact=compact)
+    script = emitter.render(ir, fragment_cache)
+    if not script.strip():
+        outcome.empty = True
+        return outcome
+    if not split_profiles or not emitter.shardable:
+        try:
+            if write_text_if_changed(path, script):
+                outcome.written.append(path)
+        except OSError as exc:
+            outcome.error = str(exc)
+        return outcome
+
+    main_text, shards = emitter.render_shards(
+        ir, shard_dir_name=shard_dir_for(path).name, fragment_cache=fragment_cache
+    )
+    outcome.shard_count = len(shards)
+    outcome.written, outcome.error = write_sharded_script(path, main_text, shards)
+    return outcome
+
+
+# Runs jobs off the Tk thread. Each job kind has one pending slot: a newer
+# submission replaces the waiting job and cancels the running one at its next
+# progress call. The UI thread collects progress and results with poll().
+class BackgroundWorker:
+    def __init__(self, name: str = "ahkmate-worker") -> None:
+        self._condition = threading.Condition()
+        self._pending: dict[str, tuple[int, Job]] = {}
+        self._generations: dict[str, int] = {}
+        self._running = False
+        self._closed = False
+        self._results: queue.SimpleQueue[WorkerProgress | WorkerResult] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, job: Job) -> int:
+        with self._condition:
+            generation = self._generations.get(kind, 0) + 1
+            self._generations[kind] = generation
+            self._pending[kind] = (generation, job)
+            self._condition.notify()
+        return generation
+
+    def is_current(self, kind: str, generation: int) -> bool:
+        return self._generations.get(kind) == generation
+
+    def busy(self) -> bool:
+        with self._condition:
+            return self._running or bool(self._pending) or not self._results.empty()
+
+    def poll(self) -> list[WorkerProgress | WorkerResult]:
+        items = []
+        while True:
+            try:
+                items.append(self._results.get_nowait())
+            except queue.Empty:
+                return items
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                kind = next(iter(self._pending))
+                generation, job = self._pending.pop(kind)
+                self._running = True
+
+            def progress(done: int, total: int, kind: str = kind, generation: int = generation) -> None:
+                if self._closed or not self.is_current(kind, generation):
+                    raise JobCancelled
+                self._results.put(WorkerProgress(kind, generation, done, total))
+
+            try:
+                value = job(progress)
+            except JobCancelled:
+                pass
+            except Exception as exc:  # reported to the UI instead of killing the thread
+                self._results.put(WorkerResult(kind, generation, error=str(exc) or type(exc).__name__))
+            else:
+                self._results.put(WorkerResult(kind, generation, value=value))
+            finally:
+                with self._condition:
+                    self._running = False
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+
+from .script_ir import IRBinding, IRProfile, ScriptIR
+
+
+# AutoHotkey picks the first eligible #if variant of a hotkey in script
+# order and falls back to the unconditional one, whatever its position.
+# Moving the unconditional block last is therefore always safe, and a later
+# profile can join an earlier block with the same condition unless another
+# condition defines one of its hotkeys in between.
+
+
+@dataclass(frozen=True, slots=True)
+class HotkeyCost:
+    hotkey: str
+    conditions: tuple[str, ...]
+    has_global: bool
+
+    @property
+    def worst_case(self) -> int:
+        # Every #if variant is evaluated when none of them matches.
+        return len(self.conditions)
+
+
+@dataclass(slots=True)
+class GroupingReport:
+    merged: list[tuple[str, ...]] = field(default_factory=list)
+    # (condition, hotkey, profile id) of bindings dropped as exact repeats.
+    duplicates: list[tuple[str, str, str]] = field(default_factory=list)
+    # (condition, hotkey, kept profile id, dropped profile id): AutoHotkey
+    # refuses to load a script with these, so only the first is kept.
+    conflicts: list[tuple[str, str, str, str]] = field(default_factory=list)
+    # (condition, hotkey) variants removed because the unconditional
+    # variant does the same thing.
+    redundant: list[tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class _Block:
+    condition: str
+    members: list[IRProfile]
+    bindings: dict[str, IRBinding]
+    owners: dict[str, str]
+
+    def to_profile(self) -> IRProfile:
+        if len(self.members) == 1 and len(self.bindings) == len(self.members[0].bindings):
+            return self.members[0]
+        return IRProfile(
+            profile_id=self.members[0].profile_id,
+            label=" + ".join(member.label for member in self.members),
+            condition=self.condition,
+            bindings=tuple(self.bindings.values()),
+            sequences=tuple(sequence for member in self.members for sequence in member.sequences),
+        )
+
+    def has_content(self) -> bool:
+        return bool(self.bindings) or any(member.sequences for member in self.members)
+
+
+def _add_binding(block: _Block, binding: IRBinding, profile_id: str, report: GroupingReport) -> None:
+    existing = block.bindings.get(binding.hotkey)
+    if existing is None:
+        block.bindings[binding.hotkey] = binding
+        block.owners[binding.hotkey] = profile_id
+    elif existing.body == binding.body:
+        report.duplicates.append((block.condition, binding.hotkey, profile_id))
+    else:
+        report.conflicts.append((block.condition, binding.hotkey, block.owners[binding.hotkey], profile_id))
+
+
+def _repeats_earlier(blocks: list[_Block], profile: IRProfile, binding: IRBinding, report: GroupingReport) -> bool:
+    # A binding that stays behind can still repeat a hotkey already defined
+    # under the same condition; that is reported like any other repeat.
+    for block in blocks:
+        if block.condition == profile.condition and binding.hotkey in block.bindings:
+            _add_binding(block, binding, profile.profile_id, report)
+            return True
+    return False
+
+
+def group_by_condition(ir: ScriptIR) -> tuple[ScriptIR, GroupingReport]:
+    report = GroupingReport()
+    blocks: list[_Block] = []
+    first_block: dict[str, int] = {}
+    # hotkey -> block positions of its conditional variants, in order
+    variant_positions: dict[str, list[tuple[int, str]]] = {}
+    global_block: _Block | None = None
+
+    for profile in ir.profiles:
+        if not profile.condition:
+            if global_block is None:
+                global_block = _Block("", [], {}, {})
+            global_block.members.append(profile)
+            for binding in profile.bindings:
+                _add_binding(global_block, binding, profile.profile_id, report)
+            continue
+
+        target_index = first_block.get(profile.condition)
+        moved: list[IRBinding] = []
+        spilled: list[IRBinding] = []
+        for binding in profile.bindings:
+            blocked = target_index is None or any(
+                position > target_index and condition != profile.condition
+                for position, condition in variant_positions.get(binding.hotkey, ())
+            )
+            if blocked and target_index is not None and _repeats_earlier(blocks, profile, binding, report):
+                continue
+            (spilled if blocked else moved).append(binding)
+
+        placements: list[tuple[int, list[IRBinding]]] = []
+        if moved:
+            block = blocks[target_index]
+            # Sequences stay where the profile was: their leader hotkeys
+            # haven't been checked against the blocks in between.
+            block.members.append(replace(profile, sequences=()) if profile.sequences else profile)
+            for binding in moved:
+                _add_binding(block, binding, profile.profile_id, report)
+            placements.append((target_index, moved))
+        if spilled or profile.sequences:
+            # Bindings that can't move up keep their place in a block of
+            # their own, which later profiles with the condition may join.
+            subset = profile
+            if moved:
+                subset = replace(profile, bindings=tuple(spilled))
+            block = _Block(profile.condition, [subset], {}, {})
+            for binding in spilled:
+                _add_binding(block, binding, profile.profile_id, report)
+            first_block.setdefault(profile.condition, len(blocks))
+            placements.append((len(blocks), spilled))
+            blocks.append(block)
+        for position, placed in placements:
+            for binding in placed:
+                variant_positions.setdefault(binding.hotkey, []).append((position, profile.condition))
+
+    if global_block is not None:
+        _drop_redundant_variants(blocks, global_block, report)
+        blocks.append(global_block)
+
+    profiles = []
+    for block in blocks:
+        if len(block.members) > 1:
+            report.merged.append(tuple(member.profile_id for member in block.members))
+        if block.has_content() or block is global_block:
+            profiles.append(block.to_profile())
+    return replace(ir, profiles=tuple(profiles)), report
+
+
+def _drop_redundant_variants(blocks: list[_Block], global_block: _Block, report: GroupingReport) -> None:
+    # Going from the lowest-precedence #if variant up: a variant whose body
+    # equals the unconditional one changes nothing when it is the last
+    # conditional candidate, so it only costs a condition evaluation.
+    for hotkey, fallback in global_block.bindings.items():
+        for block in reversed(blocks):
+            binding = block.bindings.get(hotkey)
+            if binding is None:
+                continue
+            if binding.body != fallback.body:
+                break
+            del block.bindings[hotkey]
+            report.redundant.append((block.condition, hotkey))
+
+
+def condition_costs(ir: ScriptIR) -> list[HotkeyCost]:
+    conditions: dict[str, list[str]] = {}
+    has_global: set[str] = set()
+    for profile in ir.profiles:
+        for binding in profile.bindings:
+            if profile.condition:
+                conditions.setdefault(binding.hotkey, []).append(profile.condition)
+            else:
+                conditions.setdefault(binding.hotkey, [])
+                has_global.add(binding.hotkey)
+    costs = [
+        HotkeyCost(hotkey, tuple(hotkey_conditions), hotkey in has_global)
+        for hotkey, hotkey_conditions in conditions.items()
+    ]
+    costs.sort(key=lambda cost: (-cost.worst_case, cost.hotkey))
+    return costs
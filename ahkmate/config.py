@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+from .compile_worker import CompileSnapshot, make_snapshot
+from .constants import (
+    DEFAULT_HEADER_LINES,
+    DEFAULT_KEYBOARD_PROFILES,
+    EXPORT_PATH_FILENAME,
+    KEY_NAME_OVERRIDES,
+    KEYBOARD_PROFILES_FILENAME,
+    MODIFIER_OPTIONS,
+    MODIFIER_PREFIX,
+    SCRIPT_HEADER_FILENAME,
+    SETTINGS_FILENAME,
+    TEMPLATES_FILENAME,
+)
+from .inheritance import ResolvedProfiles
+from .linter import BindingDiagnostics, LintCache, lint_actions
+from .settings_io import (
+    ActionsByProfile,
+    load_format_headers,
+    load_keyboard_profiles,
+    load_script_header,
+    load_settings,
+)
+from .templates import TemplateExpander, load_templates
+
+
+CONFIG_FILENAMES = (KEYBOARD_PROFILES_FILENAME, SETTINGS_FILENAME, SCRIPT_HEADER_FILENAME, TEMPLATES_FILENAME)
+
+
+@dataclass(slots=True)
+class LoadedConfig:
+    snapshot: CompileSnapshot
+    warnings: list[str]
+    format_headers: dict[str, list[str]]
+    resolved: ResolvedProfiles
+    # The bindings as stored, before inheritance is applied.
+    settings_actions: ActionsByProfile
+
+
+def load_config(root: Path) -> LoadedConfig:
+    warnings: list[str] = []
+    profiles, _default_profile, error = load_keyboard_profiles(
+        root / KEYBOARD_PROFILES_FILENAME, DEFAULT_KEYBOARD_PROFILES
+    )
+    if error:
+        warnings.append(error)
+    header_lines = load_script_header(root / SCRIPT_HEADER_FILENAME, DEFAULT_HEADER_LINES)
+    settings, error = load_settings(root / SETTINGS_FILENAME, modifier_options=MODIFIER_OPTIONS)
+    if error:
+        warnings.append(error)
+    templates, error = load_templates(root / TEMPLATES_FILENAME)
+    if error:
+        warnings.append(error)
+    resolved = ResolvedProfiles(settings.actions_by_profile, profiles)
+    for profile_id, key_id, modifier, ancestor in resolved.unreachable_disables():
+        warnings.append(
+            f"{profile_id}: the disabled {modifier} {key_id} binding can't turn off {ancestor}'s, "
+            "which applies under the same condition"
+        )
+    snapshot = make_snapshot(
+        header_lines=header_lines,
+        keyboard_profiles=profiles,
+        frozen_actions=resolved.effective_actions(),
+        key_name_overrides=KEY_NAME_OVERRIDES,
+        modifier_prefix=MODIFIER_PREFIX,
+        modifier_options=MODIFIER_OPTIONS,
+        expander=TemplateExpander(templates),
+    )
+    return LoadedConfig(
+        snapshot=snapshot,
+        warnings=warnings,
+        format_headers=load_format_headers(root / SCRIPT_HEADER_FILENAME),
+        resolved=resolved,
+        settings_actions=settings.actions_by_profile,
+    )
+
+
+def saved_export_path(root: Path) -> Path | None:
+    try:
+        with open(root / EXPORT_PATH_FILENAME, "r", encoding="utf-8") as handle:
+            saved_path = str(json.load(handle).get("export_path", "")).strip()
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return None
+    return Path(saved_path) if saved_path else None
+
+
+def lint_config(snapshot: CompileSnapshot, cache: LintCache | None = None) -> BindingDiagnostics:
+    return lint_actions(
+        snapshot.actions_by_profile,
+        modifier_options=snapshot.modifier_options,
+        cache=cache if cache is not None else LintCache(),
+        expand_template=snapshot.expand_template,
+    )
@@ -100,6 +100,10 @@ KEY_NAME_OVERRIDES = {
 }
 
 SETTINGS_FILENAME = "assignments.json"
+SESSION_FILENAME = "session.json"
+TEMPLATES_FILENAME = "templates.json"
+HISTORY_DIRNAME = ".ahkmate_history"
+HISTORY_DIALOG_LIMIT = 200
 KEYBOARD_PROFILES_FILENAME = "keyboards.json"
 SCRIPT_HEADER_FILENAME = "script_header.json"
 EXPORT_PATH_FILENAME = "export_path.json"
@@ -118,10 +122,59 @@ DEFAULT_HEADER_LINES = [
     "",
 ]
 
+DEFAULT_KEYBOARD_PROFILES = [
+    {
+        "id": "default",
+        "label": "Default keyboard",
+        "condition": "",
+        "device_id": "",
+        "description": "Global profile",
+    },
+    {
+        "id": "id1",
+        "label": "id1 keyboard",
+        "condition": "cm1.IsActive",
+        "device_id": "0x046D,0xC31C,1",
+        "description": "Logitech profile",
+    },
+    {
+        "id": "id2",
+        "label": "id2 keyboard",
+        "condition": "cm2.IsActive",
+        "device_id": "0x258A,0x002A,1",
+        "description": "Secondary profile",
+    },
+]
+
 MODIFIER_OPTIONS = ["None", "Ctrl", "Win", "Alt", "Shift"]
 MODIFIER_PREFIX = {"Ctrl": "^", "Win": "#", "Alt": "!", "Shift": "+"}
 
 KEY_DEFAULT_BUTTON_BG = "#e1e1e1"
 KEY_BIND_COLOR = "#8dd38d"
+KEY_INHERITED_COLOR = "#c6e8c6"
+KEY_LINT_ERROR_COLOR = "#f0a0a0"
 MODIFIER_ENABLED_TEXT = "Enabled"
+MODIFIER_OPTIMIZE_TEXT = "Allow SendInput"
+MODIFIER_REMAP_TEXT = "Allow native remap"
+PREVIEW_OPTIMIZED_BG = "#e3f2e1"
 
+# Roughly one Tk frame at 60 Hz.
+WORKER_POLL_MS = 16
+WATCH_INTERVAL_MS = 1000
+PREVIEW_CHUNK_LINES = 2000
+HOTSTRING_LIST_LIMIT = 200
+PROFILE_PICKER_LIMIT = 200
+# Idle time after which a half-typed key sequence is dropped.
+SEQUENCE_TIMEOUT_MS = 1000
+PROFILE_LOAD_BATCH = 8
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+# Config roots the compile service keeps loaded.
+SERVICE_CACHE_SIZE = 8
+FIRST_PAINT_BUDGET_MS = 400
+# Where probed scripts write their latency log, next to the script unless
+# absolute, and how long the hotkeys must be quiet before it is written.
+PROBE_LOG_FILENAME = "ahkmate_latency.log"
+PROBE_FLUSH_MS = 1000
+# switch-bench tolerates this much growth on top of its ratio, as timer noise.
+SWITCH_BENCH_SLACK_MS = 1.0
@@ -0,0 +1,500 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from abc import ABC, abstractmethod
+from pathlib import PureWindowsPath
+
+from .constants import PROBE_FLUSH_MS
+from .hotstrings import is_hotstring
+from .probes import PROBE_FREQUENCY_MARK, PROBE_FUNCTION, is_label, probe_variable
+from .script_ir import (
+    OPTIMIZED_REMAP,
+    OPTIMIZED_SEND_INPUT,
+    FragmentCache,
+    IRBinding,
+    IRProfile,
+    ScriptIR,
+    SequenceMachine,
+)
+
+
+# A one-line body can go after the "::" only if AutoHotkey can't read it as
+# a remap target (a bare key name) or as the start of a block that would
+# swallow the following lines.
+INLINE_BODY_PATTERN = re.compile(r"[\s,(]|:=")
+BLOCK_KEYWORDS = frozenset(
+    {"if", "else", "loop", "while", "for", "try", "catch", "finally", "until", "switch", "case"}
+)
+BLOCK_PREFIXES = (";", "/*", "{", "}", "#", "(", ")")
+LEADING_WORD_PATTERN = re.compile(r"[A-Za-z_]+")
+
+
+def shard_filename(profile_id: str, used: set[str] | None = None) -> str:
+    # Ids that sanitize to a name already in used, ignoring case as Windows
+    # does, get a short hash of the id so their shards stay apart.
+    stem = re.sub(r"[^\w.-]", "_", profile_id)
+    if used is not None:
+        if stem.casefold() in used:
+            stem = f"{stem}_{hashlib.sha1(profile_id.encode('utf-8')).hexdigest()[:8]}"
+        used.add(stem.casefold())
+    return stem + ".ahk"
+
+
+def inline_body(body: tuple[str, ...]) -> str | None:
+    if len(body) != 1:
+        return None
+    line = body[0].strip()
+    if not line or line.startswith(BLOCK_PREFIXES) or not INLINE_BODY_PATTERN.search(line):
+        return None
+    # Keep trailing comments on their own body line, where they can't be
+    # mistaken for part of the hotkey definition by tools reading it back.
+    if " ;" in line or "\t;" in line:
+        return None
+    word = LEADING_WORD_PATTERN.match(line)
+    if word is not None and word.group().lower() in BLOCK_KEYWORDS:
+        return None
+    return line
+
+
+class AhkEmitter(ABC):
+    name = ""
+    suffix = ".ahk"
+    shardable = True
+
+    def __init__(self, *, compact: bool = False) -> None:
+        # Compact output drops the label comments and blank separators,
+        # indents with tabs and puts safe one-line bodies after the "::".
+        self.compact = compact
+        self.cache_name = f"{self.name}-compact" if compact else self.name
+
+    @abstractmethod
+    def profile_lines(self, profile: IRProfile) -> list[str]:
+        ...
+
+    def include_line(self, shard_dir_name: str, filename: str) -> str:
+        return f"#include %A_ScriptDir%\\{shard_dir_name}\\{filename}"
+
+    def send_input_line(self, keys: str) -> str:
+        return f"SendInput {keys}"
+
+    def quote(self, text: str) -> str:
+        return '"' + text.replace('"', '""') + '"'
+
+    def body_lines(self, binding: IRBinding) -> tuple[str, ...]:
+        if binding.dispatch:
+            lines = (f"{binding.dispatch}({self.quote(binding.hotkey)})",)
+        elif binding.optimized == OPTIMIZED_SEND_INPUT:
+            lines = (self.send_input_line(binding.keys),)
+        else:
+            lines = binding.body
+        return self._probed_lines(binding, lines) if binding.probe else lines
+
+    def probe_start_line(self, variable: str) -> str:
+        return f'DllCall("QueryPerformanceCounter", "Int64*", {variable})'
+
+    def _probed_lines(self, binding: IRBinding, lines: tuple[str, ...]) -> tuple[str, ...]:
+        variable = probe_variable(binding)
+        call = f"{PROBE_FUNCTION}({self.quote(binding.hotkey)}, {self.quote(binding.probe)}, {variable})"
+        probed = [self.probe_start_line(variable)]
+        for index, line in enumerate(lines):
+            if is_label(line):
+                return (*probed, *lines[index:])
+            if line.strip().lower() == "return":
+                probed.append(f"{line[: len(line) - len(line.lstrip())]}return {call}")
+            else:
+                probed.append(line)
+        if not lines or lines[-1].strip().lower() != "return":
+            probed.append(call)
+        return tuple(probed)
+
+    def probe_log_expression(self, log_path: str) -> str:
+        # A relative log path is taken from the script's folder.
+        if PureWindowsPath(log_path).is_absolute():
+            return self.quote(log_path)
+        return f'A_ScriptDir "\\" {self.quote(log_path)}'
+
+    @abstractmethod
+    def probe_function_lines(self, log_path: str, indent: str) -> list[str]:
+        ...
+
+    def _probe_lines(self, ir: ScriptIR) -> list[str]:
+        if not ir.probe_log:
+            return []
+        return self.probe_function_lines(ir.probe_log, "\t" if self.compact else "    ")
+
+    def remap_line(self, binding: IRBinding) -> str | None:
+        if binding.optimized == OPTIMIZED_REMAP:
+            return f"{binding.hotkey}::{binding.keys}"
+        return None
+
+    def hotstring_line(self, binding: IRBinding) -> str | None:
+        # Text after "::" on the same line is what a hotstring types (or runs,
+        # with X), so one-line hotstrings are never split over two lines.
+        if len(binding.body) == 1 and is_hotstring(binding.key_id):
+            return f"{binding.hotkey}::{binding.body[0]}"
+        return None
+
+    def pass_through_line(self, binding: IRBinding) -> str | None:
+        # "~" lets the key through instead of the unconditional variant.
+        if binding.pass_through:
+            return f"~{binding.hotkey}::return"
+        return None
+
+    def one_line(self, binding: IRBinding) -> str | None:
+        return self.pass_through_line(binding) or self.remap_line(binding) or self.hotstring_line(binding)
+
+    @abstractmethod
+    def machine_lines(self, machine: SequenceMachine, indent: str) -> list[str]:
+        ...
+
+    def _machine_action_lines(self, machine: SequenceMachine, indent: str) -> list[str]:
+        # Bodies run as assume-global functions, which behave like the hotkey
+        # subroutines they would otherwise be.
+        lines = []
+        for state, body in machine.accepting:
+            lines.append(f"{machine.name}_{state}() {{")
+            lines.append(f"{indent}global")
+            lines.extend(f"{indent}{line}" for line in body)
+            lines.append("}")
+            if not self.compact:
+                lines.append("")
+        return lines
+
+    def _cached_lines(self, profile: IRProfile, fragment_cache: FragmentCache | None) -> list[str]:
+        if fragment_cache is None:
+            return self.profile_lines(profile)
+        cache_key = (self.cache_name, profile.profile_id)
+        cached = fragment_cache.lines.get(cache_key)
+        if cached is not None and cached[0] is profile:
+            return cached[1]
+        lines = self.profile_lines(profile)
+        fragment_cache.lines[cache_key] = (profile, lines)
+        return lines
+
+    def render(self, ir: ScriptIR, fragment_cache: FragmentCache | None = None) -> str:
+        lines = list(ir.header_lines)
+        for profile in ir.profiles:
+            lines.extend(self._cached_lines(profile, fragment_cache))
+        lines.extend(self._probe_lines(ir))
+        return "\n".join(lines).rstrip()
+
+    def render_shards(
+        self,
+        ir: ScriptIR,
+        *,
+        shard_dir_name: str,
+        fragment_cache: FragmentCache | None = None,
+    ) -> tuple[str, dict[str, str]]:
+        lines = list(ir.header_lines)
+        shards: dict[str, str] = {}
+        used: set[str] = set()
+        for profile in ir.profiles:
+            profile_lines = self._cached_lines(profile, fragment_cache)
+            if not profile_lines:
+                continue
+            filename = shard_filename(profile.profile_id, used)
+            shards[filename] = "\n".join(profile_lines).rstrip() + "\n"
+            lines.append(self.include_line(shard_dir_name, filename))
+        lines.extend(self._probe_lines(ir))
+        return "\n".join(lines).rstrip() + "\n", shards
+
+
+class AhkV1Emitter(AhkEmitter):
+    name = "ahk-v1"
+
+    def profile_lines(self, profile: IRProfile) -> list[str]:
+        if self.compact:
+            return self._compact_profile_lines(profile)
+        lines = [f"; {profile.label}"]
+        if profile.condition:
+            lines.append(f"#if {profile.condition}")
+        for binding in profile.bindings:
+            single = self.one_line(binding)
+            if single is not None:
+                lines.append(single)
+                lines.append("")
+                continue
+            lines.append(f"{binding.hotkey}::")
+            lines.extend(f"    {line}" for line in self.body_lines(binding))
+            lines.append("return")
+            lines.append("")
+        if profile.machine is not None:
+            lines.extend(self.machine_lines(profile.machine, "    "))
+        if profile.condition:
+            lines.append("#if")
+        lines.append("")
+        return lines
+
+    def machine_lines(self, machine: SequenceMachine, indent: str) -> list[str]:
+        # One table lookup per keystroke: "state|hotkey" -> next state. A key
+        # that doesn't continue the sequence may start a new one; anything
+        # else, or the timeout, resets it.
+        name = machine.name
+        transitions = ", ".join(
+            f"{self.quote(f'{state}|{hotkey}')}: {target}" for state, hotkey, target in machine.transitions
+        )
+        actions = ", ".join(f"{state}: {self.quote(f'{name}_{state}')}" for state, _body in machine.accepting)
+        lines = [
+            f'{name}(key := "", reset := false) {{',
+            f"{indent}static state := 0",
+            f"{indent}static next := {{{transitions}}}",
+            f"{indent}static actions := {{{actions}}}",
+            f'{indent}static timer := Func("{name}").Bind("", true)',
+            f"{indent}if (reset) {{",
+            f"{indent * 2}state := 0",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f'{indent}if (key = "")',
+            f"{indent * 2}return state",
+            f"{indent}SetTimer, % timer, Off",
+            f'{indent}target := next[state "|" key]',
+            f'{indent}if (target = "" && state)',
+            f'{indent * 2}target := next["0|" key]',
+            f'{indent}if (target = "") {{',
+            f"{indent * 2}state := 0",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f"{indent}if (actions.HasKey(target)) {{",
+            f"{indent * 2}state := 0",
+            f"{indent * 2}action := actions[target]",
+            f"{indent * 2}%action%()",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f"{indent}state := target",
+            f"{indent}SetTimer, % timer, -{machine.timeout_ms}",
+            "}",
+        ]
+        if not self.compact:
+            lines.append("")
+        return lines + self._machine_action_lines(machine, indent)
+
+    def probe_function_lines(self, log_path: str, indent: str) -> list[str]:
+        # Called with a hotkey it logs one run; without, it writes the
+        # buffer out. The timer and OnExit call it the second way.
+        return [
+            f'{PROBE_FUNCTION}(hotkey := "", profile := "", start := 0) {{',
+            f'{indent}static buffer := "", frequency := 0, exit := OnExit("{PROBE_FUNCTION}Flush")',
+            f'{indent}if (hotkey != "") {{',
+            f'{indent * 2}DllCall("QueryPerformanceCounter", "Int64*", end)',
+            f'{indent * 2}buffer .= hotkey "`t" profile "`t" start "`t" end "`n"',
+            f"{indent * 2}SetTimer, {PROBE_FUNCTION}Flush, -{PROBE_FLUSH_MS}",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f'{indent}if (buffer = "")',
+            f"{indent * 2}return",
+            f"{indent}if (!frequency) {{",
+            f'{indent * 2}DllCall("QueryPerformanceFrequency", "Int64*", frequency)',
+            f'{indent * 2}buffer := "{PROBE_FREQUENCY_MARK}`t" frequency "`n" buffer',
+            f"{indent}}}",
+            f"{indent}FileAppend, % buffer, % {self.probe_log_expression(log_path)}, UTF-8",
+            f'{indent}buffer := ""',
+            "}",
+            *([] if self.compact else [""]),
+            f'{PROBE_FUNCTION}Flush(reason := "", code := "") {{',
+            f"{indent}{PROBE_FUNCTION}()",
+            "}",
+        ]
+
+    def _compact_profile_lines(self, profile: IRProfile) -> list[str]:
+        if not profile.bindings and profile.machine is None:
+            return []
+        lines = [f"#if {profile.condition}"] if profile.condition else []
+        for binding in profile.bindings:
+            single = self.one_line(binding)
+            if single is not None:
+                lines.append(single)
+                continue
+            body_lines = self.body_lines(binding)
+            body = inline_body(body_lines)
+            if body is not None:
+                lines.append(f"{binding.hotkey}::{body}")
+                continue
+            lines.append(f"{binding.hotkey}::")
+            lines.extend(f"\t{line}" for line in body_lines)
+            lines.append("return")
+        if profile.machine is not None:
+            lines.extend(self.machine_lines(profile.machine, "\t"))
+        if profile.condition:
+            lines.append("#if")
+        return lines
+
+
+class AhkV2Emitter(AhkEmitter):
+    # Only the script structure is translated; action bodies are emitted
+    # as written, so they have to be valid v2 code already.
+    name = "ahk-v2"
+    suffix = ".v2.ahk"
+
+    def include_line(self, shard_dir_name: str, filename: str) -> str:
+        return f"#Include %A_ScriptDir%\\{shard_dir_name}\\{filename}"
+
+    def send_input_line(self, keys: str) -> str:
+        return f'SendInput "{keys}"'
+
+    def quote(self, text: str) -> str:
+        return '"' + text.replace("`", "``").replace('"', '`"') + '"'
+
+    def probe_start_line(self, variable: str) -> str:
+        return f'DllCall("QueryPerformanceCounter", "Int64*", &{variable} := 0)'
+
+    def probe_function_lines(self, log_path: str, indent: str) -> list[str]:
+        return [
+            f'{PROBE_FUNCTION}(hotkey := "", profile := "", start := 0) {{',
+            f'{indent}static buffer := "", frequency := 0, exit := OnExit({PROBE_FUNCTION}Flush)',
+            f'{indent}if (hotkey != "") {{',
+            f'{indent * 2}DllCall("QueryPerformanceCounter", "Int64*", &end := 0)',
+            f'{indent * 2}buffer .= hotkey "`t" profile "`t" start "`t" end "`n"',
+            f"{indent * 2}SetTimer({PROBE_FUNCTION}Flush, -{PROBE_FLUSH_MS})",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f'{indent}if (buffer = "")',
+            f"{indent * 2}return",
+            f"{indent}if !frequency {{",
+            f'{indent * 2}DllCall("QueryPerformanceFrequency", "Int64*", &frequency)',
+            f'{indent * 2}buffer := "{PROBE_FREQUENCY_MARK}`t" frequency "`n" buffer',
+            f"{indent}}}",
+            f'{indent}FileAppend(buffer, {self.probe_log_expression(log_path)}, "UTF-8")',
+            f'{indent}buffer := ""',
+            "}",
+            *([] if self.compact else [""]),
+            f"{PROBE_FUNCTION}Flush(*) {{",
+            f"{indent}{PROBE_FUNCTION}()",
+            "}",
+        ]
+
+    def machine_lines(self, machine: SequenceMachine, indent: str) -> list[str]:
+        name = machine.name
+        transitions = ", ".join(
+            f"{self.quote(f'{state}|{hotkey}')}, {target}" for state, hotkey, target in machine.transitions
+        )
+        actions = ", ".join(f"{state}, {name}_{state}" for state, _body in machine.accepting)
+        lines = [
+            f'{name}(key := "", reset := false) {{',
+            f"{indent}static state := 0",
+            f"{indent}static next := Map({transitions})",
+            f"{indent}static actions := Map({actions})",
+            f'{indent}static timer := {name}.Bind("", true)',
+            f"{indent}if reset {{",
+            f"{indent * 2}state := 0",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f'{indent}if (key = "")',
+            f"{indent * 2}return state",
+            f"{indent}SetTimer(timer, 0)",
+            f'{indent}target := next.Get(state "|" key, 0)',
+            f"{indent}if (!target && state)",
+            f'{indent * 2}target := next.Get("0|" key, 0)',
+            f"{indent}if !target {{",
+            f"{indent * 2}state := 0",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f"{indent}if actions.Has(target) {{",
+            f"{indent * 2}state := 0",
+            f"{indent * 2}actions[target]()",
+            f"{indent * 2}return",
+            f"{indent}}}",
+            f"{indent}state := target",
+            f"{indent}SetTimer(timer, -{machine.timeout_ms})",
+            "}",
+        ]
+        if not self.compact:
+            lines.append("")
+        return lines + self._machine_action_lines(machine, indent)
+
+    def profile_lines(self, profile: IRProfile) -> list[str]:
+        if self.compact and not profile.bindings and profile.machine is None:
+            return []
+        indent = "\t" if self.compact else "    "
+        lines = [] if self.compact else [f"; {profile.label}"]
+        if profile.condition:
+            lines.append(f"#HotIf {profile.condition}")
+        for binding in profile.bindings:
+            single = self.one_line(binding)
+            if single is not None:
+                lines.append(single)
+                if not self.compact:
+                    lines.append("")
+                continue
+            body_lines = self.body_lines(binding)
+            body = inline_body(body_lines) if self.compact else None
+            if body is not None:
+                lines.append(f"{binding.hotkey}::{body}")
+                continue
+            lines.append(f"{binding.hotkey}::")
+            lines.append("{")
+            lines.extend(f"{indent}{line}" for line in body_lines)
+            lines.append("}")
+            if not self.compact:
+                lines.append("")
+        if profile.machine is not None:
+            lines.extend(self.machine_lines(profile.machine, indent))
+        if profile.condition:
+            lines.append("#HotIf")
+        if not self.compact:
+            lines.append("")
+        return lines
+
+
+def _machine_payload(machine: SequenceMachine) -> dict[str, object]:
+    return {
+        "name": machine.name,
+        "timeout_ms": machine.timeout_ms,
+        "transitions": [list(transition) for transition in machine.transitions],
+        "accepting": {str(state): list(body) for state, body in machine.accepting},
+    }
+
+
+class JsonEmitter:
+    name = "json"
+    suffix = ".json"
+    shardable = False
+
+    def __init__(self, *, compact: bool = False) -> None:
+        self.compact = compact
+
+    def render(self, ir: ScriptIR, fragment_cache: FragmentCache | None = None) -> str:
+        payload = {
+            "header": list(ir.header_lines),
+            "profiles": [
+                {
+                    "id": profile.profile_id,
+                    "label": profile.label,
+                    "condition": profile.condition,
+                    "bindings": [
+                        {
+                            "key": binding.key_id,
+                            "modifier": binding.modifier,
+                            "hotkey": binding.hotkey,
+                            "body": list(binding.body),
+                            **({"optimized": binding.optimized, "keys": binding.keys} if binding.optimized else {}),
+                            **({"dispatch": binding.dispatch} if binding.dispatch else {}),
+                            **({"probe": binding.probe} if binding.probe else {}),
+                            **({"pass_through": True} if binding.pass_through else {}),
+                        }
+                        for binding in profile.bindings
+                    ],
+                    **({"machine": _machine_payload(profile.machine)} if profile.machine is not None else {}),
+                }
+                for profile in ir.profiles
+            ],
+            **({"probe_log": ir.probe_log} if ir.probe_log else {}),
+        }
+        if self.compact:
+            return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        return json.dumps(payload, indent=2, ensure_ascii=False)
+
+
+DEFAULT_FORMAT = AhkV1Emitter.name
+EMITTERS: dict[str, AhkEmitter | JsonEmitter] = {
+    emitter.name: emitter for emitter in (AhkV1Emitter(), AhkV2Emitter(), JsonEmitter())
+}
+COMPACT_EMITTERS: dict[str, AhkEmitter | JsonEmitter] = {
+    emitter.name: emitter
+    for emitter in (AhkV1Emitter(compact=True), AhkV2Emitter(compact=True), JsonEmitter(compact=True))
+}
+
+
+def get_emitter(output_format: str, *, compact: bool = False) -> AhkEmitter | JsonEmitter:
+    return (COMPACT_EMITTERS if compact else EMITTERS)[output_format]
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+
+FileStamp = tuple[int, int]
+
+
+def file_stamp(path: Path) -> FileStamp | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileWatcher:
+    # Polls mtime and size; cheap enough to run from a Tk after() loop.
+    def __init__(self, paths: Iterable[Path]) -> None:
+        self._stamps: dict[Path, FileStamp | None] = {path: file_stamp(path) for path in paths}
+
+    def mark_current(self, path: Path) -> None:
+        if path in self._stamps:
+            self._stamps[path] = file_stamp(path)
+
+    def changed(self) -> list[Path]:
+        changed = []
+        for path, previous in self._stamps.items():
+            current = file_stamp(path)
+            if current != previous:
+                self._stamps[path] = current
+                changed.append(path)
+        return changed
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .settings_io import ActionsByProfile
+
+
+# Object layout follows git: "<type> <size>\0<payload>", SHA-1 addressed and
+# zlib-compressed under objects/ab/cdef... Action bodies are blobs, each
+# profile is a tree of key -> modifier -> blob id, and a commit points at a
+# root tree mapping profile ids to their trees. Unchanged bodies and profiles
+# hash to existing objects, so a commit only stores what changed.
+
+
+@dataclass(frozen=True, slots=True)
+class CommitInfo:
+    commit_id: str
+    parent: str | None
+    tree: str
+    timestamp: float
+    message: str
+    version: int
+
+
+@dataclass(frozen=True, slots=True)
+class BindingChange:
+    profile_id: str
+    key_id: str
+    modifier: str
+    before: dict[str, Any] | None
+    after: dict[str, Any] | None
+
+
+def _encode_object(kind: str, payload: bytes) -> tuple[str, bytes]:
+    data = f"{kind} {len(payload)}\0".encode("ascii") + payload
+    return hashlib.sha1(data).hexdigest(), data
+
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class HistoryStore:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.head_path = root / "HEAD"
+        self._known: set[str] = set()
+        self._blob_ids: dict[str, str] = {}
+        self._tree_cache: dict[str, Any] = {}
+
+    def _object_path(self, object_id: str) -> Path:
+        return self.objects_dir / object_id[:2] / object_id[2:]
+
+    def _write_object(self, kind: str, payload: bytes) -> str:
+        object_id, data = _encode_object(kind, payload)
+        if object_id in self._known:
+            return object_id
+        path = self._object_path(object_id)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.tmp")
+            with open(temp_path, "wb") as handle:
+                handle.write(zlib.compress(data))
+            os.replace(temp_path, path)
+        self._known.add(object_id)
+        return object_id
+
+    def _read_object(self, object_id: str) -> tuple[str, bytes]:
+        with open(self._object_path(object_id), "rb") as handle:
+            data = zlib.decompress(handle.read())
+        header, _, payload = data.partition(b"\0")
+        kind, _, _size = header.decode("ascii").partition(" ")
+        return kind, payload
+
+    def _read_json(self, object_id: str) -> Any:
+        cached = self._tree_cache.get(object_id)
+        if cached is None:
+            cached = json.loads(self._read_object(object_id)[1])
+            self._tree_cache[object_id] = cached
+        return cached
+
+    def _write_blob(self, body: str) -> str:
+        blob_id = self._blob_ids.get(body)
+        if blob_id is None:
+            blob_id = self._write_object("blob", body.encode("utf-8"))
+            self._blob_ids[body] = blob_id
+        return blob_id
+
+    def _read_blob(self, blob_id: str) -> str:
+        return self._read_object(blob_id)[1].decode("utf-8")
+
+    def head(self) -> str | None:
+        try:
+            return self.head_path.read_text(encoding="ascii").strip() or None
+        except OSError:
+            return None
+
+    def commit(self, actions_by_profile: Mapping[str, Any], *, message: str = "", version: int = 0) -> str | None:
+        profile_trees: dict[str, str] = {}
+        for profile_id in sorted(actions_by_profile):
+            actions = actions_by_profile[profile_id]
+            tree: dict[str, dict[str, Any]] = {}
+            for key_id in sorted(actions):
+                modifiers: dict[str, Any] = {}
+                for modifier, data in actions[key_id].items():
+                    node = {key: value for key, value in data.items() if key != "action"}
+                    node["blob"] = self._write_blob(data.get("action", ""))
+                    modifiers[modifier] = node
+                tree[key_id] = modifiers
+            profile_trees[profile_id] = self._write_object("tree", _canonical(tree))
+        root_tree = self._write_object("tree", _canonical(profile_trees))
+
+        parent = self.head()
+        if parent is not None and self.read_commit(parent).tree == root_tree:
+            return None
+        commit_payload = {
+            "parent": parent,
+            "tree": root_tree,
+            "timestamp": time.time(),
+            "message": message,
+            "version": version,
+        }
+        commit_id = self._write_object("commit", _canonical(commit_payload))
+        temp_path = self.head_path.with_name("HEAD.tmp")
+        temp_path.write_text(commit_id + "\n", encoding="ascii")
+        os.replace(temp_path, self.head_path)
+        return commit_id
+
+    def read_commit(self, commit_id: str) -> CommitInfo:
+        data = self._read_json(commit_id)
+        return CommitInfo(
+            commit_id=commit_id,
+            parent=data.get("parent"),
+            tree=data["tree"],
+            timestamp=float(data.get("timestamp", 0)),
+            message=str(data.get("message", "")),
+            version=int(data.get("version", 0)),
+        )
+
+    def log(self, start: str | None = None) -> Iterator[CommitInfo]:
+        commit_id = start or self.head()
+        while commit_id:
+            info = self.read_commit(commit_id)
+            yield info
+            commit_id = info.parent
+
+    def resolve(self, ref: str) -> str:
+        ref = ref.strip()
+        if ref.upper() == "HEAD" or ref.upper().startswith("HEAD~"):
+            suffix = ref[5:]
+            if suffix and not suffix.isdecimal():
+                raise KeyError(ref)
+            steps = int(suffix or 0)
+            for index, info in enumerate(self.log()):
+                if index == steps:
+                    return info.commit_id
+            raise KeyError(ref)
+        # Only hex prefixes are looked up, so a ref can't glob or leave the store.
+        ref = ref.lower()
+        matches = [
+            f"{ref[:2]}{path.name}"
+            for path in (self.objects_dir / ref[:2]).glob(f"{ref[2:]}*")
+            if not path.name.endswith(".tmp")
+        ] if len(ref) >= 4 and all(char in "0123456789abcdef" for char in ref) else []
+        if len(matches) != 1:
+            raise KeyError(ref)
+        return matches[0]
+
+    def read_actions(self, commit_id: str) -> ActionsByProfile:
+        profile_trees = self._read_json(self.read_commit(commit_id).tree)
+        return {profile_id: self._read_profile(tree_id) for profile_id, tree_id in profile_trees.items()}
+
+    def _read_profile(self, tree_id: str) -> dict[str, dict[str, dict[str, Any]]]:
+        tree = self._read_json(tree_id)
+        return {
+            key_id: {modifier: self._node_entry(node) for modifier, node in modifiers.items()}
+            for key_id, modifiers in tree.items()
+        }
+
+    def _node_entry(self, node: Mapping[str, Any]) -> dict[str, Any]:
+        entry = {key: value for key, value in node.items() if key != "blob"}
+        entry["action"] = self._read_blob(node["blob"])
+        return entry
+
+    def diff(self, old_commit: str, new_commit: str) -> list[BindingChange]:
+        old_profiles = self._read_json(self.read_commit(old_commit).tree)
+        new_profiles = self._read_json(self.read_commit(new_commit).tree)
+        changes: list[BindingChange] = []
+        for profile_id in sorted(old_profiles.keys() | new_profiles.keys()):
+            old_tree_id = old_profiles.get(profile_id)
+            new_tree_id = new_profiles.get(profile_id)
+            # Identical tree ids mean identical profiles; skip without reading.
+            if old_tree_id == new_tree_id:
+                continue
+            old_tree = self._read_json(old_tree_id) if old_tree_id else {}
+            new_tree = self._read_json(new_tree_id) if new_tree_id else {}
+            for key_id in sorted(old_tree.keys() | new_tree.keys()):
+                old_modifiers = old_tree.get(key_id, {})
+                new_modifiers = new_tree.get(key_id, {})
+                for modifier in sorted(old_modifiers.keys() | new_modifiers.keys()):
+                    before = old_modifiers.get(modifier)
+                    after = new_modifiers.get(modifier)
+                    if before == after:
+                        continue
+                    changes.append(
+                        BindingChange(
+                            profile_id,
+                            key_id,
+                            modifier,
+                            self._node_entry(before) if before else None,
+                            self._node_entry(after) if after else None,
+                        )
+                    )
+        return changes
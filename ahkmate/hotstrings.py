@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from .settings_io import sanitize_modifier_entry
+
+
+# Hotstrings live in the same actions model as keys: the key id is the
+# AutoHotkey trigger, ":options:abbreviation", and the binding sits under
+# the "None" modifier. A one-line action is the replacement text, as it
+# would be after "::btw::"; the X option or a multi-line action makes it
+# code instead.
+HOTSTRING_PATTERN = re.compile(r"^:(?P<options>[^:\s]*):(?P<abbrev>.+)$")
+HOTSTRING_MODIFIER = "None"
+CASE_SENSITIVE_PATTERN = re.compile(r"C(?!1)", re.IGNORECASE)
+EXECUTE_PATTERN = re.compile(r"X", re.IGNORECASE)
+IMMEDIATE_PATTERN = re.compile(r"\*(?!0)")
+
+ISSUE_DUPLICATE = "duplicate"
+ISSUE_SHADOWED = "shadowed"
+ISSUE_PREFIX = "prefix"
+
+
+def parse_hotstring_id(key_id: str) -> tuple[str, str] | None:
+    match = HOTSTRING_PATTERN.match(key_id)
+    if match is None:
+        return None
+    return match.group("options"), match.group("abbrev")
+
+
+def is_hotstring(key_id: str) -> bool:
+    return HOTSTRING_PATTERN.match(key_id) is not None
+
+
+def hotstring_id(options: str, abbrev: str) -> str:
+    return f":{options}:{abbrev}"
+
+
+def is_replacement_text(key_id: str, body: str) -> bool:
+    parsed = parse_hotstring_id(key_id)
+    if parsed is None or "\n" in body.strip():
+        return False
+    return EXECUTE_PATTERN.search(parsed[0]) is None
+
+
+@dataclass(frozen=True, slots=True)
+class HotstringEntry:
+    profile_id: str
+    key_id: str
+    options: str
+    abbrev: str
+
+    @property
+    def trie_key(self) -> str:
+        # Every entry is filed under its folded abbreviation so a search
+        # finds it whatever case is typed; case_sensitive says whether it
+        # really matches only as written.
+        return self.abbrev.casefold()
+
+    @property
+    def case_sensitive(self) -> bool:
+        # AutoHotkey matches abbreviations case-insensitively unless the C
+        # option is given.
+        return CASE_SENSITIVE_PATTERN.search(self.options) is not None
+
+    def can_collide(self, other: HotstringEntry) -> bool:
+        # other's abbreviation is this one or a prefix of it, ignoring case.
+        # Two case-sensitive entries only collide if the cases agree too.
+        return not (self.case_sensitive and other.case_sensitive) or self.abbrev.startswith(other.abbrev)
+
+    @property
+    def immediate(self) -> bool:
+        return IMMEDIATE_PATTERN.search(self.options) is not None
+
+
+@dataclass(frozen=True, slots=True)
+class HotstringIssue:
+    kind: str
+    condition: str
+    entry: HotstringEntry
+    other: HotstringEntry
+
+    def format(self) -> str:
+        if self.kind == ISSUE_DUPLICATE:
+            return f"{self.entry.key_id} is also defined in {self.other.profile_id}"
+        if self.kind == ISSUE_SHADOWED:
+            return f"{self.entry.key_id} never fires: {self.other.key_id} triggers first without an ending character"
+        return f"{self.entry.key_id} starts with {self.other.key_id}"
+
+
+@dataclass(slots=True)
+class _Node:
+    children: dict[str, _Node] = field(default_factory=dict)
+    entries: list[HotstringEntry] = field(default_factory=list)
+    # entries stored in this node and below, so emptiness checks and pruning
+    # don't walk the subtree
+    count: int = 0
+
+
+class HotstringTrie:
+    def __init__(self) -> None:
+        self._root = _Node()
+
+    def __len__(self) -> int:
+        return self._root.count
+
+    def add(self, entry: HotstringEntry) -> None:
+        node = self._root
+        node.count += 1
+        for char in entry.trie_key:
+            node = node.children.setdefault(char, _Node())
+            node.count += 1
+        node.entries.append(entry)
+
+    def remove(self, entry: HotstringEntry) -> bool:
+        path = [self._root]
+        for char in entry.trie_key:
+            child = path[-1].children.get(char)
+            if child is None:
+                return False
+            path.append(child)
+        if entry not in path[-1].entries:
+            return False
+        path[-1].entries.remove(entry)
+        for node in path:
+            node.count -= 1
+        for char, (parent, node) in zip(reversed(entry.trie_key), zip(reversed(path[:-1]), reversed(path[1:]))):
+            if node.count:
+                break
+            del parent.children[char]
+        return True
+
+    def issues_for(self, entry: HotstringEntry, condition: str = "") -> list[HotstringIssue]:
+        # One walk down the abbreviation: entries passed on the way are its
+        # prefixes, and entries in the final node are duplicates of it.
+        issues = []
+        node = self._root
+        for char in entry.trie_key:
+            for other in node.entries:
+                if entry.can_collide(other):
+                    kind = ISSUE_SHADOWED if other.immediate else ISSUE_PREFIX
+                    issues.append(HotstringIssue(kind, condition, entry, other))
+            node = node.children.get(char)
+            if node is None:
+                return issues
+        for other in node.entries:
+            if other != entry and entry.can_collide(other):
+                issues.append(HotstringIssue(ISSUE_DUPLICATE, condition, entry, other))
+        return issues
+
+    def longer_count(self, entry: HotstringEntry) -> int:
+        node = self._root
+        for char in entry.trie_key:
+            node = node.children.get(char)
+            if node is None:
+                return 0
+        return node.count - len(node.entries)
+
+    def search(self, prefix: str, limit: int = 100, profile_id: str | None = None) -> list[HotstringEntry]:
+        node = self._root
+        for char in prefix.casefold():
+            node = node.children.get(char)
+            if node is None:
+                return []
+        found: list[HotstringEntry] = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            entries = [entry for entry in node.entries if profile_id is None or entry.profile_id == profile_id]
+            found.extend(entries[: limit - len(found)])
+            stack.extend(child for _char, child in sorted(node.children.items(), reverse=True))
+        return found
+
+    def entries(self) -> Iterable[HotstringEntry]:
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            yield from node.entries
+            stack.extend(node.children.values())
+
+
+class HotstringIndex:
+    # One trie per #if condition, since hotstrings only compete with those
+    # active under the same condition. Edits update it in O(length).
+    def __init__(self, conditions: Mapping[str, str]) -> None:
+        self._conditions = dict(conditions)
+        self._tries: dict[str, HotstringTrie] = {}
+
+    @classmethod
+    def build(
+        cls, actions_by_profile: Mapping[str, Any], keyboard_profiles: Iterable[Mapping[str, Any]]
+    ) -> HotstringIndex:
+        index = cls(
+            {
+                str(profile.get("id", "")).strip(): str(profile.get("condition", "")).strip()
+                for profile in keyboard_profiles
+            }
+        )
+        for profile_id, actions in actions_by_profile.items():
+            if not isinstance(actions, dict):
+                continue
+            for key_id, entry in actions.items():
+                if isinstance(entry, dict):
+                    index.update(profile_id, key_id, entry.get(HOTSTRING_MODIFIER), add=True)
+        return index
+
+    def condition(self, profile_id: str) -> str:
+        return self._conditions.get(profile_id, "")
+
+    def trie(self, profile_id: str) -> HotstringTrie:
+        condition = self.condition(profile_id)
+        trie = self._tries.get(condition)
+        if trie is None:
+            trie = self._tries[condition] = HotstringTrie()
+        return trie
+
+    def entry(self, profile_id: str, key_id: str, data: Any) -> HotstringEntry | None:
+        parsed = parse_hotstring_id(key_id)
+        if parsed is None or profile_id not in self._conditions:
+            return None
+        clean = sanitize_modifier_entry(data)
+        if clean is None or not clean["enabled"] or not (clean["action"] or "template" in clean):
+            return None
+        return HotstringEntry(profile_id, key_id, parsed[0], parsed[1])
+
+    def update(self, profile_id: str, key_id: str, data: Any, *, add: bool) -> HotstringEntry | None:
+        entry = self.entry(profile_id, key_id, data)
+        if entry is not None:
+            if add:
+                self.trie(profile_id).add(entry)
+            else:
+                self.trie(profile_id).remove(entry)
+        return entry
+
+    def apply_changes(self, changes: Mapping[tuple[str, str, str], tuple[Any, Any]]) -> None:
+        for (profile_id, key_id, modifier), (before, after) in changes.items():
+            if modifier != HOTSTRING_MODIFIER or not is_hotstring(key_id):
+                continue
+            self.update(profile_id, key_id, before, add=False)
+            self.update(profile_id, key_id, after, add=True)
+
+    def issues_for(self, profile_id: str, key_id: str) -> list[HotstringIssue]:
+        parsed = parse_hotstring_id(key_id)
+        if parsed is None:
+            return []
+        entry = HotstringEntry(profile_id, key_id, parsed[0], parsed[1])
+        return self.trie(profile_id).issues_for(entry, self.condition(profile_id))
+
+    def longer_count(self, profile_id: str, key_id: str) -> int:
+        parsed = parse_hotstring_id(key_id)
+        if parsed is None:
+            return 0
+        return self.trie(profile_id).longer_count(HotstringEntry(profile_id, key_id, parsed[0], parsed[1]))
+
+    def issues(self) -> list[HotstringIssue]:
+        found = []
+        for condition, trie in self._tries.items():
+            for entry in trie.entries():
+                found.extend(trie.issues_for(entry, condition))
+        # Each duplicate pair is seen from both sides; report it once.
+        return [
+            issue
+            for issue in found
+            if issue.kind != ISSUE_DUPLICATE or (issue.other.profile_id, issue.other.key_id) > (
+                issue.entry.profile_id,
+                issue.entry.key_id,
+            )
+        ]
+
+    def search(self, profile_id: str, prefix: str, limit: int = 100) -> list[HotstringEntry]:
+        # The trie is shared with other profiles under the same condition;
+        # only this profile's entries count towards the limit.
+        return self.trie(profile_id).search(prefix, limit, profile_id)
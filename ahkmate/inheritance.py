@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from .settings_io import ActionEntry, ActionsByKey, ActionsByProfile
+
+
+# A profile in keyboards.json may name a "parent"; it then has every binding
+# of its ancestors, key by key and modifier by modifier, unless it defines
+# that binding itself. A disabled binding in the child still overrides, so
+# it is how a child turns an inherited binding off. An unconditional
+# ancestor's hotkey fires under every condition, so the child's block gets
+# a pass-through variant ("~hotkey::return") marked with this field.
+# A same-condition ancestor's block is active exactly when the child's is,
+# so its bindings can't be turned off from the child.
+PARENT_FIELD = "parent"
+PASS_THROUGH_FIELD = "pass_through"
+
+
+def is_active(data: Any) -> bool:
+    return (
+        isinstance(data, dict)
+        and bool(data.get("enabled", True))
+        and bool(str(data.get("action", "")).strip() or data.get("template"))
+    )
+
+
+def profile_parents(keyboard_profiles: Iterable[Mapping[str, Any]]) -> dict[str, str]:
+    # Profile id -> parent id. Unknown parents are dropped, and so is the
+    # link that closes a cycle.
+    profiles = list(keyboard_profiles)
+    known = {str(profile.get("id", "")).strip() for profile in profiles}
+    parents: dict[str, str] = {}
+    for profile in profiles:
+        profile_id = str(profile.get("id", "")).strip()
+        parent = str(profile.get(PARENT_FIELD, "") or "").strip()
+        if not profile_id or parent not in known or parent == profile_id:
+            continue
+        ancestor = parent
+        while ancestor in parents and ancestor != profile_id:
+            ancestor = parents[ancestor]
+        if ancestor != profile_id:
+            parents[profile_id] = parent
+    return parents
+
+
+class ResolvedProfiles:
+    # Each profile's bindings merged with its ancestors'. A profile's view is
+    # built from its parent's view the first time it is asked for; after an
+    # edit only the touched keys are recomputed, in the edited profile and
+    # the descendants that inherit them.
+    def __init__(self, actions_by_profile: ActionsByProfile, keyboard_profiles: Iterable[Mapping[str, Any]]) -> None:
+        profiles = list(keyboard_profiles)
+        self._actions = actions_by_profile
+        self._parents = profile_parents(profiles)
+        self._profile_ids = [str(profile.get("id", "")).strip() for profile in profiles]
+        self._conditions = {
+            str(profile.get("id", "")).strip(): str(profile.get("condition", "")).strip() for profile in profiles
+        }
+        self._children: dict[str, list[str]] = {}
+        for child, parent in self._parents.items():
+            self._children.setdefault(parent, []).append(child)
+        # profile id -> key id -> modifier -> binding data
+        self._views: dict[str, ActionsByKey] = {}
+        # profile id -> key id -> modifier -> id of the profile that defines it
+        self._sources: dict[str, dict[str, dict[str, str]]] = {}
+        self._dirty: dict[str, set[str]] = {}
+        self._effective: dict[str, ActionsByKey] = {}
+
+    def parent(self, profile_id: str) -> str:
+        return self._parents.get(profile_id, "")
+
+    def chain(self, profile_id: str) -> list[str]:
+        # The profile followed by its ancestors, nearest first.
+        chain = [profile_id]
+        while chain[-1] in self._parents:
+            chain.append(self._parents[chain[-1]])
+        return chain
+
+    def descendants(self, profile_id: str) -> list[str]:
+        found = []
+        stack = list(self._children.get(profile_id, ()))
+        while stack:
+            child = stack.pop()
+            found.append(child)
+            stack.extend(self._children.get(child, ()))
+        return found
+
+    def view(self, profile_id: str) -> ActionsByKey:
+        view = self._views.get(profile_id)
+        if view is None:
+            view = self._build(profile_id)
+        dirty = self._dirty.pop(profile_id, None)
+        if dirty:
+            for key_id in dirty:
+                self._resolve_key(profile_id, key_id)
+        return view
+
+    def entry(self, profile_id: str, key_id: str) -> ActionEntry:
+        return self.view(profile_id).get(key_id, {})
+
+    def source(self, profile_id: str, key_id: str, modifier: str) -> str:
+        # The profile the binding comes from, or "" if there is none.
+        self.view(profile_id)
+        return self._sources[profile_id].get(key_id, {}).get(modifier, "")
+
+    def inherited(self, profile_id: str, key_id: str, modifier: str) -> bool:
+        source = self.source(profile_id, key_id, modifier)
+        return bool(source) and source != profile_id
+
+    def invalidate(self, bindings: Iterable[tuple[str, str, str]]) -> set[str]:
+        # Marks the changed keys stale wherever they are inherited and
+        # returns every profile whose view may have changed.
+        touched: set[str] = set()
+        for profile_id, key_id, _modifier in bindings:
+            for affected in [profile_id, *self.descendants(profile_id)]:
+                touched.add(affected)
+                self._effective.pop(affected, None)
+                if affected in self._views:
+                    self._dirty.setdefault(affected, set()).add(key_id)
+        return touched
+
+    def effective(self, profile_id: str) -> ActionsByKey:
+        # What the profile's own block has to define: its view minus what it
+        # inherits from a profile whose block already covers it, i.e. one
+        # with the same condition or with none at all.
+        if profile_id not in self._parents:
+            actions = self._actions.get(profile_id)
+            return actions if isinstance(actions, dict) else {}
+        effective = self._effective.get(profile_id)
+        if effective is not None:
+            return effective
+        condition = self._conditions.get(profile_id, "")
+        covered = {"", condition}
+        sources = self._sources_for(profile_id)
+        effective = {}
+        for key_id, entry in self.view(profile_id).items():
+            kept = {}
+            for modifier, data in entry.items():
+                if condition and not is_active(data) and self._active_in(profile_id, key_id, modifier, {""}):
+                    kept[modifier] = {**data, PASS_THROUGH_FIELD: True}
+                elif (
+                    sources[key_id][modifier] == profile_id
+                    or self._conditions.get(sources[key_id][modifier], "") not in covered
+                ):
+                    kept[modifier] = data
+            if kept:
+                effective[key_id] = kept
+        self._effective[profile_id] = effective
+        return effective
+
+    def _active_in(self, profile_id: str, key_id: str, modifier: str, conditions: set[str]) -> str:
+        # The nearest ancestor with one of the conditions whose own binding
+        # is active, or "".
+        for ancestor in self.chain(profile_id)[1:]:
+            own = self._actions.get(ancestor)
+            entry = own.get(key_id) if isinstance(own, dict) else None
+            data = entry.get(modifier) if isinstance(entry, dict) else None
+            if self._conditions.get(ancestor, "") in conditions and is_active(data):
+                return ancestor
+        return ""
+
+    def unreachable_disables(self) -> list[tuple[str, str, str, str]]:
+        # (profile, key, modifier, ancestor) of disabled bindings that can't
+        # turn off what a same-condition ancestor defines.
+        found = []
+        for profile_id in self._parents:
+            own = self._actions.get(profile_id)
+            if not isinstance(own, dict):
+                continue
+            condition = self._conditions.get(profile_id, "")
+            for key_id, entry in own.items():
+                if not isinstance(entry, dict):
+                    continue
+                for modifier, data in entry.items():
+                    if not isinstance(data, dict) or is_active(data):
+                        continue
+                    ancestor = self._active_in(profile_id, key_id, modifier, {condition})
+                    if ancestor:
+                        found.append((profile_id, key_id, modifier, ancestor))
+        return found
+
+    def effective_actions(self) -> ActionsByProfile:
+        # Profiles without a keyboard profile are passed through as they are.
+        profile_ids = list(dict.fromkeys([*self._profile_ids, *self._actions]))
+        effective = {profile_id: self.effective(profile_id) for profile_id in profile_ids if profile_id}
+        return {profile_id: actions for profile_id, actions in effective.items() if actions}
+
+    def _sources_for(self, profile_id: str) -> dict[str, dict[str, str]]:
+        self.view(profile_id)
+        return self._sources[profile_id]
+
+    def _build(self, profile_id: str) -> ActionsByKey:
+        parent = self._parents.get(profile_id)
+        keys: set[str] = set()
+        if parent:
+            keys.update(self.view(parent))
+        own = self._actions.get(profile_id)
+        if isinstance(own, dict):
+            keys.update(key_id for key_id, entry in own.items() if isinstance(entry, dict))
+        view = self._views[profile_id] = {}
+        self._sources[profile_id] = {}
+        self._dirty.pop(profile_id, None)
+        for key_id in keys:
+            self._resolve_key(profile_id, key_id)
+        return view
+
+    def _resolve_key(self, profile_id: str, key_id: str) -> None:
+        entry: ActionEntry = {}
+        sources: dict[str, str] = {}
+        parent = self._parents.get(profile_id)
+        if parent:
+            inherited = self.view(parent).get(key_id)
+            if inherited:
+                entry.update(inherited)
+                sources.update(self._sources[parent][key_id])
+        own = self._actions.get(profile_id, {}).get(key_id)
+        if isinstance(own, dict):
+            for modifier, data in own.items():
+                if isinstance(data, dict):
+                    entry[modifier] = data
+                    sources[modifier] = profile_id
+        if entry:
+            self._views[profile_id][key_id] = entry
+            self._sources[profile_id][key_id] = sources
+        else:
+            self._views[profile_id].pop(key_id, None)
+            self._sources[profile_id].pop(key_id, None)
+
+
+def effective_actions(
+    keyboard_profiles: Iterable[Mapping[str, Any]], actions_by_profile: ActionsByProfile
+) -> ActionsByProfile:
+    return ResolvedProfiles(actions_by_profile, keyboard_profiles).effective_actions()
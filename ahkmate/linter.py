@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from .hotstrings import is_replacement_text
+from .settings_io import sanitize_modifier_entry
+
+
+LABEL_PATTERN = re.compile(r"^\s*(?P<label>[A-Za-z_@#$][\w@#$]*):\s*(?:;.*)?$")
+HOTKEY_PATTERN = re.compile(r"^\s*\S+::")
+DIRECTIVE_PATTERN = re.compile(r"^\s*(?P<directive>#\w+)", re.IGNORECASE)
+ENDS_FLOW_PATTERN = re.compile(r"^\s*(return|exit|exitapp|reload|goto)\b", re.IGNORECASE)
+COMMAND_SYNTAX_PATTERN = re.compile(r"^\s*\w+\s*,")
+SEND_COMMAND_PATTERN = re.compile(
+    r"^\s*(send|sendinput|sendraw|sendplay|sendevent|controlsend|controlsendraw)\b", re.IGNORECASE
+)
+BRACKET_PAIRS = {")": "(", "]": "[", "}": "{"}
+
+SEVERITY_ERROR = "error"
+SEVERITY_WARNING = "warning"
+
+
+@dataclass(frozen=True, slots=True)
+class LintDiagnostic:
+    line: int
+    severity: str
+    message: str
+
+    def format(self) -> str:
+        return f"line {self.line}: {self.severity}: {self.message}"
+
+
+def body_digest(body: str) -> str:
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def _code_characters(line: str) -> Iterator[str]:
+    # Yields the characters of a line that are outside string literals and
+    # comments, which is all the bracket check needs to look at.
+    in_string = False
+    previous = " "
+    index = 0
+    while index < len(line):
+        char = line[index]
+        if in_string:
+            if char == '"':
+                if index + 1 < len(line) and line[index + 1] == '"':
+                    index += 1
+                else:
+                    in_string = False
+        elif char == "`":
+            index += 1
+        elif char == ";" and previous.isspace():
+            return
+        elif char == '"':
+            in_string = True
+        else:
+            yield char
+        previous = char
+        index += 1
+
+
+def lint_action(body: str) -> tuple[LintDiagnostic, ...]:
+    diagnostics: list[LintDiagnostic] = []
+    open_brackets: list[tuple[str, int]] = []
+    flow_ended = False
+    in_block_comment = False
+
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        stripped = line.strip()
+        if in_block_comment:
+            in_block_comment = not stripped.startswith("*/")
+            continue
+        if stripped.startswith("/*"):
+            in_block_comment = not stripped.endswith("*/")
+            continue
+        if not stripped or stripped.startswith(";"):
+            continue
+
+        directive = DIRECTIVE_PATTERN.match(line)
+        if directive:
+            name = directive.group("directive").lower()
+            if name.startswith("#if"):
+                diagnostics.append(
+                    LintDiagnostic(line_number, SEVERITY_ERROR, f"{directive.group('directive')} inside an action body")
+                )
+            else:
+                diagnostics.append(
+                    LintDiagnostic(
+                        line_number,
+                        SEVERITY_WARNING,
+                        f"{directive.group('directive')} applies to the whole script, not this action",
+                    )
+                )
+            continue
+
+        if HOTKEY_PATTERN.match(line):
+            diagnostics.append(
+                LintDiagnostic(line_number, SEVERITY_ERROR, "hotkey definition inside an action body")
+            )
+            continue
+
+        label = LABEL_PATTERN.match(line)
+        if label and label.group("label").lower() != "default":
+            if not flow_ended and line_number > 1:
+                diagnostics.append(
+                    LintDiagnostic(
+                        line_number,
+                        SEVERITY_WARNING,
+                        f"missing return before label {label.group('label')}; execution falls through into it",
+                    )
+                )
+            flow_ended = False
+            continue
+
+        flow_ended = bool(ENDS_FLOW_PATTERN.match(line))
+        if SEND_COMMAND_PATTERN.match(line):
+            # Braces in Send arguments are key names such as {Enter} or {{}.
+            continue
+        # Command arguments are literal text, so only block braces count there.
+        tracked = "{}" if COMMAND_SYNTAX_PATTERN.match(line) else "()[]{}"
+        for char in _code_characters(line):
+            if char not in tracked:
+                continue
+            if char in "([{":
+                open_brackets.append((char, line_number))
+            elif char in BRACKET_PAIRS:
+                if open_brackets and open_brackets[-1][0] == BRACKET_PAIRS[char]:
+                    open_brackets.pop()
+                else:
+                    diagnostics.append(LintDiagnostic(line_number, SEVERITY_ERROR, f"unmatched '{char}'"))
+
+    for char, line_number in open_brackets:
+        diagnostics.append(LintDiagnostic(line_number, SEVERITY_ERROR, f"unclosed '{char}'"))
+    diagnostics.sort(key=lambda item: item.line)
+    return tuple(diagnostics)
+
+
+class LintCache:
+    def __init__(self) -> None:
+        self._results: dict[str, tuple[LintDiagnostic, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def lint(self, body: str) -> tuple[LintDiagnostic, ...]:
+        digest = body_digest(body)
+        cached = self._results.get(digest)
+        if cached is None:
+            cached = lint_action(body)
+            self._results[digest] = cached
+        return cached
+
+
+BindingDiagnostics = dict[tuple[str, str, str], tuple[LintDiagnostic, ...]]
+
+
+def lint_actions(
+    actions_by_profile: Mapping[str, Any],
+    *,
+    modifier_options: Sequence[str],
+    cache: LintCache,
+    expand_template: Callable[[str, Mapping[str, str]], str | None] | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> BindingDiagnostics:
+    results: BindingDiagnostics = {}
+    total = len(actions_by_profile)
+    for index, (profile_id, actions) in enumerate(actions_by_profile.items()):
+        if progress is not None:
+            progress(index, total)
+        if not isinstance(actions, dict):
+            continue
+        for key_id, entry in actions.items():
+            if not isinstance(entry, dict):
+                continue
+            for modifier, modifier_data in entry.items():
+                if modifier not in modifier_options:
+                    continue
+                clean_entry = sanitize_modifier_entry(modifier_data)
+                if clean_entry is None:
+                    continue
+                body = clean_entry["action"]
+                if "template" in clean_entry:
+                    expanded = None
+                    if expand_template is not None:
+                        expanded = expand_template(clean_entry["template"], clean_entry["args"])
+                    if expanded is None:
+                        results[(profile_id, key_id, modifier)] = (
+                            LintDiagnostic(
+                                1, SEVERITY_ERROR, f"unknown template '{clean_entry['template']}'"
+                            ),
+                        )
+                        continue
+                    body = expanded
+                if is_replacement_text(key_id, body):
+                    continue
+                diagnostics = cache.lint(body)
+                if diagnostics:
+                    results[(profile_id, key_id, modifier)] = diagnostics
+    return results
+
+
+def has_errors(diagnostics: BindingDiagnostics) -> bool:
+    return any(
+        item.severity == SEVERITY_ERROR for binding in diagnostics.values() for item in binding
+    )
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import math
+import re
+import zlib
+from collections.abc import Iterable
+from dataclasses import dataclass, field, replace
+
+from .hotstrings import is_hotstring
+from .script_ir import OPTIMIZED_REMAP, FragmentCache, IRBinding, IRProfile, ScriptIR
+
+
+# Probed hotkeys read QueryPerformanceCounter on entry and hand the start
+# tick to AhkmateProbe on every way out: each bare "return" becomes
+# "return AhkmateProbe(...)" and the call is added after the last line.
+# AhkmateProbe buffers one line per run,
+#     hotkey <TAB> profile id <TAB> start tick <TAB> end tick
+# and a timer appends the buffer to the log once the hotkeys go quiet,
+# after a "#qpc <TAB> ticks per second" line the first time in each run.
+PROBE_FUNCTION = "AhkmateProbe"
+PROBE_VARIABLE_PREFIX = "AhkmateProbe_"
+PROBE_FREQUENCY_MARK = "#qpc"
+# Past a label the body is code other threads jump to, e.g. a timer's
+# subroutine; its returns aren't the hotkey's, so nothing there is probed.
+LABEL_PATTERN = re.compile(r"^[^\s,;:`(){}\[\]\"']+:$")
+NON_LABEL_WORDS = frozenset({"default"})
+# Latencies are counted in buckets growing by this ratio from the minimum,
+# so percentiles are within half a bucket (2.5%) without keeping samples.
+BUCKET_RATIO = 1.05
+BUCKET_MIN_MS = 0.001
+
+
+def probe_variable(binding: IRBinding) -> str:
+    # Hotkey subroutines share variables in v1 and can interrupt each other,
+    # so each probed binding keeps its start tick in a variable of its own.
+    return f"{PROBE_VARIABLE_PREFIX}{zlib.crc32(f'{binding.probe}|{binding.hotkey}'.encode()):08x}"
+
+
+def is_label(line: str) -> bool:
+    stripped = line.strip()
+    return LABEL_PATTERN.match(stripped) is not None and stripped[:-1].lower() not in NON_LABEL_WORDS
+
+
+def _probe_profile(profile: IRProfile) -> IRProfile:
+    # One-line hotstrings are replacement text, not code, so they stay as
+    # they are; pass-through variants have no body.
+    bindings = tuple(
+        binding
+        if (is_hotstring(binding.key_id) and len(binding.body) == 1) or binding.pass_through
+        else replace(binding, probe=profile.profile_id)
+        for binding in profile.bindings
+    )
+    return replace(profile, bindings=bindings)
+
+
+def add_latency_probes(ir: ScriptIR, log_path: str, fragment_cache: FragmentCache | None = None) -> ScriptIR:
+    # Runs before grouping, while each binding still sits in its own
+    # profile, so the log names the profile that defines it.
+    profiles = []
+    for profile in ir.profiles:
+        if fragment_cache is None:
+            profiles.append(_probe_profile(profile))
+            continue
+        cached = fragment_cache.probed.get(profile.profile_id)
+        if cached is None or cached[0] is not profile:
+            cached = (profile, _probe_profile(profile))
+            fragment_cache.probed[profile.profile_id] = cached
+        profiles.append(cached[1])
+    return replace(ir, profiles=tuple(profiles), probe_log=log_path)
+
+
+def probed_bindings(ir: ScriptIR) -> list[tuple[str, str]]:
+    # (profile id, hotkey) of every binding the script will log; remaps
+    # have no body to probe.
+    return [
+        (binding.probe, binding.hotkey)
+        for profile in ir.profiles
+        for binding in profile.bindings
+        if binding.probe and binding.optimized != OPTIMIZED_REMAP
+    ]
+
+
+@dataclass(slots=True)
+class LatencyHistogram:
+    hits: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    buckets: dict[int, int] = field(default_factory=dict)
+
+    def add(self, ms: float) -> None:
+        self.hits += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        bucket = int(math.log(ms / BUCKET_MIN_MS, BUCKET_RATIO)) if ms > BUCKET_MIN_MS else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction: float) -> float:
+        # The middle of the bucket holding the sample at that rank.
+        rank = max(1, math.ceil(self.hits * fraction))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(BUCKET_MIN_MS * BUCKET_RATIO ** (bucket + 0.5), self.max_ms)
+        return self.max_ms
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.hits if self.hits else 0.0
+
+
+@dataclass(slots=True)
+class ProbeReport:
+    # (profile id, hotkey) -> latencies
+    bindings: dict[tuple[str, str], LatencyHistogram] = field(default_factory=dict)
+    skipped: int = 0
+
+    def read(self, lines: Iterable[str]) -> None:
+        # Lines are handled one at a time, so logs of any size stream
+        # through. Without a frequency line the ticks are taken as
+        # milliseconds, as A_TickCount gives them.
+        ticks_per_ms = 1.0
+        for line in lines:
+            fields = line.rstrip("\r\n").split("\t")
+            if fields[0] == PROBE_FREQUENCY_MARK and len(fields) == 2:
+                try:
+                    ticks_per_ms = int(fields[1]) / 1000
+                except ValueError:
+                    self.skipped += 1
+                continue
+            if len(fields) != 4:
+                if line.strip():
+                    self.skipped += 1
+                continue
+            hotkey, profile_id, start, end = fields
+            try:
+                elapsed = (int(end) - int(start)) / ticks_per_ms
+            except (ValueError, ZeroDivisionError):
+                self.skipped += 1
+                continue
+            if elapsed < 0:
+                self.skipped += 1
+                continue
+            histogram = self.bindings.get((profile_id, hotkey))
+            if histogram is None:
+                histogram = self.bindings[(profile_id, hotkey)] = LatencyHistogram()
+            histogram.add(elapsed)
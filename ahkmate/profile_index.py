@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+
+SEARCH_FIELDS = ("label", "id", "device_id", "description")
+# Substrings up to this length are indexed directly; longer queries
+# intersect the lists of their pieces of this length.
+GRAM_LENGTH = 3
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileMatch:
+    profile_id: str
+    label: str
+    parent: str
+
+
+class ProfileIndex:
+    # Substring search over the fields of every keyboard profile. Each
+    # whitespace-separated term of a query must occur in some field; hits
+    # where the label or id starts with the query sort first.
+    def __init__(self, keyboard_profiles: Iterable[Mapping[str, Any]]) -> None:
+        self._profiles: list[ProfileMatch] = []
+        self._fields: list[tuple[str, ...]] = []
+        self._grams: dict[str, set[int]] = {}
+        for profile in keyboard_profiles:
+            profile_id = str(profile.get("id", "")).strip()
+            if not profile_id:
+                continue
+            position = len(self._profiles)
+            label = str(profile.get("label") or profile_id)
+            self._profiles.append(ProfileMatch(profile_id, label, str(profile.get("parent", "") or "")))
+            fields = tuple(str(profile.get(name, "") or "").casefold() for name in SEARCH_FIELDS)
+            self._fields.append(fields)
+            for text in fields:
+                for start in range(len(text)):
+                    for end in range(start + 1, min(start + GRAM_LENGTH, len(text)) + 1):
+                        self._grams.setdefault(text[start:end], set()).add(position)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def search(self, query: str, limit: int = 100) -> list[ProfileMatch]:
+        terms = query.casefold().split()
+        if not terms:
+            return self._profiles[:limit]
+        candidates: set[int] | None = None
+        for term in terms:
+            found = self._candidates(term)
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return []
+        hits = [
+            position
+            for position in candidates
+            if all(any(term in text for text in self._fields[position]) for term in terms)
+        ]
+        first = terms[0]
+
+        def rank(position: int) -> tuple[bool, int]:
+            label, profile_id = self._fields[position][:2]
+            return not (label.startswith(first) or profile_id.startswith(first)), position
+
+        hits.sort(key=rank)
+        return [self._profiles[position] for position in hits[:limit]]
+
+    def _candidates(self, term: str) -> set[int]:
+        if len(term) <= GRAM_LENGTH:
+            return set(self._grams.get(term, ()))
+        pieces = sorted(
+            (self._grams.get(term[start : start + GRAM_LENGTH], set()) for start in range(len(term) - GRAM_LENGTH + 1)),
+            key=len,
+        )
+        # Smallest list first, so the intersection shrinks fast.
+        return set(pieces[0]).intersection(*pieces[1:])
+
+
+def is_active_binding(data: Any) -> bool:
+    if not isinstance(data, dict) or not data.get("enabled", True):
+        return False
+    return bool(str(data.get("action", "")).strip() or data.get("template"))
+
+
+class BindingCounts:
+    # Active bindings per profile, kept current from batch changes so the
+    # picker never has to walk the bindings.
+    def __init__(self) -> None:
+        self._counts: dict[str, int] = {}
+
+    @classmethod
+    def build(cls, actions_by_profile: Mapping[str, Any]) -> BindingCounts:
+        counts = cls()
+        for profile_id, actions in actions_by_profile.items():
+            if not isinstance(actions, dict):
+                continue
+            counts._counts[profile_id] = sum(
+                is_active_binding(data)
+                for entry in actions.values()
+                if isinstance(entry, dict)
+                for data in entry.values()
+            )
+        return counts
+
+    def get(self, profile_id: str) -> int:
+        return self._counts.get(profile_id, 0)
+
+    def apply_changes(self, changes: Mapping[tuple[str, str, str], tuple[Any, Any]]) -> None:
+        for (profile_id, _key_id, _modifier), (before, after) in changes.items():
+            delta = is_active_binding(after) - is_active_binding(before)
+            if delta:
+                self._counts[profile_id] = self._counts.get(profile_id, 0) + delta
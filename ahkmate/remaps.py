@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+from dataclasses import dataclass, replace
+
+from .emitters import AhkEmitter
+from .hotstrings import is_hotstring
+from .probes import probe_variable
+from .script_ir import OPTIMIZED_REMAP, OPTIMIZED_SEND_INPUT, FragmentCache, IRBinding, IRProfile, ScriptIR
+
+
+# A body qualifies when all it does is send one key, optionally with
+# modifiers: "Send ^v", "SendInput, ^+{F1}" or just "^v". Uppercase letters
+# imply Shift for Send but not for a remap, and {Blind}, {Raw}, {Text},
+# {Click} or "{Key down}" change what gets sent, so those keep the body.
+SEND_PATTERN = re.compile(r"^(?P<command>Send|SendInput)\s*(?:,\s*|\s+)(?P<keys>\S+)$", re.IGNORECASE)
+KEY_SPEC_PATTERN = re.compile(
+    r"^(?P<mods>[\^+!#]*)(?:\{(?P<name>[A-Za-z][A-Za-z0-9_]*)\}|(?P<char>[a-z0-9\-=\[\]\\'./]))$"
+)
+NON_KEY_NAMES = frozenset({"blind", "raw", "text", "click", "asc"})
+
+
+@dataclass(frozen=True, slots=True)
+class SendTarget:
+    # keys as written after Send, and the same keys in remap syntax
+    keys: str
+    remap: str
+    already_send_input: bool
+
+
+def classify_body(body: tuple[str, ...]) -> SendTarget | None:
+    if len(body) != 1:
+        return None
+    line = body[0].strip()
+    command = ""
+    match = SEND_PATTERN.match(line)
+    if match is not None:
+        command = match.group("command").lower()
+        line = match.group("keys")
+    spec = KEY_SPEC_PATTERN.match(line)
+    if spec is None:
+        return None
+    name = spec.group("name")
+    if name is not None and name.lower() in NON_KEY_NAMES:
+        return None
+    return SendTarget(line, spec.group("mods") + (name or spec.group("char")), command == "sendinput")
+
+
+def _optimize_profile(profile: IRProfile, unique_keys: frozenset[str]) -> IRProfile:
+    bindings = list(profile.bindings)
+    for index, binding in enumerate(bindings):
+        target = classify_body(binding.body) if binding.optimize and not is_hotstring(binding.key_id) else None
+        if target is None:
+            continue
+        if binding.remap and binding.modifier == "None" and binding.key_id in unique_keys:
+            bindings[index] = replace(binding, optimized=OPTIMIZED_REMAP, keys=target.remap)
+        elif not target.already_send_input:
+            bindings[index] = replace(binding, optimized=OPTIMIZED_SEND_INPUT, keys=target.keys)
+    if all(new is old for new, old in zip(bindings, profile.bindings)):
+        return profile
+    return replace(profile, bindings=tuple(bindings))
+
+
+def optimize_remaps(
+    ir: ScriptIR, fragment_cache: FragmentCache | None = None
+) -> tuple[ScriptIR, list[tuple[str, IRBinding]]]:
+    # A remap "a::b" acts like "*a::Send {Blind}{b DownR}" plus the key-up
+    # hotkey, so it fires whatever modifiers are held and defines every
+    # variant of the key. It is only used for a modifier-less binding that
+    # opted in and whose key no other binding uses; everything else that
+    # just sends keys gets the faster SendInput instead of the default
+    # SendEvent mode.
+    key_uses = Counter(binding.key_id for profile in ir.profiles for binding in profile.bindings)
+    profiles: list[IRProfile] = []
+    for profile in ir.profiles:
+        unique_keys = frozenset(binding.key_id for binding in profile.bindings if key_uses[binding.key_id] == 1)
+        if fragment_cache is None:
+            profiles.append(_optimize_profile(profile, unique_keys))
+            continue
+        # Keeping the optimized profile object stable lets the emitters
+        # reuse its rendered lines.
+        cached = fragment_cache.remapped.get(profile.profile_id)
+        if cached is None or cached[0] is not profile or cached[1] != unique_keys:
+            cached = (profile, unique_keys, _optimize_profile(profile, unique_keys))
+            fragment_cache.remapped[profile.profile_id] = cached
+        profiles.append(cached[2])
+    optimized = [
+        (profile.profile_id, binding)
+        for profile in profiles
+        for binding in profile.bindings
+        if binding.optimized
+    ]
+    return replace(ir, profiles=tuple(profiles)), optimized
+
+
+def optimized_line_numbers(lines: list[str], ir: ScriptIR, emitter: AhkEmitter) -> list[int]:
+    # Finds the rendered lines of optimized bindings: the remap line, the
+    # one-line hotkey, or the SendInput line right under its hotkey (or
+    # under its latency probe's start line).
+    inline: set[str] = set()
+    under_hotkey: set[tuple[str, str]] = set()
+    probe_starts: set[str] = set()
+    for profile in ir.profiles:
+        for binding in profile.bindings:
+            remap = emitter.remap_line(binding)
+            if remap is not None:
+                inline.add(remap)
+            elif binding.optimized:
+                body = emitter.send_input_line(binding.keys)
+                inline.add(f"{binding.hotkey}::{body}")
+                under_hotkey.add((f"{binding.hotkey}::", body))
+                if binding.probe:
+                    probe_starts.add(emitter.probe_start_line(probe_variable(binding)))
+    numbers = []
+    hotkey_line = ""
+    for number, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped in inline or (hotkey_line, stripped) in under_hotkey:
+            numbers.append(number)
+        if stripped.endswith("::"):
+            hotkey_line = stripped
+        elif stripped != "{" and stripped not in probe_starts:
+            hotkey_line = ""
+    return numbers
@@ -1,8 +1,20 @@
 from __future__ import annotations
 
-from collections.abc import Mapping, Sequence
+from collections.abc import Callable, Mapping, Sequence
 from typing import Any
 
+from .compile_worker import run_passes
+from .emitters import DEFAULT_FORMAT, get_emitter, shard_filename
+from .inheritance import effective_actions
+from .script_ir import FragmentCache, TemplateExpansion, compile_script_ir
+
+__all__ = [
+    "FragmentCache",
+    "TemplateExpansion",
+    "build_script_text",
+    "shard_filename",
+]
+
 
 def build_script_text(
     *,
@@ -12,69 +24,27 @@ def build_script_text(
     key_name_overrides: Mapping[str, str],
     modifier_prefix: Mapping[str, str],
     modifier_options: Sequence[str],
+    progress: Callable[[int, int], None] | None = None,
+    expand_template: TemplateExpansion | None = None,
+    fragment_cache: FragmentCache | None = None,
+    output_format: str = DEFAULT_FORMAT,
+    compact: bool = False,
+    group_conditions: bool = True,
+    native_remaps: bool = True,
+    probe_log: str = "",
 ) -> str:
-    lines = list(header_lines)
-
-    for profile in keyboard_profiles:
-        profile_id = str(profile.get("id", "")).strip()
-        if not profile_id:
-            continue
-        actions = actions_by_profile.get(profile_id, {})
-        valid_actions: dict[str, dict[str, dict[str, Any]]] = {}
-
-        if isinstance(actions, dict):
-            for key, entry in actions.items():
-                if not isinstance(entry, dict):
-                    continue
-                trimmed: dict[str, dict[str, Any]] = {}
-                for modifier, modifier_data in entry.items():
-                    if modifier not in modifier_options:
-                        continue
-                    if not isinstance(modifier_data, dict):
-                        continue
-                    action_text = modifier_data.get("action", "")
-                    enabled = modifier_data.get("enabled", True)
-                    if not isinstance(action_text, str):
-                        continue
-                    text = action_text.strip()
-                    if not text and enabled:
-                        continue
-                    trimmed[modifier] = {"action": text, "enabled": bool(enabled)}
-                if trimmed and isinstance(key, str):
-                    valid_actions[key] = trimmed
-
-        if not valid_actions:
-            continue
-
-        label = str(profile.get("label") or profile_id)
-        lines.append(f"; {label}")
-
-        condition = str(profile.get("condition", "")).strip()
-        if condition:
-            lines.append(f"#if {condition}")
-
-        for key_id in sorted(valid_actions):
-            entry = valid_actions[key_id]
-            ahk_key = key_name_overrides.get(key_id, key_id.upper())
-            for modifier in sorted(entry.keys()):
-                modifier_entry = entry[modifier]
-                if not isinstance(modifier_entry, dict):
-                    continue
-                enabled = bool(modifier_entry.get("enabled", True))
-                action_text = str(modifier_entry.get("action", "")).strip()
-                if not enabled or not action_text:
-                    continue
-                prefix = modifier_prefix.get(modifier, "")
-                hotkey = f"{prefix}{ahk_key}" if prefix else ahk_key
-                lines.append(f"{hotkey}::")
-                for action_line in action_text.splitlines():
-                    lines.append(f"    {action_line}")
-                lines.append("return")
-                lines.append("")
-
-        if condition:
-            lines.append("#if")
-        lines.append("")
-
-    return "\n".join(lines).rstrip()
-
+    ir = compile_script_ir(
+        header_lines=header_lines,
+        keyboard_profiles=keyboard_profiles,
+        actions_by_profile=effective_actions(keyboard_profiles, actions_by_profile),
+        key_name_overrides=key_name_overrides,
+        modifier_prefix=modifier_prefix,
+        modifier_options=modifier_options,
+        progress=progress,
+        expand_template=expand_template,
+        fragment_cache=fragment_cache,
+    )
+    ir = run_passes(
+        ir, fragment_cache, group_conditions=group_conditions, native_remaps=native_remaps, probe_log=probe_log
+    )
+    return get_emitter(output_format, compact=compact).render(ir, fragment_cache)
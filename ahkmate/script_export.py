@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Mapping
+from pathlib import Path
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            if handle.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    temp_path = path.with_name(f"{path.name}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.replace(temp_path, path)
+    return True
+
+
+def shard_dir_for(path: Path) -> Path:
+    return path.with_name(f"{path.stem}_profiles")
+
+
+def write_sharded_script(
+    path: Path,
+    main_text: str,
+    shards: Mapping[str, str],
+) -> tuple[list[Path], str | None]:
+    shard_dir = shard_dir_for(path)
+    written: list[Path] = []
+    # Windows, where the script runs, doesn't tell these names apart.
+    names: dict[str, str] = {}
+    for filename in shards:
+        clash = names.setdefault(filename.casefold(), filename)
+        if clash != filename:
+            return written, f"{clash} and {filename} would be the same shard file"
+    try:
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        # Shards go first so the main script never includes a missing file.
+        for filename, text in shards.items():
+            shard_path = shard_dir / filename
+            if write_text_if_changed(shard_path, text):
+                written.append(shard_path)
+        if write_text_if_changed(path, main_text):
+            written.append(path)
+        for stale in shard_dir.glob("*.ahk"):
+            if stale.name.casefold() not in names:
+                stale.unlink()
+                written.append(stale)
+    except OSError as exc:
+        return written, str(exc)
+    return written, None
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import re
+import textwrap
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .hotstrings import HOTSTRING_MODIFIER, hotstring_id, is_replacement_text, parse_hotstring_id
+from .probes import is_label
+from .settings_io import ActionsByProfile
+
+
+HOTKEY_PATTERN = re.compile(r"^(?P<hotkey>[^\s:;]\S*?)::(?P<rest>.*)$")
+HOTSTRING_LINE_PATTERN = re.compile(r"^:(?P<options>[^:\s]*):(?P<abbrev>.+?)::(?P<rest>.*)$")
+IF_PATTERN = re.compile(r"^#if\b(?P<condition>.*)$", re.IGNORECASE)
+OTHER_IF_PATTERN = re.compile(r"^#if\w+", re.IGNORECASE)
+DIRECTIVE_PATTERN = re.compile(r"^#\w+")
+# "Name(params) {" on one line; a definition with the brace on the next
+# line reads the same as a call, so it stays in the body.
+FUNCTION_PATTERN = re.compile(r"^(?P<name>[\w#@$]+)\(.*\)\s*\{$")
+CONTROL_WORDS = frozenset({"if", "while", "for", "loop", "switch", "catch", "until"})
+UNSUPPORTED_HOTKEY_PREFIXES = "~*$<>"
+MAX_REPORTED_LINES = 1000
+
+
+@dataclass(slots=True)
+class UnmappedLine:
+    line_number: int
+    text: str
+    reason: str
+
+
+@dataclass(slots=True)
+class ImportResult:
+    actions_by_profile: ActionsByProfile = field(default_factory=dict)
+    imported_count: int = 0
+    unmapped: list[UnmappedLine] = field(default_factory=list)
+    unmapped_count: int = 0
+
+    def report(self, line_number: int, text: str, reason: str) -> None:
+        self.unmapped_count += 1
+        if len(self.unmapped) < MAX_REPORTED_LINES:
+            self.unmapped.append(UnmappedLine(line_number, text, reason))
+
+
+def _normalize_condition(condition: str) -> str:
+    return " ".join(condition.split())
+
+
+def _other_code(line: str) -> str:
+    # Why a column-0 line starts code outside any hotkey body, or "".
+    # Unindented body text is common, so only lines that can't be
+    # statements count.
+    text = _strip_comment(line).strip()
+    if is_label(text):
+        return "label outside a hotkey"
+    if DIRECTIVE_PATTERN.match(text):
+        return "directive outside a hotkey"
+    match = FUNCTION_PATTERN.match(text)
+    if match is not None and match.group("name").lower() not in CONTROL_WORDS:
+        return "function definition"
+    return ""
+
+
+def _strip_comment(line: str) -> str:
+    index = line.find(" ;")
+    if index < 0:
+        index = line.find("\t;")
+    return line[:index] if index >= 0 else line
+
+
+class _HotkeyParser:
+    def __init__(
+        self,
+        *,
+        key_name_overrides: Mapping[str, str],
+        modifier_prefix: Mapping[str, str],
+        modifier_options: Sequence[str],
+    ) -> None:
+        self.key_ids = {name.lower(): key_id for key_id, name in key_name_overrides.items()}
+        self.modifiers = {
+            prefix: modifier for modifier, prefix in modifier_prefix.items() if modifier in modifier_options
+        }
+
+    def parse(self, hotkey: str) -> tuple[str, str] | None:
+        modifier = "None"
+        name = hotkey
+        if len(name) > 1 and name[0] in self.modifiers:
+            modifier = self.modifiers[name[0]]
+            name = name[1:]
+        if len(name) > 1 and (name[0] in self.modifiers or name[0] in UNSUPPORTED_HOTKEY_PREFIXES):
+            return None
+        return self.key_ids.get(name.lower(), name.lower()), modifier
+
+
+def import_script_lines(
+    lines: Iterable[str],
+    *,
+    keyboard_profiles: Sequence[Mapping[str, Any]],
+    key_name_overrides: Mapping[str, str],
+    modifier_prefix: Mapping[str, str],
+    modifier_options: Sequence[str],
+) -> ImportResult:
+    result = ImportResult()
+    parser = _HotkeyParser(
+        key_name_overrides=key_name_overrides,
+        modifier_prefix=modifier_prefix,
+        modifier_options=modifier_options,
+    )
+    profile_by_condition: dict[str, str] = {}
+    for profile in keyboard_profiles:
+        profile_id = str(profile.get("id", "")).strip()
+        if profile_id:
+            condition = _normalize_condition(str(profile.get("condition", "")))
+            profile_by_condition.setdefault(condition, profile_id)
+
+    current_profile = profile_by_condition.get("")
+    block_reason = "" if current_profile else "no profile without a condition"
+    binding: tuple[str, str] | None = None
+    skipping_body = False
+    body: list[str] = []
+    in_body = False
+    in_block_comment = False
+
+    def finish_body(one_line: bool = False) -> None:
+        nonlocal binding, in_body, skipping_body
+        if binding is not None and current_profile is not None:
+            text = textwrap.dedent("\n".join(body)).strip()
+            if text:
+                key_id, modifier = binding
+                if not one_line and is_replacement_text(key_id, text):
+                    # A one-line body under a hotstring is code, which the
+                    # model spells with the X option.
+                    options, abbrev = parse_hotstring_id(key_id)
+                    key_id = hotstring_id("X" + options, abbrev)
+                profile_actions = result.actions_by_profile.setdefault(current_profile, {})
+                profile_actions.setdefault(key_id, {})[modifier] = {"action": text, "enabled": True}
+                result.imported_count += 1
+        body.clear()
+        binding = None
+        in_body = False
+        skipping_body = False
+
+    for line_number, raw_line in enumerate(lines, start=1):
+        line = raw_line.rstrip("\r\n")
+        stripped = line.strip()
+
+        if in_block_comment:
+            if stripped.startswith("*/"):
+                in_block_comment = False
+            continue
+
+        at_column_zero = bool(line) and not line[0].isspace()
+        hotkey_match = None
+        if at_column_zero:
+            hotkey_match = HOTKEY_PATTERN.match(line) or HOTSTRING_LINE_PATTERN.match(line)
+
+        if in_body:
+            ends_body = at_column_zero and bool(
+                hotkey_match is not None
+                or IF_PATTERN.match(line)
+                or OTHER_IF_PATTERN.match(line)
+                or _other_code(line)
+            )
+            if at_column_zero and _strip_comment(stripped).strip().lower() == "return":
+                finish_body()
+                continue
+            if not ends_body:
+                if not skipping_body:
+                    body.append(line)
+                continue
+            finish_body()
+
+        if not stripped or stripped.startswith(";"):
+            continue
+        if stripped.startswith("/*"):
+            in_block_comment = not stripped.endswith("*/")
+            continue
+
+        if_match = IF_PATTERN.match(stripped)
+        if if_match:
+            condition = _normalize_condition(_strip_comment(if_match.group("condition")))
+            current_profile = profile_by_condition.get(condition)
+            block_reason = "" if current_profile else f"no profile with condition '{condition}'"
+            continue
+        if OTHER_IF_PATTERN.match(stripped):
+            current_profile = None
+            block_reason = "unsupported context directive"
+            result.report(line_number, line, block_reason)
+            continue
+
+        if hotkey_match is None:
+            if stripped.lower() != "return":
+                result.report(line_number, line, (at_column_zero and _other_code(line)) or "not inside a hotkey")
+            continue
+
+        rest = _strip_comment(hotkey_match.group("rest")).strip()
+        if hotkey_match.re is HOTSTRING_LINE_PATTERN:
+            parsed = (hotstring_id(hotkey_match.group("options"), hotkey_match.group("abbrev")), HOTSTRING_MODIFIER)
+        else:
+            parsed = parser.parse(hotkey_match.group("hotkey"))
+        if parsed is None or current_profile is None:
+            result.report(line_number, line, block_reason if parsed else "unsupported hotkey")
+            # The body still has to be consumed so its lines aren't reported too.
+            in_body = skipping_body = not rest
+            continue
+
+        binding = parsed
+        if rest:
+            body.append(rest)
+            finish_body(one_line=True)
+        else:
+            in_body = True
+
+    if in_body:
+        finish_body()
+    return result
+
+
+def import_script(
+    path: Path,
+    *,
+    keyboard_profiles: Sequence[Mapping[str, Any]],
+    key_name_overrides: Mapping[str, str],
+    modifier_prefix: Mapping[str, str],
+    modifier_options: Sequence[str],
+) -> tuple[ImportResult, str | None]:
+    try:
+        with open(path, "r", encoding="utf-8-sig", errors="replace") as handle:
+            result = import_script_lines(
+                handle,
+                keyboard_profiles=keyboard_profiles,
+                key_name_overrides=key_name_overrides,
+                modifier_prefix=modifier_prefix,
+                modifier_options=modifier_options,
+            )
+    except OSError as exc:
+        return ImportResult(), f"Unable to read {path.name}:\n{exc}"
+    return result, None
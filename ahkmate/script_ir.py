@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+from .hotstrings import HOTSTRING_MODIFIER, is_hotstring
+from .inheritance import PASS_THROUGH_FIELD
+from .sequences import SEQUENCE_MODIFIER, is_sequence, parse_sequence_steps
+from .settings_io import sanitize_modifier_entry
+
+
+TemplateExpansion = Callable[[str, Mapping[str, str]], "str | None"]
+
+
+OPTIMIZED_REMAP = "remap"
+OPTIMIZED_SEND_INPUT = "send-input"
+
+
+@dataclass(frozen=True, slots=True)
+class IRBinding:
+    key_id: str
+    modifier: str
+    hotkey: str
+    body: tuple[str, ...]
+    # False when the binding opted out of the remap pass; remap is set when
+    # it opted in to a native remap, which SendInput stands in for otherwise.
+    optimize: bool = True
+    remap: bool = False
+    # Set by the remap pass: how emitters should render the binding, and
+    # the key sequence that replaces the body.
+    optimized: str = ""
+    keys: str = ""
+    # Name of the sequence machine this hotkey feeds; the emitters write
+    # the call in place of the (empty) body.
+    dispatch: str = ""
+    # Profile id the latency probe logs the binding under; empty when the
+    # binding isn't probed.
+    probe: str = ""
+    # A disabled binding that must let the key through under its condition
+    # instead of an inherited unconditional hotkey; it has no body.
+    pass_through: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class IRStep:
+    key_id: str
+    modifier: str
+    hotkey: str
+
+
+@dataclass(frozen=True, slots=True)
+class IRSequence:
+    key_id: str
+    steps: tuple[IRStep, ...]
+    body: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class SequenceMachine:
+    # Dispatch function name; accepting state n runs function f"{name}_{n}".
+    name: str
+    # (state, hotkey, next state); state 0 is the start state.
+    transitions: tuple[tuple[int, str, int], ...]
+    accepting: tuple[tuple[int, tuple[str, ...]], ...]
+    timeout_ms: int
+
+
+@dataclass(frozen=True, slots=True)
+class IRProfile:
+    profile_id: str
+    label: str
+    condition: str
+    # Empty when the profile only has disabled bindings; it still gets its
+    # section so exports don't shift when a binding is switched off.
+    bindings: tuple[IRBinding, ...]
+    # Key sequences until the sequence pass turns them into a machine and
+    # the hotkeys that feed it.
+    sequences: tuple[IRSequence, ...] = ()
+    machine: SequenceMachine | None = None
+    # Name of the machine whose pending sequence this block's keys continue;
+    # the condition already includes the check.
+    pending_on: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class ScriptIR:
+    header_lines: tuple[str, ...]
+    profiles: tuple[IRProfile, ...]
+    # Where probed bindings log their timings; the emitters add the logging
+    # functions when it is set.
+    probe_log: str = ""
+
+
+@dataclass(slots=True)
+class FragmentCache:
+    # profile id -> (actions object, profile dict, compiled profile)
+    profiles: dict[str, tuple[Any, dict[str, Any], IRProfile | None]] = field(default_factory=dict)
+    # (emitter name, profile id) -> (compiled profile, rendered lines)
+    lines: dict[tuple[str, str], tuple[IRProfile, list[str]]] = field(default_factory=dict)
+    # profile id -> (grouped profile, its keys no other binding uses, profile after the remap pass)
+    remapped: dict[str, tuple[IRProfile, frozenset[str], IRProfile]] = field(default_factory=dict)
+    # profile id -> (grouped profile, timeout, lowered profiles, sequence issues)
+    lowered: dict[str, tuple[IRProfile, int, tuple[IRProfile, ...], list[Any]]] = field(default_factory=dict)
+    # profile id -> (compiled profile, profile with latency probes)
+    probed: dict[str, tuple[IRProfile, IRProfile]] = field(default_factory=dict)
+
+
+def compile_profile(
+    profile: Mapping[str, Any],
+    actions: Any,
+    *,
+    key_name_overrides: Mapping[str, str],
+    modifier_prefix: Mapping[str, str],
+    modifier_options: Sequence[str],
+    expand_template: TemplateExpansion | None = None,
+) -> IRProfile | None:
+    profile_id = str(profile.get("id", "")).strip()
+    valid_actions: dict[str, dict[str, dict[str, Any]]] = {}
+
+    if isinstance(actions, dict):
+        for key, entry in actions.items():
+            if not isinstance(entry, dict):
+                continue
+            trimmed: dict[str, dict[str, Any]] = {}
+            for modifier, modifier_data in entry.items():
+                if modifier not in modifier_options:
+                    continue
+                clean_entry = sanitize_modifier_entry(modifier_data)
+                if clean_entry is None:
+                    continue
+                if modifier_data.get(PASS_THROUGH_FIELD) is True:
+                    clean_entry[PASS_THROUGH_FIELD] = True
+                if "template" in clean_entry:
+                    expanded = None
+                    if expand_template is not None:
+                        expanded = expand_template(clean_entry["template"], clean_entry["args"])
+                    clean_entry["action"] = expanded or ""
+                trimmed[modifier] = clean_entry
+            if trimmed and isinstance(key, str):
+                valid_actions[key] = trimmed
+
+    if not valid_actions:
+        return None
+
+    bindings: list[IRBinding] = []
+    sequences: list[IRSequence] = []
+    for key_id in sorted(valid_actions):
+        entry = valid_actions[key_id]
+        if is_sequence(key_id):
+            modifier_entry = entry.get(SEQUENCE_MODIFIER, {})
+            action_text = str(modifier_entry.get("action", "")).strip()
+            steps = parse_sequence_steps(
+                key_id, key_name_overrides=key_name_overrides, modifier_prefix=modifier_prefix
+            )
+            if steps is not None and action_text and modifier_entry.get("enabled", True):
+                sequences.append(
+                    IRSequence(key_id, tuple(IRStep(*step) for step in steps), tuple(action_text.splitlines()))
+                )
+            continue
+        hotstring = is_hotstring(key_id)
+        ahk_key = key_id if hotstring else key_name_overrides.get(key_id, key_id.upper())
+        for modifier in sorted(entry.keys()):
+            if hotstring and modifier != HOTSTRING_MODIFIER:
+                continue
+            modifier_entry = entry[modifier]
+            enabled = bool(modifier_entry.get("enabled", True))
+            action_text = str(modifier_entry.get("action", "")).strip()
+            prefix = modifier_prefix.get(modifier, "")
+            hotkey = f"{prefix}{ahk_key}" if prefix else ahk_key
+            if modifier_entry.get(PASS_THROUGH_FIELD) and not hotstring:
+                bindings.append(IRBinding(key_id, modifier, hotkey, (), optimize=False, pass_through=True))
+                continue
+            if not enabled or not action_text:
+                continue
+            bindings.append(
+                IRBinding(
+                    key_id,
+                    modifier,
+                    hotkey,
+                    tuple(action_text.splitlines()),
+                    optimize=modifier_entry.get("optimize", True) is not False,
+                    remap=modifier_entry.get("remap") is True,
+                )
+            )
+
+    return IRProfile(
+        profile_id=profile_id,
+        label=str(profile.get("label") or profile_id),
+        condition=str(profile.get("condition", "")).strip(),
+        bindings=tuple(bindings),
+        sequences=tuple(sequences),
+    )
+
+
+def _cached_profile(
+    profile: Mapping[str, Any],
+    actions: Any,
+    fragment_cache: FragmentCache | None,
+    **options: Any,
+) -> IRProfile | None:
+    # Compiled profiles are reused while the caller keeps handing in the same
+    # actions object for a profile, i.e. until that profile is edited.
+    if fragment_cache is None:
+        return compile_profile(profile, actions, **options)
+    profile_id = str(profile.get("id", "")).strip()
+    cached = fragment_cache.profiles.get(profile_id)
+    if cached is not None and cached[0] is actions and cached[1] == profile:
+        return cached[2]
+    compiled = compile_profile(profile, actions, **options)
+    fragment_cache.profiles[profile_id] = (actions, dict(profile), compiled)
+    return compiled
+
+
+def compile_script_ir(
+    *,
+    header_lines: Sequence[str],
+    keyboard_profiles: Sequence[Mapping[str, Any]],
+    actions_by_profile: Mapping[str, Any],
+    key_name_overrides: Mapping[str, str],
+    modifier_prefix: Mapping[str, str],
+    modifier_options: Sequence[str],
+    progress: Callable[[int, int], None] | None = None,
+    expand_template: TemplateExpansion | None = None,
+    fragment_cache: FragmentCache | None = None,
+) -> ScriptIR:
+    profiles: list[IRProfile] = []
+    total = len(keyboard_profiles)
+    for index, profile in enumerate(keyboard_profiles, start=1):
+        if progress is not None:
+            progress(index - 1, total)
+        profile_id = str(profile.get("id", "")).strip()
+        if not profile_id:
+            continue
+        compiled = _cached_profile(
+            profile,
+            actions_by_profile.get(profile_id, {}),
+            fragment_cache,
+            key_name_overrides=key_name_overrides,
+            modifier_prefix=modifier_prefix,
+            modifier_options=modifier_options,
+            expand_template=expand_template,
+        )
+        if compiled is not None:
+            profiles.append(compiled)
+    return ScriptIR(header_lines=tuple(header_lines), profiles=tuple(profiles))
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field, replace
+
+from .script_ir import FragmentCache, IRBinding, IRProfile, IRSequence, ScriptIR, SequenceMachine
+
+
+SEQUENCE_ISSUE_DUPLICATE = "duplicate"
+SEQUENCE_ISSUE_PREFIX = "prefix"
+SEQUENCE_ISSUE_LEADER = "leader"
+
+
+@dataclass(frozen=True, slots=True)
+class SequenceIssue:
+    kind: str
+    profile_id: str
+    key_id: str
+    # the sequence or hotkey it clashes with
+    other: str
+
+    def format(self) -> str:
+        if self.kind == SEQUENCE_ISSUE_DUPLICATE:
+            return f"'{self.key_id}' is defined twice"
+        if self.kind == SEQUENCE_ISSUE_PREFIX:
+            return f"'{self.key_id}' and '{self.other}' are ambiguous: one is a prefix of the other"
+        return f"'{self.key_id}' starts with {self.other}, which is already a hotkey here"
+
+
+@dataclass(slots=True)
+class MachineStats:
+    trie_states: int = 0
+    states: int = 0
+    transitions: int = 0
+
+
+@dataclass(slots=True)
+class _State:
+    children: dict[str, _State] = field(default_factory=dict)
+    sequence: IRSequence | None = None
+
+
+def machine_name(profile_id: str) -> str:
+    return "AhkmateSeq_" + re.sub(r"\W", "_", profile_id)
+
+
+def build_machine(
+    name: str, sequences: tuple[IRSequence, ...], *, timeout_ms: int, profile_id: str = ""
+) -> tuple[SequenceMachine | None, list[SequenceIssue], MachineStats]:
+    # Builds the trie of all sequences, rejecting any that would make a
+    # state both accept and continue, then merges states with the same
+    # future (same body, same transitions) bottom-up. Both steps are linear
+    # in the total number of steps.
+    issues: list[SequenceIssue] = []
+    stats = MachineStats()
+    root = _State()
+    stats.trie_states = 1
+    for sequence in sequences:
+        node = root
+        clash = None
+        for step in sequence.steps:
+            if node.sequence is not None:
+                clash = node.sequence
+                break
+            child = node.children.get(step.hotkey)
+            if child is None:
+                child = node.children[step.hotkey] = _State()
+                stats.trie_states += 1
+            node = child
+        else:
+            if node.sequence is not None:
+                issues.append(
+                    SequenceIssue(SEQUENCE_ISSUE_DUPLICATE, profile_id, sequence.key_id, node.sequence.key_id)
+                )
+                continue
+            if node.children:
+                clash = _first_sequence(node)
+        if clash is not None:
+            issues.append(SequenceIssue(SEQUENCE_ISSUE_PREFIX, profile_id, sequence.key_id, clash.key_id))
+            continue
+        node.sequence = sequence
+    if not root.children:
+        return None, issues, stats
+
+    ids: dict[int, int] = {}
+    signatures: dict[tuple, int] = {}
+    order: list[_State] = []
+    _post_order(root, order)
+    for node in order:
+        signature = (
+            node.sequence.body if node.sequence is not None else None,
+            tuple(sorted((hotkey, ids[id(child)]) for hotkey, child in node.children.items())),
+        )
+        ids[id(node)] = signatures.setdefault(signature, len(signatures))
+
+    # Renumber breadth-first so the start state is 0 and output is stable.
+    numbering = {ids[id(root)]: 0}
+    queue = [root]
+    transitions = []
+    accepting = []
+    seen = {ids[id(root)]}
+    while queue:
+        node = queue.pop(0)
+        state = numbering[ids[id(node)]]
+        if node.sequence is not None:
+            accepting.append((state, node.sequence.body))
+        for hotkey in sorted(node.children):
+            child = node.children[hotkey]
+            canonical = ids[id(child)]
+            if canonical not in numbering:
+                numbering[canonical] = len(numbering)
+            transitions.append((state, hotkey, numbering[canonical]))
+            if canonical not in seen:
+                seen.add(canonical)
+                queue.append(child)
+    stats.states = len(numbering)
+    stats.transitions = len(transitions)
+    machine = SequenceMachine(
+        name=name, transitions=tuple(transitions), accepting=tuple(accepting), timeout_ms=timeout_ms
+    )
+    return machine, issues, stats
+
+
+def _first_sequence(node: _State) -> IRSequence | None:
+    while node.sequence is None and node.children:
+        node = node.children[min(node.children)]
+    return node.sequence
+
+
+def _post_order(root: _State, order: list[_State]) -> None:
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in node.children.values())
+
+
+def _dispatch_binding(machine: SequenceMachine, step_bindings: dict[str, IRBinding], hotkey: str) -> IRBinding:
+    return replace(step_bindings[hotkey], dispatch=machine.name)
+
+
+def lower_profile(
+    profile: IRProfile, *, timeout_ms: int
+) -> tuple[tuple[IRProfile, ...], list[SequenceIssue], MachineStats]:
+    # Returns the profile with the machine and its leader hotkeys, preceded
+    # by a block for the keys that only act while a sequence is pending.
+    # That block comes first so it wins over the profile's own hotkeys for
+    # the same keys, but only while its condition holds.
+    hotkeys = {binding.hotkey for binding in profile.bindings}
+    issues: list[SequenceIssue] = []
+    usable = []
+    for sequence in profile.sequences:
+        leader = sequence.steps[0].hotkey
+        if leader in hotkeys:
+            issues.append(SequenceIssue(SEQUENCE_ISSUE_LEADER, profile.profile_id, sequence.key_id, leader))
+        else:
+            usable.append(sequence)
+    name = machine_name(profile.profile_id)
+    machine, machine_issues, stats = build_machine(
+        name, tuple(usable), timeout_ms=timeout_ms, profile_id=profile.profile_id
+    )
+    issues.extend(machine_issues)
+    if machine is None:
+        return (replace(profile, sequences=()),), issues, stats
+
+    step_bindings: dict[str, IRBinding] = {}
+    for sequence in usable:
+        for step in sequence.steps:
+            step_bindings.setdefault(step.hotkey, IRBinding(step.key_id, step.modifier, step.hotkey, ()))
+    leaders = sorted({hotkey for state, hotkey, _next in machine.transitions if state == 0})
+    followers = sorted({hotkey for state, hotkey, _next in machine.transitions if state != 0} - set(leaders))
+    lowered = replace(
+        profile,
+        bindings=profile.bindings + tuple(_dispatch_binding(machine, step_bindings, hotkey) for hotkey in leaders),
+        sequences=(),
+        machine=machine,
+    )
+    if not followers:
+        return (lowered,), issues, stats
+    pending_condition = f"({profile.condition}) && {name}()" if profile.condition else f"{name}()"
+    pending = IRProfile(
+        profile_id=f"{profile.profile_id}.sequence",
+        label=f"{profile.label} (pending sequence)",
+        condition=pending_condition,
+        bindings=tuple(_dispatch_binding(machine, step_bindings, hotkey) for hotkey in followers),
+        pending_on=name,
+    )
+    return (pending, lowered), issues, stats
+
+
+def lower_sequences(
+    ir: ScriptIR, *, timeout_ms: int, fragment_cache: FragmentCache | None = None
+) -> tuple[ScriptIR, list[SequenceIssue]]:
+    profiles: list[IRProfile] = []
+    issues: list[SequenceIssue] = []
+    for profile in ir.profiles:
+        if not profile.sequences:
+            profiles.append(profile)
+            continue
+        cached = fragment_cache.lowered.get(profile.profile_id) if fragment_cache is not None else None
+        if cached is None or cached[0] is not profile or cached[1] != timeout_ms:
+            lowered, profile_issues, _stats = lower_profile(profile, timeout_ms=timeout_ms)
+            cached = (profile, timeout_ms, lowered, profile_issues)
+            if fragment_cache is not None:
+                fragment_cache.lowered[profile.profile_id] = cached
+        profiles.extend(cached[2])
+        issues.extend(cached[3])
+    return replace(ir, profiles=tuple(profiles)), issues
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+
+
+# Key sequences share the actions model with keys and hotstrings: the key id
+# lists the steps separated by spaces, e.g. "capslock g s" or
+# "Ctrl+x Ctrl+s", and the binding sits under the "None" modifier. Each
+# step is a key id as used by the keyboard view, optionally with one
+# modifier.
+SEQUENCE_MODIFIER = "None"
+STEP_MODIFIER_SEPARATOR = "+"
+
+
+def is_sequence(key_id: str) -> bool:
+    return len(key_id.split()) > 1 and not key_id.startswith(":")
+
+
+def parse_step(
+    token: str, *, key_name_overrides: Mapping[str, str], modifier_prefix: Mapping[str, str]
+) -> tuple[str, str, str] | None:
+    # (key id, modifier, hotkey) for one step, or None if it isn't valid.
+    modifier, separator, key_id = token.rpartition(STEP_MODIFIER_SEPARATOR)
+    if not separator or not key_id:
+        modifier, key_id = SEQUENCE_MODIFIER, token
+    elif modifier not in modifier_prefix:
+        return None
+    key_id = key_id.lower()
+    hotkey = key_name_overrides.get(key_id, key_id.upper())
+    return key_id, modifier, modifier_prefix.get(modifier, "") + hotkey
+
+
+def parse_sequence_steps(
+    key_id: str, *, key_name_overrides: Mapping[str, str], modifier_prefix: Mapping[str, str]
+) -> tuple[tuple[str, str, str], ...] | None:
+    if not is_sequence(key_id):
+        return None
+    steps = []
+    for token in key_id.split():
+        step = parse_step(token, key_name_overrides=key_name_overrides, modifier_prefix=modifier_prefix)
+        if step is None:
+            return None
+        steps.append(step)
+    return tuple(steps)
@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import difflib
+import http.client
+import inspect
+import ipaddress
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+from .compile_worker import compile_snapshot_ir
+from .config import CONFIG_FILENAMES, LoadedConfig, lint_config, load_config, saved_export_path
+from .emitters import DEFAULT_FORMAT, EMITTERS, get_emitter
+from .linter import SEVERITY_ERROR, LintCache
+from .script_ir import FragmentCache
+from .store_sync import diff_bindings, flatten_actions
+
+
+# JSON-RPC 2.0 over HTTP POST on localhost. Every method takes named
+# params; "root" defaults to the directory the service was started for.
+# There is no authentication, so callers can only name the roots the
+# service was started with, and only JSON bodies are accepted: a browser
+# page can't send those cross-origin without a preflight.
+JSONRPC_VERSION = "2.0"
+JSON_CONTENT_TYPE = "application/json"
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+def is_loopback(host: str) -> bool:
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+ConfigStamp = tuple[tuple[str, int, int], ...]
+
+
+def config_stamp(root: Path) -> ConfigStamp:
+    stamp = []
+    for name in CONFIG_FILENAMES:
+        try:
+            stat = (root / name).stat()
+        except OSError:
+            stamp.append((name, -1, -1))
+        else:
+            stamp.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+
+@dataclass(slots=True)
+class WarmConfig:
+    stamp: ConfigStamp
+    config: LoadedConfig
+    fragment_cache: FragmentCache = field(default_factory=FragmentCache)
+    # (format, compact, group, remap) -> rendered script
+    scripts: dict[tuple[str, bool, bool, bool], str] = field(default_factory=dict)
+    validation: dict[str, Any] | None = None
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    loads: int = 0
+    reloads: int = 0
+    evictions: int = 0
+
+
+class ConfigCache:
+    # Loaded configs by root, least recently used first. A root is reloaded
+    # when any of its files changed; profiles whose bindings are unchanged
+    # keep their old objects so the compiled fragments for them stay valid.
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, capacity)
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Path, WarmConfig] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, root: Path) -> tuple[WarmConfig, bool]:
+        # The entry, and whether it had to be (re)loaded from disk.
+        stamp = config_stamp(root)
+        entry = self._entries.get(root)
+        if entry is not None and entry.stamp == stamp:
+            self._entries.move_to_end(root)
+            self.stats.hits += 1
+            return entry, False
+        config = load_config(root)
+        if entry is None:
+            self.stats.loads += 1
+            entry = WarmConfig(stamp, config)
+        else:
+            self.stats.reloads += 1
+            old_actions = entry.config.snapshot.actions_by_profile
+            actions = {
+                profile_id: old_actions[profile_id] if old_actions.get(profile_id) == new else new
+                for profile_id, new in config.snapshot.actions_by_profile.items()
+            }
+            config.snapshot = replace(config.snapshot, actions_by_profile=actions)
+            entry = WarmConfig(stamp, config, entry.fragment_cache)
+        self._entries[root] = entry
+        self._entries.move_to_end(root)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        return entry, True
+
+
+class CompileService:
+    def __init__(self, *, default_root: Path, cache_size: int, extra_roots: Iterable[Path] = ()) -> None:
+        self.default_root = default_root.resolve()
+        self.roots = frozenset({self.default_root, *(root.resolve() for root in extra_roots)})
+        self.cache = ConfigCache(cache_size)
+        self.lint_cache = LintCache()
+        self.requests = 0
+        # Fragment caches aren't thread-safe, so calls run one at a time.
+        self._lock = threading.Lock()
+        self.methods: dict[str, Callable[..., Any]] = {
+            "load": self.load,
+            "validate": self.validate,
+            "compile": self.compile,
+            "diff": self.diff,
+            "stats": self.stats,
+        }
+
+    def handle_bytes(self, body: bytes) -> Any:
+        try:
+            payload = json.loads(body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            return _error_response(None, PARSE_ERROR, f"parse error: {exc}")
+        if isinstance(payload, list):
+            if not payload:
+                return _error_response(None, INVALID_REQUEST, "empty batch")
+            responses = [response for response in map(self.handle, payload) if response is not None]
+            return responses or None
+        return self.handle(payload)
+
+    def handle(self, request: Any) -> dict[str, Any] | None:
+        # None for notifications, which get no response.
+        if not isinstance(request, dict) or request.get("jsonrpc") != JSONRPC_VERSION:
+            return _error_response(None, INVALID_REQUEST, "not a JSON-RPC 2.0 request")
+        request_id = request.get("id")
+        method = self.methods.get(request.get("method"))
+        params = request.get("params", {})
+        try:
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"unknown method {request.get('method')!r}")
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params must be an object")
+            try:
+                inspect.signature(method).bind(**params)
+            except TypeError as exc:
+                raise RpcError(INVALID_PARAMS, str(exc)) from None
+            with self._lock:
+                self.requests += 1
+                result = method(**params)
+        except RpcError as exc:
+            response = _error_response(request_id, exc.code, exc.message)
+        except Exception as exc:  # reported to the caller instead of killing the handler thread
+            response = _error_response(request_id, SERVER_ERROR, str(exc) or type(exc).__name__)
+        else:
+            response = {"jsonrpc": JSONRPC_VERSION, "id": request_id, "result": result}
+        return response if "id" in request else None
+
+    def _root(self, root: str | None) -> Path:
+        path = Path(root).expanduser().resolve() if root else self.default_root
+        if path not in self.roots:
+            raise RpcError(INVALID_PARAMS, f"{path} is not a root this service was started for")
+        if not path.is_dir():
+            raise RpcError(INVALID_PARAMS, f"{path} is not a directory")
+        return path
+
+    def _warm(self, root: str | None) -> tuple[WarmConfig, bool]:
+        return self.cache.get(self._root(root))
+
+    def load(self, root: str | None = None) -> dict[str, Any]:
+        warm, reloaded = self._warm(root)
+        snapshot = warm.config.snapshot
+        return {
+            "profiles": len(snapshot.keyboard_profiles),
+            "bindings": sum(
+                len(entry) for actions in warm.config.settings_actions.values() for entry in actions.values()
+            ),
+            "warnings": warm.config.warnings,
+            "reloaded": reloaded,
+        }
+
+    def validate(self, root: str | None = None) -> dict[str, Any]:
+        warm, _reloaded = self._warm(root)
+        if warm.validation is not None:
+            return warm.validation
+        diagnostics = lint_config(warm.config.snapshot, self.lint_cache)
+        items = [
+            {
+                "profile": profile_id,
+                "key": key_id,
+                "modifier": modifier,
+                "line": item.line,
+                "severity": item.severity,
+                "message": item.message,
+            }
+            for (profile_id, key_id, modifier), found in sorted(diagnostics.items())
+            for item in found
+        ]
+        warm.validation = {
+            "diagnostics": items,
+            "errors": sum(item["severity"] == SEVERITY_ERROR for item in items),
+            "warnings": warm.config.warnings,
+        }
+        return warm.validation
+
+    def compile(
+        self,
+        root: str | None = None,
+        output_format: str = DEFAULT_FORMAT,
+        compact: bool = False,
+        group: bool = True,
+        remap: bool = True,
+    ) -> dict[str, Any]:
+        if output_format not in EMITTERS:
+            raise RpcError(INVALID_PARAMS, f"unknown format {output_format!r}")
+        warm, _reloaded = self._warm(root)
+        started = time.perf_counter()
+        options = (output_format, bool(compact), bool(group), bool(remap))
+        text = warm.scripts.get(options)
+        cached = text is not None
+        if text is None:
+            text = warm.scripts[options] = _render(warm, *options)
+        return {"text": text, "cached": cached, "elapsed_ms": (time.perf_counter() - started) * 1000}
+
+    def diff(self, root: str | None = None, other: str | None = None) -> dict[str, Any]:
+        # Against another config root: the changed bindings and the script
+        # diff. Without one, against the root's last export (the path saved
+        # in its export_path.json): just the script diff.
+        warm, _reloaded = self._warm(root)
+        script = self.compile(root)["text"]
+        bindings = []
+        if other is not None:
+            other_warm, _reloaded = self._warm(other)
+            before = flatten_actions(other_warm.config.settings_actions)
+            delta = diff_bindings(before, flatten_actions(warm.config.settings_actions))
+            for binding in sorted(delta):
+                profile_id, key_id, modifier = binding
+                bindings.append(
+                    {
+                        "profile": profile_id,
+                        "key": key_id,
+                        "modifier": modifier,
+                        "before": before.get(binding),
+                        "after": delta[binding],
+                    }
+                )
+            old_script, old_name = self.compile(other)["text"], str(other)
+        else:
+            path = saved_export_path(self._root(root))
+            if path is None:
+                raise RpcError(INVALID_PARAMS, "no 'other' root given and no export path saved for this root")
+            try:
+                old_script = path.read_text(encoding="utf-8")
+            except OSError as exc:
+                raise RpcError(SERVER_ERROR, f"Couldn't read the last export {path}: {exc}") from None
+            old_name = str(path)
+        lines = difflib.unified_diff(
+            old_script.splitlines(), script.splitlines(), old_name, "compiled", lineterm=""
+        )
+        return {"bindings": bindings, "script": "\n".join(lines)}
+
+    def stats(self) -> dict[str, Any]:
+        stats = self.cache.stats
+        return {
+            "requests": self.requests,
+            "configs": len(self.cache),
+            "capacity": self.cache.capacity,
+            "hits": stats.hits,
+            "loads": stats.loads,
+            "reloads": stats.reloads,
+            "evictions": stats.evictions,
+        }
+
+
+def _render(warm: WarmConfig, output_format: str, compact: bool, group: bool, remap: bool) -> str:
+    ir = compile_snapshot_ir(
+        warm.config.snapshot,
+        fragment_cache=warm.fragment_cache,
+        group_conditions=group,
+        native_remaps=remap,
+    )
+    header = warm.config.format_headers.get(output_format)
+    if header is not None:
+        ir = replace(ir, header_lines=tuple(header))
+    return get_emitter(output_format, compact=compact).render(ir, warm.fragment_cache)
+
+
+def _error_response(request_id: Any, code: int, message: str) -> dict[str, Any]:
+    return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "error": {"code": code, "message": message}}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep one connection open across calls; with
+    # Nagle on, the separate header and body writes stall on delayed ACKs.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "ahkmate"
+    server: ServiceServer
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != JSON_CONTENT_TYPE:
+            self.rfile.read(length)
+            self.send_error(415, f"Content-Type must be {JSON_CONTENT_TYPE}")
+            return
+        response = self.server.service.handle_bytes(self.rfile.read(length))
+        data = b"" if response is None else json.dumps(response).encode("utf-8")
+        self.send_response(200 if data else 204)
+        self.send_header("Content-Type", JSON_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: CompileService) -> None:
+        super().__init__(address, _RequestHandler)
+        self.service = service
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+
+class ServiceClient:
+    # One keep-alive connection; use one client per thread.
+    def __init__(self, url: str, *, timeout: float = 30.0) -> None:
+        parts = urlsplit(url)
+        self._path = parts.path or "/"
+        self._connection = http.client.HTTPConnection(parts.hostname or "127.0.0.1", parts.port or 80, timeout=timeout)
+        self._next_id = 0
+
+    def call(self, method: str, **params: Any) -> Any:
+        self._next_id += 1
+        body = json.dumps({"jsonrpc": JSONRPC_VERSION, "method": method, "params": params, "id": self._next_id})
+        self._connection.request("POST", self._path, body, {"Content-Type": JSON_CONTENT_TYPE})
+        response = self._connection.getresponse()
+        payload = json.loads(response.read())
+        if "error" in payload:
+            raise RpcError(payload["error"]["code"], payload["error"]["message"])
+        return payload["result"]
+
+    def close(self) -> None:
+        self._connection.close()
@@ -12,13 +12,48 @@ ActionsByKey = dict[str, ActionEntry]
 ActionsByProfile = dict[str, ActionsByKey]
 
 
+SESSION_KEYS = ("last_key", "last_text", "last_modifier", "last_profile")
+
+
 @dataclass(slots=True)
-class LoadedSettings:
+class LoadedSession:
     last_key: str = ""
     last_text: str = ""
     last_modifier: str = "None"
     last_profile: str = ""
+
+
+@dataclass(slots=True)
+class LoadedSettings:
     actions_by_profile: ActionsByProfile = field(default_factory=dict)
+    # Bumped on every write so concurrent writers can tell the file moved on.
+    version: int = 0
+    # Session fields found in a pre-split combined file, used for migration.
+    legacy_session: LoadedSession | None = None
+
+
+def sanitize_modifier_entry(modifier_data: Any) -> dict[str, Any] | None:
+    if not isinstance(modifier_data, dict):
+        return None
+    action_text = modifier_data.get("action", "")
+    enabled = modifier_data.get("enabled", True)
+    if not isinstance(action_text, str):
+        return None
+    clean: dict[str, Any] = {"action": action_text.strip(), "enabled": bool(enabled)}
+    template = modifier_data.get("template")
+    if isinstance(template, str) and template.strip():
+        args = modifier_data.get("args")
+        clean["template"] = template.strip()
+        clean["args"] = (
+            {str(name): str(value) for name, value in args.items()} if isinstance(args, dict) else {}
+        )
+    if modifier_data.get("optimize") is False:
+        clean["optimize"] = False
+    elif modifier_data.get("remap") is True:
+        clean["remap"] = True
+    if not clean["action"] and "template" not in clean and clean["enabled"]:
+        return None
+    return clean
 
 
 def load_script_header(path: Path, default_lines: list[str]) -> list[str]:
@@ -34,77 +69,214 @@ def load_script_header(path: Path, default_lines: list[str]) -> list[str]:
     return header
 
 
-def load_settings(path: Path, *, modifier_options: list[str]) -> tuple[LoadedSettings, str | None]:
+def load_format_headers(path: Path) -> dict[str, list[str]]:
+    # Optional per-format headers, e.g. {"headers": {"ahk-v2": [...]}}, used
+    # instead of "header" when exporting to that format.
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    headers = data.get("headers") if isinstance(data, dict) else None
+    if not isinstance(headers, dict):
+        return {}
+    return {
+        str(name): lines
+        for name, lines in headers.items()
+        if isinstance(lines, list) and all(isinstance(line, str) for line in lines)
+    }
+
+
+def load_keyboard_profiles(
+    path: Path, fallback: list[dict[str, str]]
+) -> tuple[list[dict[str, str]], str, str | None]:
+    data: Any = {}
+    error = None
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except FileNotFoundError:
+        data = {}
+    except (OSError, json.JSONDecodeError) as exc:
+        error = f"Unable to read {path.name}:\n{exc}"
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    raw_profiles = data.get("profiles")
+    profiles = []
+    if isinstance(raw_profiles, list):
+        for entry in raw_profiles:
+            if not isinstance(entry, dict):
+                continue
+            profile_id = str(entry.get("id", "")).strip()
+            label = str(entry.get("label", "")).strip()
+            if not profile_id or not label:
+                continue
+            condition = str(entry.get("condition", "")).strip()
+            profiles.append(
+                {
+                    "id": profile_id,
+                    "label": label,
+                    "condition": condition,
+                    "device_id": str(entry.get("device_id", "")).strip(),
+                    "description": str(entry.get("description", "")).strip(),
+                    "parent": str(entry.get("parent", "") or "").strip(),
+                }
+            )
+    if not profiles:
+        profiles = [dict(profile) for profile in fallback]
+    default_profile = str(data.get("default_profile", "")).strip()
+    if default_profile not in {profile["id"] for profile in profiles}:
+        default_profile = profiles[0]["id"]
+    return profiles, default_profile, error
+
+
+def _sanitize_profile(action_data: dict[str, Any], *, modifier_options: list[str]) -> ActionsByKey:
+    cleaned: ActionsByKey = {}
+    for key, entry in action_data.items():
+        if not isinstance(key, str):
+            continue
+        modifiers: ActionEntry = {}
+        if isinstance(entry, dict):
+            for modifier_key, modifier_value in entry.items():
+                if isinstance(modifier_key, str) and modifier_key in modifier_options:
+                    clean_entry = sanitize_modifier_entry(modifier_value)
+                    if clean_entry is not None:
+                        modifiers[modifier_key] = clean_entry
+        elif isinstance(entry, str):
+            text = entry.strip()
+            if text:
+                modifiers["None"] = {"action": text, "enabled": True}
+        if modifiers:
+            cleaned[key] = modifiers
+    return cleaned
+
+
+class LazyProfiles:
+    # Raw per-profile data from the settings file. A profile is sanitized
+    # when it is first loaded, so the caller pays only for what it shows.
+    def __init__(self, raw_actions: dict[str, Any], *, modifier_options: list[str]) -> None:
+        self._raw = {
+            profile_id: action_data
+            for profile_id, action_data in raw_actions.items()
+            if isinstance(profile_id, str) and isinstance(action_data, dict)
+        }
+        self._modifier_options = modifier_options
+
+    def pending(self) -> list[str]:
+        return list(self._raw)
+
+    def load(self, profile_id: str) -> ActionsByKey | None:
+        # None for profiles that are unknown, already loaded, or have no
+        # usable bindings.
+        action_data = self._raw.pop(profile_id, None)
+        if action_data is None:
+            return None
+        return _sanitize_profile(action_data, modifier_options=self._modifier_options) or None
+
+    def load_into(self, actions_by_profile: ActionsByProfile, profile_ids: list[str] | None = None) -> None:
+        for profile_id in self.pending() if profile_ids is None else profile_ids:
+            cleaned = self.load(profile_id)
+            if cleaned is not None:
+                actions_by_profile[profile_id] = cleaned
+
+
+def load_settings_lazy(
+    path: Path, *, modifier_options: list[str]
+) -> tuple[LoadedSettings, LazyProfiles, str | None]:
+    # Like load_settings, but actions_by_profile is left empty and the
+    # profiles are handed back unsanitized.
     settings = LoadedSettings()
     if not path.exists():
-        return settings, None
+        return settings, LazyProfiles({}, modifier_options=modifier_options), None
 
     try:
         with open(path, "r", encoding="utf-8") as handle:
             data = json.load(handle)
     except (OSError, json.JSONDecodeError) as exc:
-        return settings, f"Unable to read {path.name}:\n{exc}"
+        return settings, LazyProfiles({}, modifier_options=modifier_options), f"Unable to read {path.name}:\n{exc}"
 
-    settings.last_key = str(data.get("last_key", "") or "")
-    last_text = data.get("last_text")
-    settings.last_text = last_text if isinstance(last_text, str) else ""
+    if not isinstance(data, dict):
+        return (
+            settings,
+            LazyProfiles({}, modifier_options=modifier_options),
+            f"Unable to read {path.name}:\nexpected a JSON object",
+        )
 
-    settings.last_modifier = str(data.get("last_modifier", "None") or "None")
-    if settings.last_modifier not in modifier_options:
-        settings.last_modifier = "None"
+    version = data.get("version", 0)
+    settings.version = version if isinstance(version, int) and not isinstance(version, bool) else 0
 
-    settings.last_profile = str(data.get("last_profile", "") or "")
+    if any(name in data for name in SESSION_KEYS):
+        settings.legacy_session = _parse_session(data, modifier_options=modifier_options)
 
     raw_actions = data.get("actions", {})
-    sanitized: ActionsByProfile = {}
-    if isinstance(raw_actions, dict):
-        for profile_id, action_data in raw_actions.items():
-            if not isinstance(profile_id, str) or not isinstance(action_data, dict):
-                continue
-            cleaned: ActionsByKey = {}
-            for key, entry in action_data.items():
-                if not isinstance(key, str):
-                    continue
-                modifiers: ActionEntry = {}
-                if isinstance(entry, dict):
-                    for modifier_key, modifier_value in entry.items():
-                        if (
-                            isinstance(modifier_key, str)
-                            and modifier_key in modifier_options
-                            and isinstance(modifier_value, dict)
-                        ):
-                            action_text = modifier_value.get("action", "")
-                            enabled = modifier_value.get("enabled", True)
-                            if isinstance(action_text, str):
-                                text = action_text.strip()
-                                if text or not enabled:
-                                    modifiers[modifier_key] = {
-                                        "action": text,
-                                        "enabled": bool(enabled),
-                                    }
-                elif isinstance(entry, str):
-                    text = entry.strip()
-                    if text:
-                        modifiers["None"] = {"action": text, "enabled": True}
-                if modifiers:
-                    cleaned[key] = modifiers
-            if cleaned:
-                sanitized[profile_id] = cleaned
-
-    settings.actions_by_profile = sanitized
-    return settings, None
+    profiles = LazyProfiles(raw_actions if isinstance(raw_actions, dict) else {}, modifier_options=modifier_options)
+    return settings, profiles, None
 
 
-def save_settings(
+def load_settings(path: Path, *, modifier_options: list[str]) -> tuple[LoadedSettings, str | None]:
+    settings, profiles, error = load_settings_lazy(path, modifier_options=modifier_options)
+    profiles.load_into(settings.actions_by_profile)
+    return settings, error
+
+
+def _parse_session(data: dict[str, Any], *, modifier_options: list[str]) -> LoadedSession:
+    session = LoadedSession()
+    session.last_key = str(data.get("last_key", "") or "")
+    last_text = data.get("last_text")
+    session.last_text = last_text if isinstance(last_text, str) else ""
+
+    session.last_modifier = str(data.get("last_modifier", "None") or "None")
+    if session.last_modifier not in modifier_options:
+        session.last_modifier = "None"
+
+    session.last_profile = str(data.get("last_profile", "") or "")
+    return session
+
+
+def load_session(path: Path, *, modifier_options: list[str]) -> tuple[LoadedSession | None, str | None]:
+    if not path.exists():
+        return None, None
+
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, json.JSONDecodeError) as exc:
+        return None, f"Unable to read {path.name}:\n{exc}"
+    if not isinstance(data, dict):
+        return None, None
+    return _parse_session(data, modifier_options=modifier_options), None
+
+
+def _write_json_atomic(path: Path, payload: Any, *, indent: int | None = 2) -> str | None:
+    temp_path = path.with_suffix(".tmp")
+    try:
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=indent, sort_keys=True)
+        os.replace(temp_path, path)
+    except OSError as exc:
+        return str(exc)
+    return None
+
+
+def save_session(
     path: Path,
     *,
-    actions_by_profile: ActionsByProfile,
     last_key: str,
     last_profile: str,
     last_text: str,
     last_modifier: str,
-    modifier_options: list[str],
 ) -> str | None:
+    payload = {
+        "last_key": last_key,
+        "last_profile": last_profile,
+        "last_text": last_text,
+        "last_modifier": last_modifier,
+    }
+    return _write_json_atomic(path, payload)
+
+
+def sanitize_actions(actions_by_profile: ActionsByProfile, *, modifier_options: list[str]) -> ActionsByProfile:
     clean_actions: ActionsByProfile = {}
     for profile_id, actions in actions_by_profile.items():
         if not isinstance(profile_id, str) or not isinstance(actions, dict):
@@ -115,38 +287,24 @@ def save_settings(
                 continue
             trimmed: ActionEntry = {}
             for modifier, modifier_data in entry.items():
-                if (
-                    isinstance(modifier, str)
-                    and modifier in modifier_options
-                    and isinstance(modifier_data, dict)
-                ):
-                    action_text = modifier_data.get("action", "")
-                    enabled = modifier_data.get("enabled", True)
-                    if not isinstance(action_text, str):
-                        continue
-                    text = action_text.strip()
-                    if not text and enabled:
-                        continue
-                    trimmed[modifier] = {"action": text, "enabled": bool(enabled)}
+                if isinstance(modifier, str) and modifier in modifier_options:
+                    clean_entry = sanitize_modifier_entry(modifier_data)
+                    if clean_entry is not None:
+                        trimmed[modifier] = clean_entry
             if trimmed:
                 cleaned[key] = trimmed
         if cleaned:
             clean_actions[profile_id] = cleaned
+    return clean_actions
 
-    payload = {
-        "actions": clean_actions,
-        "last_key": last_key,
-        "last_profile": last_profile,
-        "last_text": last_text,
-        "last_modifier": last_modifier,
-    }
 
-    temp_path = path.with_suffix(".tmp")
-    try:
-        with open(temp_path, "w", encoding="utf-8") as handle:
-            json.dump(payload, handle, indent=2, sort_keys=True)
-        os.replace(temp_path, path)
-    except OSError as exc:
-        return str(exc)
-    return None
+def save_settings(
+    path: Path,
+    *,
+    actions_by_profile: ActionsByProfile,
+    modifier_options: list[str],
+    version: int = 0,
+) -> str | None:
+    clean_actions = sanitize_actions(actions_by_profile, modifier_options=modifier_options)
+    return _write_json_atomic(path, {"actions": clean_actions, "version": version})
 
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import random
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+
+from .compile_worker import CompileSnapshot, compile_snapshot_ir
+from .hotstrings import is_hotstring
+from .script_ir import OPTIMIZED_REMAP, FragmentCache, ScriptIR
+
+
+OUTCOME_HOTKEY = "hotkey"
+OUTCOME_SEQUENCE = "sequence"
+# A key the sequence machine took without finishing a sequence.
+OUTCOME_SEQUENCE_STEP = "sequence-step"
+# Replay result for a keystroke no hotkey takes, so the key goes through.
+NO_MATCH = -1
+STEP_SEPARATOR = "+"
+TIME_SEPARATOR = "@"
+
+
+@dataclass(frozen=True, slots=True)
+class Outcome:
+    kind: str
+    # The hotkey, or for sequences the function the script calls.
+    hotkey: str
+    profile_id: str
+    condition: str
+    body: tuple[str, ...]
+    # "remap" or "send-input" when the remap pass rewrote the binding.
+    optimized: str = ""
+
+    def format(self) -> str:
+        where = f"{self.profile_id} under '{self.condition}'" if self.condition else self.profile_id
+        first = self.body[0] if self.body else ""
+        more = f" (+{len(self.body) - 1} line(s))" if len(self.body) > 1 else ""
+        via = f" [{self.optimized}]" if self.optimized else ""
+        return f"{where}: {self.hotkey}{via} {first}{more}".rstrip()
+
+
+@dataclass(frozen=True, slots=True)
+class _Machine:
+    bit: int
+    # (state, hotkey) -> next state
+    transitions: Mapping[tuple[int, str], int]
+    # accepting state -> outcome index
+    accepting: Mapping[int, int]
+    timeout_ms: int
+    step: int
+
+
+class Simulator:
+    # Resolves keystrokes the way the compiled script does. A keystroke is
+    # encoded as one int (key, modifier mask); for every combination of
+    # active conditions and pending sequences there is one dict from those
+    # ints to the outcome, built the first time the combination comes up.
+    # Within a table AutoHotkey's rule applies: the first #if variant in
+    # script order whose condition holds, else the unconditional one.
+    def __init__(
+        self,
+        ir: ScriptIR,
+        *,
+        owners: Mapping[tuple[str, str], str],
+        profile_conditions: Mapping[str, str],
+        key_name_overrides: Mapping[str, str],
+        modifier_prefix: Mapping[str, str],
+    ) -> None:
+        self.outcomes: list[Outcome] = []
+        self._key_name_overrides = key_name_overrides
+        self._modifier_bits = {name: 1 << index for index, name in enumerate(modifier_prefix)}
+        self._mask_width = len(modifier_prefix)
+        self._keys: dict[str, int] = {}
+        self._profile_conditions = dict(profile_conditions)
+        # The unconditional "condition" is always active.
+        self._condition_bits: dict[str, int] = {"": 1}
+        # code -> (condition bit, machine bit, value) in script order
+        self._variants: dict[int, list[tuple[int, int, int]]] = {}
+        self._fallback: dict[int, int] = {}
+        self._machines: list[_Machine] = []
+        # Table values below NO_MATCH index this list: (machine, hotkey).
+        self._dispatch: list[tuple[_Machine, str]] = []
+        self._tables: dict[tuple[int, int], dict[int, int]] = {}
+
+        machines: dict[str, _Machine] = {}
+        machine_conditions: dict[str, str] = {}
+        for profile in ir.profiles:
+            machine = profile.machine
+            if machine is None:
+                continue
+            machine_conditions[machine.name] = profile.condition
+            accepting = {
+                state: self._add_outcome(
+                    Outcome(OUTCOME_SEQUENCE, f"{machine.name}_{state}", profile.profile_id, profile.condition, body)
+                )
+                for state, body in machine.accepting
+            }
+            step = self._add_outcome(
+                Outcome(OUTCOME_SEQUENCE_STEP, machine.name, profile.profile_id, profile.condition, ())
+            )
+            machines[machine.name] = _Machine(
+                bit=1 << len(machines),
+                transitions={(state, hotkey): target for state, hotkey, target in machine.transitions},
+                accepting=accepting,
+                timeout_ms=machine.timeout_ms,
+                step=step,
+            )
+        self._machines = list(machines.values())
+
+        for profile in ir.profiles:
+            condition_bit = self._condition_bit(profile.condition)
+            pending = machines.get(profile.pending_on)
+            if pending is not None:
+                # The block's condition is "(base) && Machine()", with the
+                # base taken from the block that owns the machine.
+                condition_bit = self._condition_bit(machine_conditions[profile.pending_on])
+            for binding in profile.bindings:
+                if is_hotstring(binding.key_id):
+                    continue
+                key_name = binding.hotkey[len(modifier_prefix.get(binding.modifier, "")) :]
+                key_code = self._key_code(key_name)
+                if binding.pass_through:
+                    # The key goes through even when an unconditional
+                    # variant exists.
+                    value = NO_MATCH
+                elif binding.dispatch:
+                    value = NO_MATCH - 1 - len(self._dispatch)
+                    self._dispatch.append((machines[binding.dispatch], binding.hotkey))
+                else:
+                    owner = owners.get((profile.condition, binding.hotkey), profile.profile_id)
+                    value = self._add_outcome(
+                        Outcome(
+                            OUTCOME_HOTKEY, binding.hotkey, owner, profile.condition, binding.body, binding.optimized
+                        )
+                    )
+                if binding.optimized == OPTIMIZED_REMAP:
+                    # A remap fires whatever modifiers are held.
+                    codes = [key_code | mask for mask in range(1 << self._mask_width)]
+                else:
+                    codes = [key_code | self._modifier_bits.get(binding.modifier, 0)]
+                for code in codes:
+                    if profile.condition:
+                        machine_bit = pending.bit if pending is not None else 0
+                        self._variants.setdefault(code, []).append((condition_bit, machine_bit, value))
+                    else:
+                        self._fallback.setdefault(code, value)
+
+    def _add_outcome(self, outcome: Outcome) -> int:
+        self.outcomes.append(outcome)
+        return len(self.outcomes) - 1
+
+    def _condition_bit(self, condition: str) -> int:
+        bit = self._condition_bits.get(condition)
+        if bit is None:
+            bit = self._condition_bits[condition] = 1 << len(self._condition_bits)
+        return bit
+
+    def _key_code(self, key_name: str) -> int:
+        index = self._keys.setdefault(key_name.casefold(), len(self._keys))
+        return index << self._mask_width
+
+    def encode(self, token: str) -> int | None:
+        # "a", "Ctrl+\\", "Ctrl+Shift+f1": key ids as in the keyboard view
+        # with any number of modifiers. None if the token doesn't parse.
+        modifiers, _separator, key_id = token.rpartition(STEP_SEPARATOR)
+        if not key_id:
+            return None
+        mask = 0
+        for modifier in filter(None, modifiers.split(STEP_SEPARATOR)):
+            bit = self._modifier_bits.get(modifier)
+            if bit is None:
+                return None
+            mask |= bit
+        key_id = key_id.lower()
+        return self._key_code(self._key_name_overrides.get(key_id, key_id.upper())) | mask
+
+    def encode_stream(self, tokens: Iterable[str]) -> tuple[list[int], list[int] | None, list[str]]:
+        # Tokens may carry a time in ms, "Ctrl+x@1200"; the times are used
+        # only when every token has one. Returns the tokens that don't parse.
+        codes: list[int] = []
+        times: list[int] | None = []
+        bad: list[str] = []
+        for token in tokens:
+            text, separator, stamp = token.rpartition(TIME_SEPARATOR)
+            if not separator or not stamp.isdigit():
+                text, stamp = token, ""
+            code = self.encode(text)
+            if code is None:
+                bad.append(token)
+                continue
+            codes.append(code)
+            if times is not None and stamp:
+                times.append(int(stamp))
+            else:
+                times = None
+        return codes, times, bad
+
+    def active_bits(self, profile_ids: Iterable[str]) -> int:
+        bits = 1
+        for profile_id in profile_ids:
+            bits |= self._condition_bits.get(self._profile_conditions.get(profile_id, ""), 0)
+        return bits
+
+    def codes(self) -> list[int]:
+        # Every keystroke some hotkey is defined for.
+        return sorted(set(self._variants) | set(self._fallback))
+
+    def sample(self, count: int, *, seed: int = 0, miss_ratio: float = 0.1) -> list[int]:
+        # A random stream over the bound keystrokes, with some share of
+        # keystrokes nothing is bound to.
+        generator = random.Random(seed)
+        bound = self.codes()
+        unbound = self._key_code("\x00unbound")
+        if not bound:
+            return [unbound] * count
+        return [
+            unbound if generator.random() < miss_ratio else code for code in generator.choices(bound, k=count)
+        ]
+
+    def table(self, active: int, pending: int = 0) -> dict[int, int]:
+        table = self._tables.get((active, pending))
+        if table is not None:
+            return table
+        table = {}
+        for code, variants in self._variants.items():
+            for condition_bit, machine_bit, value in variants:
+                if active & condition_bit and (not machine_bit or pending & machine_bit):
+                    table[code] = value
+                    break
+        for code, value in self._fallback.items():
+            table.setdefault(code, value)
+        self._tables[(active, pending)] = table
+        return table
+
+    def candidates(self, code: int) -> list[int]:
+        # Every definition of the keystroke in precedence order; dispatching
+        # hotkeys show up as their machine's step outcome, pass-through
+        # variants as NO_MATCH.
+        values = [value for _condition, _machine, value in self._variants.get(code, ())]
+        if code in self._fallback:
+            values.append(self._fallback[code])
+        return [value if value >= NO_MATCH else self._dispatch[NO_MATCH - 1 - value][0].step for value in values]
+
+    def replay(self, codes: Sequence[int], active: int, times: Sequence[int] | None = None) -> list[int]:
+        # Outcome index per keystroke, or NO_MATCH. Without times a pending
+        # sequence never times out.
+        table = self.table(active)
+        if not self._machines:
+            get = table.get
+            return [get(code, NO_MATCH) for code in codes]
+        states = {machine.bit: 0 for machine in self._machines}
+        deadlines = dict.fromkeys(states, 0)
+        pending = 0
+        results: list[int] = []
+        append = results.append
+        for position, code in enumerate(codes):
+            if pending and times is not None:
+                expired = sum(bit for bit in states if pending & bit and deadlines[bit] <= times[position])
+                if expired:
+                    for bit in states:
+                        if expired & bit:
+                            states[bit] = 0
+                    pending &= ~expired
+                    table = self.table(active, pending)
+            value = table.get(code, NO_MATCH)
+            if value < NO_MATCH:
+                machine, hotkey = self._dispatch[NO_MATCH - 1 - value]
+                value, state = self._step(machine, states[machine.bit], hotkey)
+                states[machine.bit] = state
+                if state:
+                    pending |= machine.bit
+                    if times is not None:
+                        deadlines[machine.bit] = times[position] + machine.timeout_ms
+                else:
+                    pending &= ~machine.bit
+                table = self.table(active, pending)
+            append(value)
+        return results
+
+    def _step(self, machine: _Machine, state: int, hotkey: str) -> tuple[int, int]:
+        # Mirrors the generated dispatch function: a key that doesn't
+        # continue the sequence may start a new one, anything else resets.
+        target = machine.transitions.get((state, hotkey))
+        if target is None and state:
+            target = machine.transitions.get((0, hotkey))
+        if target is None:
+            return machine.step, 0
+        if target in machine.accepting:
+            return machine.accepting[target], 0
+        return machine.step, target
+
+
+def build_simulator(
+    snapshot: CompileSnapshot, *, group_conditions: bool = True, native_remaps: bool = True
+) -> Simulator:
+    fragment_cache = FragmentCache()
+    ir = compile_snapshot_ir(
+        snapshot, fragment_cache=fragment_cache, group_conditions=group_conditions, native_remaps=native_remaps
+    )
+    # Grouped blocks carry the first member's id; bindings are credited to
+    # the profile that defines them, the first one for a repeated hotkey.
+    source = compile_snapshot_ir(
+        snapshot, fragment_cache=fragment_cache, group_conditions=False, native_remaps=False, lower_key_sequences=False
+    )
+    owners: dict[tuple[str, str], str] = {}
+    for profile in source.profiles:
+        for binding in profile.bindings:
+            owners.setdefault((profile.condition, binding.hotkey), profile.profile_id)
+    return Simulator(
+        ir,
+        owners=owners,
+        profile_conditions={
+            str(profile.get("id", "")): str(profile.get("condition", "")).strip()
+            for profile in snapshot.keyboard_profiles
+        },
+        key_name_overrides=snapshot.key_name_overrides,
+        modifier_prefix=snapshot.modifier_prefix,
+    )
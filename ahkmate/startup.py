@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .settings_io import (
+    LazyProfiles,
+    LoadedSession,
+    LoadedSettings,
+    load_keyboard_profiles,
+    load_script_header,
+    load_session,
+    load_settings_lazy,
+)
+from .templates import ActionTemplate, load_templates
+
+
+@dataclass(slots=True)
+class StartupFiles:
+    keyboard_profiles: list[dict[str, str]]
+    default_profile: str
+    keyboard_error: str | None
+    header_lines: list[str]
+    settings: LoadedSettings
+    pending_profiles: LazyProfiles
+    settings_error: str | None
+    session: LoadedSession | None
+    session_error: str | None
+    templates: dict[str, ActionTemplate] = field(default_factory=dict)
+    templates_error: str | None = None
+
+
+def load_startup_files(
+    *,
+    keyboards_path: Path,
+    header_path: Path,
+    settings_path: Path,
+    session_path: Path,
+    templates_path: Path,
+    fallback_profiles: list[dict[str, str]],
+    default_header_lines: list[str],
+    modifier_options: list[str],
+) -> StartupFiles:
+    # The files are independent, so they are read side by side; errors are
+    # returned for the caller to report on the UI thread.
+    with ThreadPoolExecutor(max_workers=5, thread_name_prefix="ahkmate-load") as pool:
+        keyboards = pool.submit(load_keyboard_profiles, keyboards_path, fallback_profiles)
+        header = pool.submit(load_script_header, header_path, default_header_lines)
+        settings = pool.submit(load_settings_lazy, settings_path, modifier_options=modifier_options)
+        session = pool.submit(load_session, session_path, modifier_options=modifier_options)
+        templates = pool.submit(load_templates, templates_path)
+        profiles, default_profile, keyboard_error = keyboards.result()
+        loaded_settings, pending_profiles, settings_error = settings.result()
+        loaded_session, session_error = session.result()
+        loaded_templates, templates_error = templates.result()
+        return StartupFiles(
+            keyboard_profiles=profiles,
+            default_profile=default_profile,
+            keyboard_error=keyboard_error,
+            header_lines=header.result(),
+            settings=loaded_settings,
+            pending_profiles=pending_profiles,
+            settings_error=settings_error,
+            session=loaded_session,
+            session_error=session_error,
+            templates=loaded_templates,
+            templates_error=templates_error,
+        )
+
+
+class StartupTimer:
+    def __init__(self, clock: Callable[[], float]) -> None:
+        self._clock = clock
+        self._started = clock()
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> float:
+        elapsed_ms = (self._clock() - self._started) * 1000
+        self.phases.append((phase, elapsed_ms))
+        return elapsed_ms
+
+    def report(self) -> str:
+        return ", ".join(f"{name} {elapsed_ms:.0f} ms" for name, elapsed_ms in self.phases)
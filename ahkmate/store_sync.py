@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import os
+import secrets
+import time
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .settings_io import (
+    ActionsByProfile,
+    LoadedSettings,
+    load_settings,
+    sanitize_actions,
+    save_settings,
+)
+
+
+BindingKey = tuple[str, str, str]
+FlatBindings = dict[BindingKey, dict[str, Any]]
+BindingDelta = dict[BindingKey, "dict[str, Any] | None"]
+
+LOCK_TIMEOUT_SECONDS = 5.0
+STALE_LOCK_SECONDS = 30.0
+LOCK_POLL_SECONDS = 0.05
+
+
+@dataclass(frozen=True, slots=True)
+class MergeConflict:
+    binding: BindingKey
+    ours: dict[str, Any] | None
+    theirs: dict[str, Any] | None
+
+    def describe(self) -> str:
+        profile_id, key_id, modifier = self.binding
+        return f"{profile_id} / {key_id} / {modifier}"
+
+
+@dataclass(slots=True)
+class CommitResult:
+    settings: LoadedSettings
+    # Changes made by other writers that the caller still has to apply.
+    incoming: BindingDelta = field(default_factory=dict)
+    conflicts: list[MergeConflict] = field(default_factory=list)
+
+
+@contextmanager
+def file_lock(path: Path, *, timeout: float = LOCK_TIMEOUT_SECONDS) -> Iterator[None]:
+    lock_path = path.with_name(f"{path.name}.lock")
+    # What the lock file holds while it is ours; the token tells apart
+    # writers in one process.
+    owner = f"{os.getpid()} {secrets.token_hex(8)}\n"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > STALE_LOCK_SECONDS:
+                    _break_stale_lock(lock_path, owner)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{lock_path.name} is held by another writer") from None
+            time.sleep(LOCK_POLL_SECONDS)
+            continue
+        break
+    try:
+        os.write(fd, owner.encode("ascii"))
+        os.close(fd)
+        yield
+    finally:
+        try:
+            with open(lock_path, "r", encoding="ascii") as handle:
+                ours = handle.read() == owner
+            # A writer that took the lock over as stale owns it now.
+            if ours:
+                lock_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _break_stale_lock(lock_path: Path, owner: str) -> None:
+    # Renaming is atomic, so only one writer takes a given lock file away.
+    # Another writer may have replaced the stale lock since it was checked,
+    # so the taken file is checked again and put back if it is live.
+    taken = lock_path.with_name(f"{lock_path.name}.{owner.split()[1]}")
+    os.rename(lock_path, taken)
+    try:
+        if time.time() - taken.stat().st_mtime <= STALE_LOCK_SECONDS:
+            try:
+                os.link(taken, lock_path)
+            except FileExistsError:
+                pass
+    finally:
+        taken.unlink()
+
+
+def flatten_actions(actions_by_profile: Mapping[str, Any]) -> FlatBindings:
+    flat: FlatBindings = {}
+    for profile_id, actions in actions_by_profile.items():
+        if not isinstance(actions, dict):
+            continue
+        for key_id, entry in actions.items():
+            if not isinstance(entry, dict):
+                continue
+            for modifier, modifier_data in entry.items():
+                if isinstance(modifier_data, dict):
+                    flat[(profile_id, key_id, modifier)] = modifier_data
+    return flat
+
+
+def diff_bindings(before: FlatBindings, after: FlatBindings) -> BindingDelta:
+    delta: BindingDelta = {}
+    for binding, value in after.items():
+        if before.get(binding) != value:
+            delta[binding] = value
+    for binding in before.keys() - after.keys():
+        delta[binding] = None
+    return delta
+
+
+def apply_delta(actions_by_profile: ActionsByProfile, delta: BindingDelta) -> set[str]:
+    touched: set[str] = set()
+    for (profile_id, key_id, modifier), value in delta.items():
+        touched.add(profile_id)
+        if value is not None:
+            actions_by_profile.setdefault(profile_id, {}).setdefault(key_id, {})[modifier] = dict(value)
+            continue
+        profile_actions = actions_by_profile.get(profile_id, {})
+        entry = profile_actions.get(key_id, {})
+        entry.pop(modifier, None)
+        if not entry:
+            profile_actions.pop(key_id, None)
+        if not profile_actions:
+            actions_by_profile.pop(profile_id, None)
+    return touched
+
+
+def merge_deltas(ours: BindingDelta, theirs: BindingDelta) -> tuple[BindingDelta, list[MergeConflict]]:
+    # Our edits win; their edits to other bindings are kept. A binding both
+    # sides changed to different values is reported as a conflict.
+    incoming: BindingDelta = {}
+    conflicts: list[MergeConflict] = []
+    for binding, value in theirs.items():
+        if binding not in ours:
+            incoming[binding] = value
+        elif ours[binding] != value:
+            conflicts.append(MergeConflict(binding, ours[binding], value))
+    return incoming, conflicts
+
+
+def copy_actions(actions_by_profile: Mapping[str, Any]) -> ActionsByProfile:
+    return {
+        profile_id: {
+            key_id: {modifier: dict(data) for modifier, data in entry.items()}
+            for key_id, entry in actions.items()
+        }
+        for profile_id, actions in actions_by_profile.items()
+    }
+
+
+def commit_settings(
+    path: Path,
+    *,
+    base: LoadedSettings,
+    actions_by_profile: ActionsByProfile,
+    modifier_options: list[str],
+) -> tuple[CommitResult | None, str | None]:
+    ours = sanitize_actions(actions_by_profile, modifier_options=modifier_options)
+    try:
+        with file_lock(path):
+            disk, error = load_settings(path, modifier_options=modifier_options)
+            if error:
+                return None, error
+            incoming: BindingDelta = {}
+            conflicts: list[MergeConflict] = []
+            merged = ours
+            # Files written by tools that don't stamp a version are compared
+            # by content instead.
+            changed_underneath = path.exists() and (
+                disk.version != base.version
+                or (not disk.version and disk.actions_by_profile != base.actions_by_profile)
+            )
+            if changed_underneath:
+                base_flat = flatten_actions(base.actions_by_profile)
+                their_delta = diff_bindings(base_flat, flatten_actions(disk.actions_by_profile))
+                our_delta = diff_bindings(base_flat, flatten_actions(ours))
+                incoming, conflicts = merge_deltas(our_delta, their_delta)
+                merged = copy_actions(ours)
+                apply_delta(merged, incoming)
+            version = max(disk.version, base.version) + 1
+            error = save_settings(path, actions_by_profile=merged, modifier_options=modifier_options, version=version)
+            if error:
+                return None, error
+    except OSError as exc:
+        return None, str(exc)
+    committed = LoadedSettings(actions_by_profile=copy_actions(merged), version=version)
+    return CommitResult(settings=committed, incoming=incoming, conflicts=conflicts), None
+
+
+def pull_settings(
+    path: Path,
+    *,
+    base: LoadedSettings,
+    actions_by_profile: ActionsByProfile,
+    modifier_options: list[str],
+) -> tuple[CommitResult | None, str | None]:
+    disk, error = load_settings(path, modifier_options=modifier_options)
+    if error:
+        return None, error
+    if disk.version == base.version and disk.actions_by_profile == base.actions_by_profile:
+        return CommitResult(settings=base), None
+    base_flat = flatten_actions(base.actions_by_profile)
+    their_delta = diff_bindings(base_flat, flatten_actions(disk.actions_by_profile))
+    our_delta = diff_bindings(
+        base_flat, flatten_actions(sanitize_actions(actions_by_profile, modifier_options=modifier_options))
+    )
+    incoming, conflicts = merge_deltas(our_delta, their_delta)
+    pulled = LoadedSettings(actions_by_profile=disk.actions_by_profile, version=disk.version)
+    if conflicts:
+        # Conflicting bindings keep their base values, and the base its
+        # version, so the next commit still sees their edits and reports them.
+        pulled = LoadedSettings(actions_by_profile=copy_actions(disk.actions_by_profile), version=base.version)
+        kept = {conflict.binding: base_flat.get(conflict.binding) for conflict in conflicts}
+        apply_delta(pulled.actions_by_profile, kept)
+    return CommitResult(settings=pulled, incoming=incoming, conflicts=conflicts), None
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import shlex
+import string
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+TEMPLATE_CALL_PATTERN = re.compile(r"^@(?P<name>[A-Za-z_][\w.-]*)(?:\s+(?P<args>.*))?$")
+
+
+@dataclass(frozen=True, slots=True)
+class ActionTemplate:
+    name: str
+    body: str
+    description: str
+    params: tuple[str, ...]
+    digest: str
+
+
+def make_template(name: str, body: str, description: str = "") -> ActionTemplate:
+    template = string.Template(body)
+    params = tuple(dict.fromkeys(template.get_identifiers()))
+    digest = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    return ActionTemplate(name=name, body=body, description=description, params=params, digest=digest)
+
+
+def load_templates(path: Path) -> tuple[dict[str, ActionTemplate], str | None]:
+    if not path.exists():
+        return {}, None
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except (OSError, json.JSONDecodeError) as exc:
+        return {}, f"Unable to read {path.name}:\n{exc}"
+
+    raw_templates = data.get("templates") if isinstance(data, dict) else None
+    templates: dict[str, ActionTemplate] = {}
+    if isinstance(raw_templates, dict):
+        for name, entry in raw_templates.items():
+            if not isinstance(name, str) or not name.strip():
+                continue
+            if isinstance(entry, str):
+                entry = {"body": entry}
+            if not isinstance(entry, dict) or not isinstance(entry.get("body"), str):
+                continue
+            description = entry.get("description", "")
+            templates[name.strip()] = make_template(
+                name.strip(),
+                entry["body"].strip(),
+                description if isinstance(description, str) else "",
+            )
+    return templates, None
+
+
+def parse_template_call(text: str) -> tuple[str, dict[str, str]] | None:
+    match = TEMPLATE_CALL_PATTERN.match(text.strip())
+    if not match:
+        return None
+    try:
+        tokens = shlex.split(match.group("args") or "")
+    except ValueError:
+        return None
+    args: dict[str, str] = {}
+    for token in tokens:
+        name, sep, value = token.partition("=")
+        if not sep or not name:
+            return None
+        args[name] = value
+    return match.group("name"), args
+
+
+def format_template_call(name: str, args: Mapping[str, str]) -> str:
+    parts = [f"@{name}"]
+    parts.extend(f"{key}={shlex.quote(value)}" for key, value in args.items())
+    return " ".join(parts)
+
+
+class TemplateExpander:
+    def __init__(self, templates: Mapping[str, ActionTemplate] | None = None) -> None:
+        self.templates: dict[str, ActionTemplate] = dict(templates or {})
+        self._cache: dict[tuple[str, tuple[tuple[str, str], ...]], str] = {}
+        self._lock = threading.Lock()
+
+    def set_templates(self, templates: Mapping[str, ActionTemplate]) -> set[str]:
+        changed = {
+            name
+            for name in set(self.templates) | set(templates)
+            if getattr(self.templates.get(name), "digest", None) != getattr(templates.get(name), "digest", None)
+        }
+        live_digests = {template.digest for template in templates.values()}
+        with self._lock:
+            self.templates = dict(templates)
+            self._cache = {key: value for key, value in self._cache.items() if key[0] in live_digests}
+        return changed
+
+    def expand(
+        self,
+        name: str,
+        args: Mapping[str, str],
+        templates: Mapping[str, ActionTemplate] | None = None,
+    ) -> str | None:
+        template = (self.templates if templates is None else templates).get(name)
+        if template is None:
+            return None
+        # Keyed by the body digest, so an edited template misses the cache
+        # while every other template keeps its expansions.
+        key = (template.digest, tuple(sorted(args.items())))
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = string.Template(template.body).safe_substitute(args).strip()
+            with self._lock:
+                self._cache[key] = cached
+        return cached
+
+
+def template_dependents(actions_by_profile: Mapping[str, Any], names: set[str]) -> set[str]:
+    profiles: set[str] = set()
+    for profile_id, actions in actions_by_profile.items():
+        if not isinstance(actions, dict):
+            continue
+        for entry in actions.values():
+            if isinstance(entry, dict) and any(
+                isinstance(data, dict) and data.get("template") in names for data in entry.values()
+            ):
+                profiles.add(profile_id)
+                break
+    return profiles
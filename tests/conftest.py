@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import tkinter as tk
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def display():
+    try:
+        probe = tk.Tk()
+    except tk.TclError as exc:
+        pytest.skip(f"no display: {exc}")
+    probe.destroy()
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import json
+
+from ahkmate.app import AHKBuilder
+from ahkmate.constants import MODIFIER_OPTIONS
+from ahkmate.settings_io import save_settings
+
+
+def test_switching_profiles_is_remembered_for_the_next_start(display, tmp_path):
+    profiles = [
+        {"id": "default", "label": "Default", "condition": ""},
+        {"id": "other", "label": "Other", "condition": "cm1.IsActive"},
+    ]
+    (tmp_path / "keyboards.json").write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    app = AHKBuilder(root=tmp_path)
+    try:
+        app._select_profile("other")
+    finally:
+        app.worker.close()
+        app.destroy()
+    session = json.loads((tmp_path / "session.json").read_text(encoding="utf-8"))
+    assert session["last_profile"] == "other"
+
+
+def test_hotstrings_merged_in_by_a_save_reach_the_index(display, tmp_path):
+    (tmp_path / "keyboards.json").write_text(
+        json.dumps({"profiles": [{"id": "default", "label": "Default", "condition": ""}]}), encoding="utf-8"
+    )
+    app = AHKBuilder(root=tmp_path)
+    try:
+        app._hotstrings()
+        theirs = {"default": {"::btw": {"None": {"action": "by the way", "enabled": True}}}}
+        save_settings(app.settings_path, actions_by_profile=theirs, modifier_options=MODIFIER_OPTIONS, version=7)
+        app._save_settings()
+        assert [entry.key_id for entry in app._hotstrings().search("default", "bt")] == ["::btw"]
+    finally:
+        app.worker.close()
+        app.destroy()
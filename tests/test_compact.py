@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from ahkmate.cli import main
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_compact_output_reads_back_like_the_normal_output_for_the_shipped_config():
+    assert main(["--root", str(REPO_ROOT), "compact-check"]) == 0
+
+
+def test_compact_output_reads_back_multi_line_bodies_hotstrings_and_sequences(tmp_path):
+    profiles = [
+        {"id": "default", "label": "Default", "condition": ""},
+        {"id": "editor", "label": "Editor", "condition": "WinActive(\"ahk_exe code.exe\")"},
+        {"id": "same", "label": "Same", "condition": "WinActive(\"ahk_exe code.exe\")"},
+    ]
+    actions = {
+        "default": {
+            "a": {"None": {"action": "Send x", "enabled": True}, "Ctrl": {"action": "Send ^c", "enabled": True}},
+            "f1": {"None": {"action": "if (x) {\n    MsgBox hi\n}\nSetTimer, Tip, -500\nreturn", "enabled": True}},
+            ":*:btw": {"None": {"action": "by the way", "enabled": True}},
+            "capslock g s": {"None": {"action": "Run git status", "enabled": True}},
+        },
+        "editor": {
+            "b": {"Alt": {"action": "Send {Home}\nSend +{End}", "enabled": True}},
+            "capslock g l": {"None": {"action": "Run git log", "enabled": True}},
+        },
+        "same": {"c": {"None": {"action": "Run calc.exe", "enabled": True}}},
+    }
+    (tmp_path / "keyboards.json").write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    (tmp_path / "assignments.json").write_text(json.dumps({"actions": actions}), encoding="utf-8")
+    assert main(["--root", str(tmp_path), "compact-check"]) == 0
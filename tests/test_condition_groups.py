@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from ahkmate.compile_worker import compile_snapshot_ir
+from ahkmate.condition_groups import group_by_condition
+from ahkmate.config import load_config
+from ahkmate.emitters import get_emitter
+from ahkmate.script_importer import import_script_lines
+from ahkmate.script_ir import IRBinding, IRProfile, ScriptIR
+from ahkmate.store_sync import flatten_actions
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _profile(profile_id, condition, *bindings):
+    return IRProfile(
+        profile_id=profile_id,
+        label=profile_id,
+        condition=condition,
+        bindings=tuple(IRBinding(hotkey.lower(), "None", hotkey, (body,)) for hotkey, body in bindings),
+    )
+
+
+def _group(*profiles):
+    return group_by_condition(ScriptIR(header_lines=(), profiles=profiles))
+
+
+def test_blocks_sharing_a_condition_are_merged_and_the_global_block_goes_last():
+    ir, report = _group(
+        _profile("default", "", ("F1", "Run help.exe")),
+        _profile("one", "cm1.IsActive", ("A", "Run a.exe")),
+        _profile("two", "cm2.IsActive", ("B", "Run b.exe")),
+        _profile("again", "cm1.IsActive", ("C", "Run c.exe")),
+    )
+    assert [(profile.condition, [binding.hotkey for binding in profile.bindings]) for profile in ir.profiles] == [
+        ("cm1.IsActive", ["A", "C"]),
+        ("cm2.IsActive", ["B"]),
+        ("", ["F1"]),
+    ]
+    assert report.merged == [("one", "again")]
+
+
+def test_a_profile_stays_behind_a_block_that_defines_its_hotkey():
+    ir, report = _group(
+        _profile("one", "cm1.IsActive", ("A", "Run a.exe")),
+        _profile("two", "cm2.IsActive", ("B", "Run b.exe")),
+        _profile("again", "cm1.IsActive", ("B", "Run other.exe")),
+    )
+    assert [profile.condition for profile in ir.profiles] == ["cm1.IsActive", "cm2.IsActive", "cm1.IsActive"]
+    assert report.merged == []
+
+
+def test_duplicates_conflicts_and_redundant_variants_are_reported():
+    ir, report = _group(
+        _profile("default", "", ("F1", "Run help.exe")),
+        _profile("one", "cm1.IsActive", ("A", "Run a.exe"), ("F1", "Run help.exe")),
+        _profile("same", "cm1.IsActive", ("A", "Run a.exe")),
+        _profile("clash", "cm1.IsActive", ("A", "Run clash.exe")),
+    )
+    assert report.duplicates == [("cm1.IsActive", "A", "same")]
+    assert report.conflicts == [("cm1.IsActive", "A", "one", "clash")]
+    assert report.redundant == [("cm1.IsActive", "F1")]
+    [conditional, _global] = ir.profiles
+    assert [(binding.hotkey, binding.body) for binding in conditional.bindings] == [("A", ("Run a.exe",))]
+
+
+def _read_back(snapshot, group_conditions):
+    text = get_emitter("ahk-v1").render(compile_snapshot_ir(snapshot, group_conditions=group_conditions))
+    imported = import_script_lines(
+        text.splitlines(),
+        keyboard_profiles=snapshot.keyboard_profiles,
+        key_name_overrides=snapshot.key_name_overrides,
+        modifier_prefix=snapshot.modifier_prefix,
+        modifier_options=snapshot.modifier_options,
+    )
+    conditions = {
+        str(profile["id"]): str(profile.get("condition", "")).strip() for profile in snapshot.keyboard_profiles
+    }
+    return {
+        (conditions[profile_id], key_id, modifier): data["action"]
+        for (profile_id, key_id, modifier), data in flatten_actions(imported.actions_by_profile).items()
+    }
+
+
+def test_grouped_output_defines_the_same_hotkeys_as_ungrouped_output_for_the_shipped_config():
+    snapshot = load_config(REPO_ROOT).snapshot
+    _ir, report = group_by_condition(compile_snapshot_ir(snapshot, group_conditions=False))
+    # Nothing is dropped, so every variant must survive the reordering.
+    assert (report.duplicates, report.conflicts, report.redundant) == ([], [], [])
+    assert _read_back(snapshot, group_conditions=True) == _read_back(snapshot, group_conditions=False)
+
+
+def test_merged_blocks_define_the_same_hotkeys_as_ungrouped_output(tmp_path):
+    profiles = [
+        {"id": "default", "label": "Default", "condition": ""},
+        {"id": "one", "label": "One", "condition": "cm1.IsActive"},
+        {"id": "two", "label": "Two", "condition": "cm2.IsActive"},
+        {"id": "again", "label": "Again", "condition": "cm1.IsActive"},
+    ]
+    actions = {
+        "default": {"f1": {"None": {"action": "Run help.exe", "enabled": True}}},
+        "one": {"a": {"None": {"action": "Run a.exe\nSleep 10", "enabled": True}}},
+        "two": {"a": {"Ctrl": {"action": "Run b.exe", "enabled": True}}},
+        "again": {"c": {"Alt": {"action": "Run c.exe", "enabled": True}}},
+    }
+    (tmp_path / "keyboards.json").write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    (tmp_path / "assignments.json").write_text(json.dumps({"actions": actions}), encoding="utf-8")
+    snapshot = load_config(tmp_path).snapshot
+    _ir, report = group_by_condition(compile_snapshot_ir(snapshot, group_conditions=False))
+    assert report.merged == [("one", "again")]
+    ungrouped = _read_back(snapshot, group_conditions=False)
+    assert len(ungrouped) == 4
+    assert _read_back(snapshot, group_conditions=True) == ungrouped
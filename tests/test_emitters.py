@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import pytest
+
+from ahkmate.emitters import AhkEmitter, AhkV1Emitter
+
+
+def test_an_emitter_missing_a_hook_fails_when_created():
+    class PartialEmitter(AhkEmitter):
+        name = "partial"
+
+        def profile_lines(self, profile):
+            return []
+
+        def machine_lines(self, machine, indent):
+            return []
+
+    with pytest.raises(TypeError, match="probe_function_lines"):
+        PartialEmitter()
+    AhkV1Emitter(compact=True)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+from ahkmate.cli import main
+from ahkmate.config import CONFIG_FILENAMES
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_profile_switch_cost_does_not_grow_with_bindings(display):
+    assert main(["switch-bench", "--sizes", "2000", "40000", "--switches", "30"]) == 0
+
+
+def test_first_paint_is_within_budget(display, tmp_path):
+    # A copy, so the session the window saves doesn't land in the checkout.
+    for name in CONFIG_FILENAMES:
+        if (REPO_ROOT / name).exists():
+            shutil.copy(REPO_ROOT / name, tmp_path / name)
+    assert main(["--root", str(tmp_path), "startup-check"]) == 0
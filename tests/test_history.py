@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pytest
+
+from ahkmate.cli import main
+from ahkmate.history import HistoryStore
+
+
+def _store(tmp_path):
+    history = HistoryStore(tmp_path / ".ahkmate_history")
+    first = history.commit({"default": {"a": {"None": {"action": "Send x", "enabled": True}}}}, version=1)
+    second = history.commit({"default": {"a": {"None": {"action": "Send y", "enabled": True}}}}, version=2)
+    return history, first, second
+
+
+def test_resolve_walks_back_from_head(tmp_path):
+    history, first, second = _store(tmp_path)
+    assert history.resolve("HEAD") == second
+    assert history.resolve("HEAD~1") == first
+    assert history.resolve(first[:7].upper()) == first
+
+
+@pytest.mark.parametrize("ref", ["HEAD~x", "HEAD~-1", "HEAD~2", "HEAD~²", "../*", "zzzz"])
+def test_resolve_rejects_bad_refs_with_key_error(tmp_path, ref):
+    history, _first, _second = _store(tmp_path)
+    with pytest.raises(KeyError):
+        history.resolve(ref)
+
+
+def test_history_commands_report_a_bad_ref(tmp_path, capsys):
+    _store(tmp_path)
+    assert main(["--root", str(tmp_path), "history", "diff", "HEAD~x", "HEAD"]) == 2
+    assert main(["--root", str(tmp_path), "history", "restore", "HEAD~x"]) == 2
+    assert "Unknown or ambiguous version: HEAD~x" in capsys.readouterr().err
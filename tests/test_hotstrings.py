@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from ahkmate.hotstrings import ISSUE_DUPLICATE, HotstringIndex
+
+
+def _binding(text):
+    return {"None": {"action": text, "enabled": True}}
+
+
+def _index(actions_by_profile, profiles):
+    return HotstringIndex.build(actions_by_profile, profiles)
+
+
+def test_search_finds_case_sensitive_abbreviations_in_any_case():
+    index = _index({"default": {":C:BTW": _binding("by the way")}}, [{"id": "default", "condition": ""}])
+    for prefix in ("BT", "bt", "Bt", ""):
+        assert [entry.key_id for entry in index.search("default", prefix)] == [":C:BTW"]
+
+
+def test_case_sensitive_abbreviations_collide_only_when_the_case_agrees():
+    index = _index(
+        {"default": {":C:BTW": _binding("a"), ":C:btw": _binding("b"), "::Btw": _binding("c")}},
+        [{"id": "default", "condition": ""}],
+    )
+    pairs = {
+        frozenset((issue.entry.key_id, issue.other.key_id))
+        for issue in index.issues()
+        if issue.kind == ISSUE_DUPLICATE
+    }
+    assert pairs == {frozenset((":C:BTW", "::Btw")), frozenset((":C:btw", "::Btw"))}
+
+
+def test_search_limit_counts_only_the_profiles_own_entries():
+    profiles = [{"id": "first", "condition": "cm1.IsActive"}, {"id": "second", "condition": "cm1.IsActive"}]
+    index = _index(
+        {
+            "first": {f"::aa{number:02}": _binding("x") for number in range(20)},
+            "second": {"::ab": _binding("y")},
+        },
+        profiles,
+    )
+    assert [entry.key_id for entry in index.search("second", "a", 5)] == ["::ab"]
+    assert all(entry.profile_id == "first" for entry in index.search("first", "a", 5))
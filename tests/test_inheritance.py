@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+
+from ahkmate.compile_worker import compile_snapshot_ir
+from ahkmate.config import load_config
+from ahkmate.emitters import get_emitter
+from ahkmate.simulator import NO_MATCH, build_simulator
+
+
+def _write_config(root, profiles, actions):
+    (root / "keyboards.json").write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    (root / "assignments.json").write_text(json.dumps({"actions": actions}), encoding="utf-8")
+
+
+def _inheriting_config(root):
+    _write_config(
+        root,
+        [
+            {"id": "default", "label": "Default", "condition": ""},
+            {"id": "child", "label": "Child", "condition": "cm2.IsActive", "parent": "default"},
+            {"id": "other", "label": "Other", "condition": "cm1.IsActive"},
+        ],
+        {
+            "default": {"esc": {"Ctrl": {"action": "ExitApp", "enabled": True}}},
+            "child": {"esc": {"Ctrl": {"action": "", "enabled": False}}},
+            "other": {"a": {"None": {"action": "Run calc.exe", "enabled": True}}},
+        },
+    )
+    return load_config(root)
+
+
+def test_disabled_child_binding_emits_a_pass_through_variant(tmp_path):
+    config = _inheriting_config(tmp_path)
+    for output_format, directive in (("ahk-v1", "#if"), ("ahk-v2", "#HotIf")):
+        lines = get_emitter(output_format).render(compile_snapshot_ir(config.snapshot)).splitlines()
+        child_block = lines[lines.index(f"{directive} cm2.IsActive") :]
+        assert child_block[1] == "~^Escape::return"
+        assert "^Escape::" in lines
+
+
+def test_simulator_lets_a_disabled_inherited_binding_through(tmp_path):
+    config = _inheriting_config(tmp_path)
+    for group_conditions in (True, False):
+        simulator = build_simulator(config.snapshot, group_conditions=group_conditions)
+        codes, _times, bad = simulator.encode_stream(["Ctrl+esc"])
+        assert not bad
+        assert simulator.replay(codes, simulator.active_bits(["child"])) == [NO_MATCH]
+        [value] = simulator.replay(codes, simulator.active_bits(["other"]))
+        assert simulator.outcomes[value].profile_id == "default"
+
+
+def test_same_condition_disable_is_reported(tmp_path):
+    _write_config(
+        tmp_path,
+        [
+            {"id": "default", "label": "Default", "condition": ""},
+            {"id": "child", "label": "Child", "condition": "", "parent": "default"},
+        ],
+        {
+            "default": {"esc": {"Ctrl": {"action": "ExitApp", "enabled": True}}},
+            "child": {"esc": {"Ctrl": {"action": "", "enabled": False}}},
+        },
+    )
+    config = load_config(tmp_path)
+    assert any("can't turn off default's" in warning for warning in config.warnings)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import json
+
+from ahkmate.binding_store import CompactBindings
+from ahkmate.compile_worker import compile_snapshot_ir
+from ahkmate.config import load_config
+from ahkmate.constants import MODIFIER_OPTIONS
+from ahkmate.emitters import get_emitter
+
+
+def _render(root, data):
+    profiles = [{"id": "default", "label": "Default", "condition": ""}]
+    (root / "keyboards.json").write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    actions = {"default": {".": {"None": data}}}
+    (root / "assignments.json").write_text(json.dumps({"actions": actions}), encoding="utf-8")
+    return get_emitter("ahk-v1").render(compile_snapshot_ir(load_config(root).snapshot)).splitlines()
+
+
+def test_a_send_only_binding_gets_send_input_unless_it_opts_in_to_a_remap(tmp_path):
+    lines = _render(tmp_path, {"action": "Send ^v", "enabled": True})
+    assert ".::^v" not in lines
+    assert lines[lines.index(".::") + 1].strip() == "SendInput ^v"
+    assert ".::^v" in _render(tmp_path, {"action": "Send ^v", "enabled": True, "remap": True})
+
+
+def test_opting_out_keeps_the_body_even_with_remap_set(tmp_path):
+    lines = _render(tmp_path, {"action": "Send ^v", "enabled": True, "optimize": False, "remap": True})
+    assert lines[lines.index(".::") + 1].strip() == "Send ^v"
+
+
+def test_compact_bindings_keep_the_remap_opt_in():
+    store = CompactBindings(modifier_options=MODIFIER_OPTIONS)
+    store.set("default", ".", "None", {"action": "Send ^v", "enabled": True, "remap": True})
+    assert store.get("default", ".", "None") == {"action": "Send ^v", "enabled": True, "remap": True}
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+
+from ahkmate.compile_worker import export_snapshot
+from ahkmate.config import load_config
+from ahkmate.script_export import shard_dir_for, write_sharded_script
+
+
+def _snapshot(root, profile_ids):
+    profiles = [{"id": profile_id, "label": profile_id, "condition": ""} for profile_id in profile_ids[:1]]
+    profiles += [
+        {"id": profile_id, "label": profile_id, "condition": f"cm{index}.IsActive"}
+        for index, profile_id in enumerate(profile_ids[1:], start=1)
+    ]
+    actions = {
+        profile_id: {"a": {"None": {"action": f"Run {index}.exe", "enabled": True}}}
+        for index, profile_id in enumerate(profile_ids)
+    }
+    (root / "keyboards.json").write_text(json.dumps({"profiles": profiles}), encoding="utf-8")
+    (root / "assignments.json").write_text(json.dumps({"actions": actions}), encoding="utf-8")
+    return load_config(root).snapshot
+
+
+def test_profiles_with_clashing_shard_names_keep_their_own_shards(tmp_path):
+    snapshot = _snapshot(tmp_path, ["default", "id 2", "id_2", "ID_2"])
+    path = tmp_path / "out" / "main.ahk"
+    path.parent.mkdir()
+    outcome = export_snapshot(snapshot, path, split_profiles=True)
+    assert outcome.error is None
+    assert outcome.shard_count == 4
+    shards = sorted(shard_dir_for(path).glob("*.ahk"))
+    assert len({shard.name.casefold() for shard in shards}) == 4
+    texts = "".join(shard.read_text(encoding="utf-8") for shard in shards)
+    assert all(f"Run {index}.exe" in texts for index in range(4))
+    includes = [line for line in path.read_text(encoding="utf-8").splitlines() if "main_profiles" in line]
+    assert len(set(includes)) == len(includes) == 4
+
+
+def test_stale_shards_are_removed(tmp_path):
+    path = tmp_path / "main.ahk"
+    export_snapshot(_snapshot(tmp_path, ["default", "old"]), path, split_profiles=True)
+    assert (shard_dir_for(path) / "old.ahk").exists()
+    outcome = export_snapshot(_snapshot(tmp_path, ["default", "new"]), path, split_profiles=True)
+    assert outcome.error is None
+    assert sorted(shard.name for shard in shard_dir_for(path).glob("*.ahk")) == ["default.ahk", "new.ahk"]
+    assert shard_dir_for(path) / "old.ahk" in outcome.written
+
+
+def test_shard_names_differing_only_in_case_are_refused(tmp_path):
+    path = tmp_path / "main.ahk"
+    written, error = write_sharded_script(path, "main\n", {"id1.ahk": "a\n", "ID1.ahk": "b\n"})
+    assert written == []
+    assert "id1.ahk" in error
+    assert not path.exists()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from ahkmate.constants import KEY_NAME_OVERRIDES, MODIFIER_OPTIONS, MODIFIER_PREFIX
+from ahkmate.script_importer import import_script_lines
+
+
+def _import(text):
+    return import_script_lines(
+        text.splitlines(),
+        keyboard_profiles=[{"id": "default", "condition": ""}],
+        key_name_overrides=KEY_NAME_OVERRIDES,
+        modifier_prefix=MODIFIER_PREFIX,
+        modifier_options=MODIFIER_OPTIONS,
+    )
+
+
+def test_label_after_a_hotkey_is_not_part_of_its_body():
+    result = _import("a::\n    Send x\n    return\nMyTimer:\n    ToolTip\nreturn\n")
+    assert result.actions_by_profile["default"]["a"]["None"]["action"] == "Send x\nreturn"
+    assert [(line.line_number, line.reason) for line in result.unmapped] == [
+        (4, "label outside a hotkey"),
+        (5, "not inside a hotkey"),
+    ]
+
+
+def test_function_definition_and_directive_end_a_body():
+    result = _import("a::\nSend x\nFoo(a, b) {\n    return a\n}\n#Persistent\nb::\n    Run calc\n")
+    actions = result.actions_by_profile["default"]
+    assert actions["a"]["None"]["action"] == "Send x"
+    assert actions["b"]["None"]["action"] == "Run calc"
+    assert [line.reason for line in result.unmapped] == [
+        "function definition",
+        "not inside a hotkey",
+        "not inside a hotkey",
+        "directive outside a hotkey",
+    ]
+
+
+def test_unindented_body_text_stays_in_the_body():
+    result = _import("a::\nSend x\nif (x) {\nFoo()\n}\nreturn\n")
+    assert result.actions_by_profile["default"]["a"]["None"]["action"] == "Send x\nif (x) {\nFoo()\n}"
+    assert not result.unmapped
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import os
+import time
+
+from ahkmate.constants import MODIFIER_OPTIONS
+from ahkmate.settings_io import load_settings, save_settings
+from ahkmate.store_sync import (
+    STALE_LOCK_SECONDS,
+    _break_stale_lock,
+    apply_delta,
+    commit_settings,
+    copy_actions,
+    file_lock,
+    pull_settings,
+)
+
+
+def _binding(action):
+    return {"action": action, "enabled": True}
+
+
+def test_a_pulled_conflict_is_reported_again_by_the_next_commit(tmp_path):
+    path = tmp_path / "assignments.json"
+    original = {"default": {"a": {"None": _binding("Send x")}}}
+    save_settings(path, actions_by_profile=original, modifier_options=MODIFIER_OPTIONS, version=1)
+    base, _error = load_settings(path, modifier_options=MODIFIER_OPTIONS)
+    ours = copy_actions(base.actions_by_profile)
+    ours["default"]["a"]["None"] = _binding("Send ours")
+    theirs = {"default": {"a": {"None": _binding("Send theirs")}, "b": {"None": _binding("Run calc")}}}
+    save_settings(path, actions_by_profile=theirs, modifier_options=MODIFIER_OPTIONS, version=2)
+
+    pulled, error = pull_settings(path, base=base, actions_by_profile=ours, modifier_options=MODIFIER_OPTIONS)
+    assert error is None
+    assert [conflict.binding for conflict in pulled.conflicts] == [("default", "a", "None")]
+    assert list(pulled.incoming) == [("default", "b", "None")]
+    assert pulled.settings.actions_by_profile["default"]["a"]["None"] == _binding("Send x")
+    apply_delta(ours, pulled.incoming)
+
+    committed, error = commit_settings(
+        path, base=pulled.settings, actions_by_profile=ours, modifier_options=MODIFIER_OPTIONS
+    )
+    assert error is None
+    assert [conflict.binding for conflict in committed.conflicts] == [("default", "a", "None")]
+    saved, _error = load_settings(path, modifier_options=MODIFIER_OPTIONS)
+    assert saved.actions_by_profile["default"]["a"]["None"]["action"] == "Send ours"
+    assert saved.actions_by_profile["default"]["b"]["None"]["action"] == "Run calc"
+
+
+def test_a_stale_lock_is_taken_over(tmp_path):
+    lock_path = tmp_path / "assignments.json.lock"
+    lock_path.write_text("1 dead\n", encoding="ascii")
+    old = time.time() - STALE_LOCK_SECONDS - 5
+    os.utime(lock_path, (old, old))
+    with file_lock(tmp_path / "assignments.json", timeout=0.2):
+        assert lock_path.read_text(encoding="ascii").startswith(f"{os.getpid()} ")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_live_lock_taken_as_stale_is_put_back(tmp_path):
+    lock_path = tmp_path / "assignments.json.lock"
+    lock_path.write_text("1 live\n", encoding="ascii")
+    _break_stale_lock(lock_path, "2 breaker\n")
+    assert lock_path.read_text(encoding="ascii") == "1 live\n"
+    assert list(tmp_path.iterdir()) == [lock_path]
+
+
+def test_releasing_leaves_a_lock_that_another_writer_took_over(tmp_path):
+    lock_path = tmp_path / "assignments.json.lock"
+    with file_lock(tmp_path / "assignments.json"):
+        lock_path.write_text("1 other\n", encoding="ascii")
+    assert lock_path.read_text(encoding="ascii") == "1 other\n"